@@ -0,0 +1,100 @@
+/*
+Copyright (c) 2014-2015 Xiaowei Zhu, Tsinghua University
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+*/
+
+#ifndef ACTIVITY_H
+#define ACTIVITY_H
+
+#include <limits.h>
+
+#include <vector>
+
+#include "core/type.hpp"
+#include "core/bitmap.hpp"
+#include "core/atomic.hpp"
+
+/*
+Sub-block activity index. For every ACTIVITY_PAGE bytes of `row` and `column` a grid stores the
+smallest and largest source of the edges that start in that page (`row_activity` and
+`column_activity`: (min, max) VertexId pairs, min > max for pages where no edge starts). With a
+bitmap, stream_edges reads only the pages whose [min, max] holds an active vertex.
+*/
+const long ACTIVITY_PAGE = 4096;
+
+inline long get_activity_pages(long file_bytes) {
+	return (file_bytes + ACTIVITY_PAGE - 1) / ACTIVITY_PAGE;
+}
+
+inline void clear_activity(VertexId * activity, long pages) {
+	for (long p=0;p<pages;p++) {
+		activity[p*2] = INT_MAX;
+		activity[p*2+1] = -1;
+	}
+}
+
+// folds the sources of `count` edges of `unit` bytes written at `position` into the index;
+// source(k) returns the source of the k-th edge
+template <typename F>
+inline void record_activity(VertexId * activity, long position, long count, int unit, F source) {
+	long page = -1;
+	VertexId min_source = INT_MAX, max_source = -1;
+	for (long k=0;k<count;k++) {
+		long edge_page = (position + k * unit) / ACTIVITY_PAGE;
+		if (edge_page!=page) {
+			if (page!=-1) {
+				write_min(&activity[page*2], min_source);
+				write_max(&activity[page*2+1], max_source);
+			}
+			page = edge_page;
+			min_source = INT_MAX;
+			max_source = -1;
+		}
+		VertexId v = source(k);
+		if (v < min_source) min_source = v;
+		if (v > max_source) max_source = v;
+	}
+	if (page!=-1) {
+		write_min(&activity[page*2], min_source);
+		write_max(&activity[page*2+1], max_source);
+	}
+}
+
+// set bits before every word of a bitmap, so that "is any vertex of [a, b] active" is O(1)
+class ActiveCounts {
+	std::vector<long> prefix;
+	Bitmap * bitmap;
+
+	long rank(VertexId v) {
+		unsigned long mask = (1ul << BIT_OFFSET(v)) - 1;
+		return prefix[WORD_OFFSET(v)] + __builtin_popcountl(bitmap->data[WORD_OFFSET(v)] & mask);
+	}
+public:
+	void build(Bitmap * bitmap) {
+		this->bitmap = bitmap;
+		size_t words = WORD_OFFSET(bitmap->size) + 1;
+		prefix.resize(words + 1);
+		prefix[0] = 0;
+		for (size_t w=0;w<words;w++) {
+			prefix[w+1] = prefix[w] + __builtin_popcountl(bitmap->data[w]);
+		}
+	}
+
+	bool any(VertexId begin, VertexId end) { // [begin, end]
+		if (begin > end) return false;
+		return rank(end + 1) > rank(begin);
+	}
+};
+
+#endif
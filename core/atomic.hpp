@@ -40,6 +40,14 @@ inline bool write_min(ET *a, ET b) {
 	return r;
 }
 
+template <class ET>
+inline bool write_max(ET *a, ET b) {
+	ET c; bool r=0;
+	do c = *a;
+	while (c < b && !(r=cas(a,c,b)));
+	return r;
+}
+
 template <class ET>
 inline void write_add(ET *a, ET b) {
 	volatile ET newV, oldV;
@@ -24,6 +24,9 @@ Copyright (c) 2014-2015 Xiaowei Zhu, Tsinghua University
 #include <omp.h>
 
 #include <thread>
+#include <vector>
+#include <functional>
+#include <algorithm>
 
 #include "core/filesystem.hpp"
 #include "core/partition.hpp"
@@ -36,6 +39,121 @@ class BigVector {
 	size_t begin_i = 0, end_i = 0;
 	T * data_in_memory = NULL;
 	static const long PAGESIZE = 4096;
+	// window cache (set_cache): the mapping stays open, load/save only track which CACHE_CHUNK
+	// chunks are resident and dirty, and chunks leave the page cache only to keep the resident
+	// bytes within cache_budget
+	static const long CACHE_CHUNK = 1l<<20;
+	static const char CHUNK_RESIDENT = 1, CHUNK_DIRTY = 2, CHUNK_PINNED = 4;
+	long cache_budget = 0;
+	long cache_resident = 0;
+	long cache_use = 0;
+	size_t window_first = 0, window_last = 0; // chunks of the loaded window
+	std::vector<char> chunk_state;
+	std::vector<long> chunk_use;
+	std::vector<double> chunk_priority;
+	std::function<double(size_t,size_t)> priority;
+
+	size_t chunks() {
+		return (sizeof(T) * length + CACHE_CHUNK - 1) / CACHE_CHUNK;
+	}
+	long chunk_bytes(size_t c) {
+		long end = (c + 1) * CACHE_CHUNK;
+		if (end > (long)(sizeof(T) * length)) end = sizeof(T) * length;
+		return end - c * CACHE_CHUNK;
+	}
+	char * chunk_data(size_t c) {
+		return (char *)data + c * CACHE_CHUNK;
+	}
+	// bytes of the chunks [first, last), the last one clipped to the vector
+	long run_bytes(size_t first, size_t last) {
+		return (last - 1) * CACHE_CHUNK + chunk_bytes(last - 1) - first * CACHE_CHUNK;
+	}
+	double get_chunk_priority(size_t c) {
+		if (!priority) return 0;
+		if (chunk_priority[c] < 0) {
+			size_t begin_i = c * CACHE_CHUNK / sizeof(T);
+			size_t end_i = std::min(length, (size_t)((c + 1) * CACHE_CHUNK + sizeof(T) - 1) / sizeof(T));
+			// per byte, so that the short last chunk is not evicted first
+			chunk_priority[c] = priority(begin_i, end_i) / chunk_bytes(c);
+		}
+		return chunk_priority[c];
+	}
+	// writes the dirty chunks of [first, last) back, one msync per contiguous run
+	void write_back(size_t first, size_t last) {
+		for (size_t c=first;c<last;) {
+			if (!(chunk_state[c] & CHUNK_DIRTY)) {
+				c++;
+				continue;
+			}
+			size_t run_end = c;
+			while (run_end < last && (chunk_state[run_end] & CHUNK_DIRTY)) {
+				chunk_state[run_end] &= ~CHUNK_DIRTY;
+				run_end++;
+			}
+			assert(msync(chunk_data(c), run_bytes(c, run_end), MS_SYNC)==0);
+			c = run_end;
+		}
+	}
+	// makes room for `needed` more resident bytes: evicts the chunks outside the loaded window
+	// with the lowest priority first and, among equal priorities, the most recently used ones,
+	// so that a cyclic sweep over more windows than fit keeps the same chunks resident
+	void evict(long needed) {
+		if (cache_resident + needed <= cache_budget) return;
+		std::vector<size_t> candidates;
+		for (size_t c=0;c<chunk_state.size();c++) {
+			if ((chunk_state[c] & CHUNK_RESIDENT) && !(chunk_state[c] & CHUNK_PINNED) && !(c >= window_first && c < window_last)) {
+				candidates.push_back(c);
+			}
+		}
+		std::sort(candidates.begin(), candidates.end(), [&](size_t a, size_t b){
+			double pa = get_chunk_priority(a), pb = get_chunk_priority(b);
+			if (pa != pb) return pa < pb;
+			if (chunk_use[a] != chunk_use[b]) return chunk_use[a] > chunk_use[b];
+			return a > b;
+		});
+		size_t victims = 0;
+		for (;victims<candidates.size() && cache_resident + needed > cache_budget;victims++) {
+			cache_resident -= chunk_bytes(candidates[victims]);
+		}
+		std::sort(candidates.begin(), candidates.begin() + victims);
+		for (size_t k=0;k<victims;) {
+			size_t first = candidates[k], last = first + 1;
+			k++;
+			while (k < victims && candidates[k] == last) {
+				last++;
+				k++;
+			}
+			write_back(first, last);
+			for (size_t c=first;c<last;c++) chunk_state[c] &= ~CHUNK_RESIDENT;
+			assert(madvise(chunk_data(first), run_bytes(first, last), MADV_DONTNEED)==0);
+			posix_fadvise(fd, first * CACHE_CHUNK, run_bytes(first, last), POSIX_FADV_DONTNEED);
+		}
+	}
+	// faults the chunks [first, last) in; the caller has made room for them
+	void make_resident(size_t first, size_t last) {
+		for (size_t c=first;c<last;c++) {
+			if (!(chunk_state[c] & CHUNK_RESIDENT)) {
+				chunk_state[c] |= CHUNK_RESIDENT;
+				cache_resident += chunk_bytes(c);
+			}
+			chunk_use[c] = cache_use;
+		}
+	}
+	long missing_bytes(size_t first, size_t last) {
+		long bytes = 0;
+		for (size_t c=first;c<last;c++) {
+			if (!(chunk_state[c] & CHUNK_RESIDENT)) bytes += chunk_bytes(c);
+		}
+		return bytes;
+	}
+	void pin_chunks(size_t first, size_t last) {
+		evict(missing_bytes(first, last));
+		make_resident(first, last);
+		for (size_t c=first;c<last;c++) {
+			chunk_state[c] |= CHUNK_PINNED;
+		}
+		assert(madvise(chunk_data(first), run_bytes(first, last), MADV_WILLNEED)==0);
+	}
 public:
 	int fd;
 	T * data;
@@ -53,6 +171,7 @@ public:
 	}
 	~BigVector() {
 		if (is_open && file_exists(path)) {
+			set_cache(0);
 			close_mmap();
 		}
 	}
@@ -127,6 +246,87 @@ public:
 	}
 	void sync() {
 		assert(msync(data, sizeof(T) * length, MS_SYNC)==0);
+		for (size_t c=0;c<chunk_state.size();c++) {
+			chunk_state[c] &= ~CHUNK_DIRTY;
+		}
+	}
+	// Keeps the windows of load/save resident across calls, up to `budget` bytes of this vector:
+	// load only faults in the chunks that are not resident, save only marks them dirty, and a
+	// chunk is written back (coalesced with its dirty neighbours) and dropped from the page cache
+	// when it is evicted. `priority(begin_i, end_i)` ranks the chunks to keep (e.g. the degree
+	// mass of the vertices, so that hub-heavy windows stay); budget 0 writes everything back and
+	// goes back to copying each window in and out. Pins are dropped, to be placed again.
+	void set_cache(long budget, std::function<double(size_t,size_t)> priority = nullptr) {
+		assert(!in_memory);
+		if (budget <= 0) {
+			if (cache_budget > 0) {
+				write_back(0, chunk_state.size());
+				window_first = window_last = 0;
+				cache_budget = 0;
+				evict(0);
+				chunk_state.clear();
+				chunk_use.clear();
+				chunk_priority.clear();
+			}
+			return;
+		}
+		if (chunk_state.empty()) {
+			chunk_state.assign(chunks(), 0);
+			chunk_use.assign(chunks(), 0);
+			cache_resident = 0;
+		}
+		for (size_t c=0;c<chunk_state.size();c++) {
+			chunk_state[c] &= ~CHUNK_PINNED;
+		}
+		this->priority = priority;
+		chunk_priority.assign(chunks(), -1);
+		cache_budget = budget;
+		evict(0);
+	}
+	bool cached() {
+		return cache_budget > 0;
+	}
+	long cached_bytes() {
+		return cache_resident;
+	}
+	// keeps [begin_i, end_i) resident until the next set_cache; pinned bytes count against the budget
+	void pin(size_t begin_i, size_t end_i) {
+		assert(cached());
+		size_t first = begin_i * sizeof(T) / CACHE_CHUNK;
+		size_t last = (end_i * sizeof(T) + CACHE_CHUNK - 1) / CACHE_CHUNK;
+		pin_chunks(first, last);
+	}
+	// pins the chunks with the highest priority per byte, as many as fit in `bytes`; chunks
+	// without priority are left to eviction. Returns the bytes pinned.
+	long pin_hottest(long bytes) {
+		assert(cached());
+		std::vector<size_t> hottest;
+		for (size_t c=0;c<chunk_state.size();c++) {
+			if (get_chunk_priority(c) > 0) hottest.push_back(c);
+		}
+		std::sort(hottest.begin(), hottest.end(), [&](size_t a, size_t b){
+			double pa = get_chunk_priority(a), pb = get_chunk_priority(b);
+			if (pa != pb) return pa > pb;
+			return a < b;
+		});
+		std::vector<size_t> chosen;
+		long pinned_bytes = 0;
+		for (size_t c : hottest) {
+			if (pinned_bytes + chunk_bytes(c) > bytes) break;
+			chosen.push_back(c);
+			pinned_bytes += chunk_bytes(c);
+		}
+		std::sort(chosen.begin(), chosen.end());
+		for (size_t k=0;k<chosen.size();) {
+			size_t first = chosen[k], last = first + 1;
+			k++;
+			while (k < chosen.size() && chosen[k] == last) {
+				last++;
+				k++;
+			}
+			pin_chunks(first, last);
+		}
+		return pinned_bytes;
 	}
 	void lock(size_t begin_i, size_t end_i) {
 		assert(mlock(data + begin_i, (end_i - begin_i) * sizeof(T))==0);
@@ -135,6 +335,17 @@ public:
 		assert(munlock(data + begin_i, (end_i - begin_i) * sizeof(T))==0);
 	}
 	void load(size_t begin_i, size_t end_i) {
+		if (cached()) {
+			// the window is read through the mapping; locking it faults in the missing chunks
+			window_first = begin_i * sizeof(T) / CACHE_CHUNK;
+			window_last = (end_i * sizeof(T) + CACHE_CHUNK - 1) / CACHE_CHUNK;
+			if (window_first >= window_last) return;
+			cache_use++;
+			evict(missing_bytes(window_first, window_last));
+			make_resident(window_first, window_last);
+			assert(mlock(chunk_data(window_first), run_bytes(window_first, window_last))==0);
+			return;
+		}
 		close_mmap();
 		begin_i = begin_i * sizeof(T) / PAGESIZE * PAGESIZE / sizeof(T);
 		this->begin_i = begin_i;
@@ -159,6 +370,17 @@ public:
 		}
 	}
 	void save() {
+		if (cached()) {
+			if (window_first >= window_last) return;
+			for (size_t c=window_first;c<window_last;c++) {
+				chunk_state[c] |= CHUNK_DIRTY;
+			}
+			assert(munlock(chunk_data(window_first), run_bytes(window_first, window_last))==0);
+			window_first = window_last = 0;
+			// a window larger than the budget is trimmed right away
+			evict(0);
+			return;
+		}
 		long end_offset = end_i * sizeof(T);
 		long offset = begin_i * sizeof(T);
 		long bytes;
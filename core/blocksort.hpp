@@ -0,0 +1,305 @@
+/*
+Copyright (c) 2014-2015 Xiaowei Zhu, Tsinghua University
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+*/
+
+#ifndef BLOCKSORT_H
+#define BLOCKSORT_H
+
+#include <stdio.h>
+#include <stdint.h>
+#include <stdlib.h>
+#include <string.h>
+#include <unistd.h>
+#include <fcntl.h>
+#include <errno.h>
+#include <assert.h>
+
+#include <string>
+#include <vector>
+#include <queue>
+#include <algorithm>
+
+#include "core/type.hpp"
+#include "core/compact.hpp"
+
+/*
+Within-block edge order (preprocess/preprocess_dv -O). A sorted block lists its edges by
+(source, target), by (target, source) or along a Hilbert curve over its (source, target) square,
+so that the vertex data touched while streaming it is read and updated nearly sequentially.
+Sorting works on one block at a time and may drop self-loops and duplicate (source, target)
+pairs; of duplicates, the edge with the smallest weight is kept.
+*/
+const char * BLOCK_ORDERS[] = {"source", "target", "layout", "hilbert"};
+
+enum SortKey { SORT_BY_SOURCE, SORT_BY_TARGET, SORT_BY_HILBERT };
+
+// an edge of one block: source and target are offsets in the block's partition ranges
+struct SortedEdge {
+	uint64_t key;
+	uint32_t source;
+	uint32_t target;
+	Weight weight;
+
+	bool operator<(const SortedEdge & other) const {
+		return key < other.key || (key==other.key && weight < other.weight);
+	}
+};
+
+// position of (x, y) along the Hilbert curve that fills the 2^bits x 2^bits square
+inline uint64_t hilbert_index(int bits, uint32_t x, uint32_t y) {
+	uint64_t n = 1ul << bits;
+	uint64_t d = 0;
+	for (uint64_t s=n/2;s>0;s/=2) {
+		uint32_t rx = (x & s) > 0;
+		uint32_t ry = (y & s) > 0;
+		d += s * s * ((3 * rx) ^ ry);
+		if (ry==0) {
+			if (rx==1) {
+				x = n - 1 - x;
+				y = n - 1 - y;
+			}
+			std::swap(x, y);
+		}
+	}
+	return d;
+}
+
+// the on-disk layout of one block (plain edges, or compact ones of `width` bytes) and its sort key
+struct BlockCodec {
+	int edge_type;
+	int width; // 0 for plain edges
+	int unit;
+	VertexId source_begin;
+	VertexId target_begin;
+	SortKey sort_key;
+	int hilbert_bits;
+
+	BlockCodec(int edge_type, int width, VertexId source_begin, VertexId source_end,
+		VertexId target_begin, VertexId target_end, SortKey sort_key)
+		: edge_type(edge_type), width(width), source_begin(source_begin), target_begin(target_begin), sort_key(sort_key) {
+		unit = width==0 ? sizeof(VertexId) * 2 + (edge_type==1 ? sizeof(Weight) : 0) : compact_edge_unit(width, edge_type);
+		VertexId range = std::max(source_end - source_begin, target_end - target_begin);
+		hilbert_bits = 0;
+		while (hilbert_bits < 31 && (1l << hilbert_bits) < range) hilbert_bits++;
+	}
+
+	void set_key(SortedEdge & e) const {
+		switch (sort_key) {
+		case SORT_BY_SOURCE:
+			e.key = (uint64_t)e.source << 32 | e.target;
+			break;
+		case SORT_BY_TARGET:
+			e.key = (uint64_t)e.target << 32 | e.source;
+			break;
+		case SORT_BY_HILBERT:
+			e.key = hilbert_index(hilbert_bits, e.source, e.target);
+			break;
+		}
+	}
+
+	bool is_self_loop(const SortedEdge & e) const {
+		return source_begin + (VertexId)e.source==target_begin + (VertexId)e.target;
+	}
+
+	// decodes `bytes` of the block into out (which must hold bytes / unit edges)
+	void decode(const char * data, long bytes, SortedEdge * out) const {
+		long count = bytes / unit;
+		for (long k=0;k<count;k++) {
+			const char * p = data + k * unit;
+			SortedEdge & e = out[k];
+			e.weight = 0;
+			if (width==0) {
+				e.source = *(const VertexId *)p - source_begin;
+				e.target = *(const VertexId *)(p + sizeof(VertexId)) - target_begin;
+				if (edge_type==1) memcpy(&e.weight, p + sizeof(VertexId) * 2, sizeof(Weight));
+			} else {
+				e.source = e.target = 0;
+				memcpy(&e.source, p, width);
+				memcpy(&e.target, p + width, width);
+				if (edge_type==1) memcpy(&e.weight, p + width * 2, sizeof(Weight));
+			}
+			set_key(e);
+		}
+	}
+
+	void encode(const SortedEdge & e, char * p) const {
+		if (width==0) {
+			*(VertexId *)p = source_begin + (VertexId)e.source;
+			*(VertexId *)(p + sizeof(VertexId)) = target_begin + (VertexId)e.target;
+			if (edge_type==1) memcpy(p + sizeof(VertexId) * 2, &e.weight, sizeof(Weight));
+		} else {
+			memcpy(p, &e.source, width);
+			memcpy(p + width, &e.target, width);
+			if (edge_type==1) memcpy(p + width * 2, &e.weight, sizeof(Weight));
+		}
+	}
+
+	// sorts edges[0, count), drops self-loops and (with dedup) repeated pairs, and encodes the
+	// rest into out; returns the encoded bytes
+	long sort_encode(SortedEdge * edges, long count, bool dedup, bool drop_self_loops, char * out) const {
+		std::sort(edges, edges + count);
+		char * p = out;
+		for (long k=0;k<count;k++) {
+			if (drop_self_loops && is_self_loop(edges[k])) continue;
+			if (dedup && k > 0 && edges[k].key==edges[k-1].key) continue;
+			encode(edges[k], p);
+			p += unit;
+		}
+		return p - out;
+	}
+};
+
+inline void pwrite_all(int fd, const char * buffer, long bytes, long offset) {
+	while (bytes > 0) {
+		long written = pwrite(fd, buffer, bytes, offset);
+		if (written==-1) {
+			fprintf(stderr, "pwrite failed: %s\n", strerror(errno));
+			exit(-1);
+		}
+		buffer += written;
+		bytes -= written;
+		offset += written;
+	}
+}
+
+inline void pread_all(int fd, char * buffer, long bytes, long offset) {
+	while (bytes > 0) {
+		long got = pread(fd, buffer, bytes, offset);
+		if (got<=0) {
+			fprintf(stderr, "pread failed: %s\n", got==0 ? "unexpected end of file" : strerror(errno));
+			exit(-1);
+		}
+		buffer += got;
+		bytes -= got;
+		offset += got;
+	}
+}
+
+// bytes needed to sort a block of `bytes` in memory
+inline long block_sort_memory(long bytes, int unit) {
+	return bytes + bytes / unit * (long)sizeof(SortedEdge);
+}
+
+// Sorts the block stored at [offset, offset + bytes) of fd and writes it back at offset (and, if
+// copy_fd is not -1, also at copy_offset of copy_fd); returns its new size. Blocks that need more
+// than `budget` bytes are sorted in runs that fit the budget, which are then merged through the
+// file `scratch`.
+inline long sort_block(int fd, long offset, long bytes, const BlockCodec & codec, bool dedup, bool drop_self_loops,
+	long budget, std::string scratch, int copy_fd = -1, long copy_offset = 0) {
+	int unit = codec.unit;
+	if (bytes==0) return 0;
+	if (block_sort_memory(bytes, unit) <= budget) {
+		char * data = (char *)malloc(bytes);
+		SortedEdge * edges = (SortedEdge *)malloc(bytes / unit * sizeof(SortedEdge));
+		assert(data!=NULL && edges!=NULL);
+		pread_all(fd, data, bytes, offset);
+		codec.decode(data, bytes, edges);
+		long sorted_bytes = codec.sort_encode(edges, bytes / unit, dedup, drop_self_loops, data);
+		pwrite_all(fd, data, sorted_bytes, offset);
+		if (copy_fd!=-1) pwrite_all(copy_fd, data, sorted_bytes, copy_offset);
+		free(edges);
+		free(data);
+		return sorted_bytes;
+	}
+
+	// sorted runs, each written back (shrunk) at its own place
+	long run_edges = std::max(1l, budget / (unit + (long)sizeof(SortedEdge)));
+	std::vector<long> run_begin, run_end;
+	{
+		char * data = (char *)malloc(run_edges * unit);
+		SortedEdge * edges = (SortedEdge *)malloc(run_edges * sizeof(SortedEdge));
+		assert(data!=NULL && edges!=NULL);
+		for (long begin=0;begin<bytes;begin+=run_edges*unit) {
+			long run_bytes = std::min(run_edges * unit, bytes - begin);
+			pread_all(fd, data, run_bytes, offset + begin);
+			codec.decode(data, run_bytes, edges);
+			long sorted_bytes = codec.sort_encode(edges, run_bytes / unit, dedup, drop_self_loops, data);
+			pwrite_all(fd, data, sorted_bytes, offset + begin);
+			run_begin.push_back(offset + begin);
+			run_end.push_back(offset + begin + sorted_bytes);
+		}
+		free(edges);
+		free(data);
+	}
+
+	// k-way merge into scratch, with the budget split among the run buffers and the output buffer
+	int runs = run_begin.size();
+	long buffer_bytes = std::max(budget / (runs + 1) / unit, 4096l) * unit;
+	std::vector<char *> buffers(runs + 1);
+	std::vector<long> cursor(run_begin), buffered(runs, 0), consumed(runs, 0);
+	for (int r=0;r<=runs;r++) {
+		buffers[r] = (char *)malloc(buffer_bytes);
+		assert(buffers[r]!=NULL);
+	}
+	auto fetch = [&](int r, SortedEdge & e) -> bool {
+		if (consumed[r]==buffered[r]) {
+			long chunk = std::min(buffer_bytes, run_end[r] - cursor[r]);
+			if (chunk==0) return false;
+			pread_all(fd, buffers[r], chunk, cursor[r]);
+			cursor[r] += chunk;
+			buffered[r] = chunk;
+			consumed[r] = 0;
+		}
+		codec.decode(buffers[r] + consumed[r], unit, &e);
+		consumed[r] += unit;
+		return true;
+	};
+	typedef std::pair<SortedEdge, int> Head;
+	auto later = [](const Head & a, const Head & b) { return b.first < a.first; };
+	std::priority_queue<Head, std::vector<Head>, decltype(later)> heads(later);
+	for (int r=0;r<runs;r++) {
+		SortedEdge e;
+		if (fetch(r, e)) heads.push(std::make_pair(e, r));
+	}
+	int fout = open(scratch.c_str(), O_RDWR|O_CREAT|O_TRUNC, 0644);
+	assert(fout!=-1);
+	char * out = buffers[runs];
+	long out_bytes = 0, merged_bytes = 0;
+	bool has_last = false;
+	uint64_t last_key = 0;
+	while (!heads.empty()) {
+		Head head = heads.top();
+		heads.pop();
+		if (!(dedup && has_last && head.first.key==last_key)) {
+			codec.encode(head.first, out + out_bytes);
+			out_bytes += unit;
+			if (out_bytes==buffer_bytes) {
+				pwrite_all(fout, out, out_bytes, merged_bytes);
+				merged_bytes += out_bytes;
+				out_bytes = 0;
+			}
+			has_last = true;
+			last_key = head.first.key;
+		}
+		SortedEdge e;
+		if (fetch(head.second, e)) heads.push(std::make_pair(e, head.second));
+	}
+	pwrite_all(fout, out, out_bytes, merged_bytes);
+	merged_bytes += out_bytes;
+	for (long copied=0;copied<merged_bytes;copied+=buffer_bytes) {
+		long chunk = std::min(buffer_bytes, merged_bytes - copied);
+		pread_all(fout, out, chunk, copied);
+		pwrite_all(fd, out, chunk, offset + copied);
+		if (copy_fd!=-1) pwrite_all(copy_fd, out, chunk, copy_offset + copied);
+	}
+	close(fout);
+	unlink(scratch.c_str());
+	for (int r=0;r<=runs;r++) {
+		free(buffers[r]);
+	}
+	return merged_bytes;
+}
+
+#endif
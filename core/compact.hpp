@@ -0,0 +1,105 @@
+/*
+Copyright (c) 2014-2015 Xiaowei Zhu, Tsinghua University
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+*/
+
+#ifndef COMPACT_H
+#define COMPACT_H
+
+#include <stdint.h>
+#include <string.h>
+#include <assert.h>
+
+#include "core/type.hpp"
+
+/*
+Compact edge encoding. Every source of block (i, j) lies in source partition i and every
+target in target partition j, so an edge can be stored as (source - source_begin[i],
+target - target_begin[j]) in `width` little-endian bytes each, followed by the 4-byte
+weight for weighted grids. The width of a block (2, 3 or 4) is the smallest one that
+holds the largest offset of both partitions; grids store it per block in `block_width`
+(P*P bytes, i-major). Grids without that file use the plain 8/12-byte Edge layout.
+*/
+
+inline int compact_width(VertexId range_length) {
+	if (range_length <= (1 << 16)) return 2;
+	if (range_length <= (1 << 24)) return 3;
+	return 4;
+}
+
+inline int compact_edge_unit(int width, int edge_type) {
+	return width * 2 + (edge_type==1 ? sizeof(Weight) : 0);
+}
+
+// encodes `bytes` of plain edges into out; returns the encoded size
+inline long encode_compact_edges(const char * edges, long bytes, int edge_type, int width,
+	VertexId source_begin, VertexId target_begin, char * out) {
+	int edge_unit = sizeof(VertexId) * 2 + (edge_type==1 ? sizeof(Weight) : 0);
+	char * p = out;
+	for (long pos=0;pos<bytes;pos+=edge_unit) {
+		const Edge * e = (const Edge *)(edges+pos);
+		uint32_t source = e->source - source_begin;
+		uint32_t target = e->target - target_begin;
+		memcpy(p, &source, width);
+		memcpy(p+width, &target, width);
+		if (edge_type==1) {
+			memcpy(p+width*2, &e->weight, sizeof(Weight));
+		}
+		p += compact_edge_unit(width, edge_type);
+	}
+	return p - out;
+}
+
+template <int width, bool weighted, typename F>
+inline void decode_compact_edges_width(const char * data, long bytes, VertexId source_begin, VertexId target_begin, F & f) {
+	const int unit = width * 2 + (weighted ? sizeof(Weight) : 0);
+	Edge e;
+	e.weight = 0;
+	for (long pos=0;pos+unit<=bytes;pos+=unit) {
+		uint32_t source = 0, target = 0;
+		memcpy(&source, data+pos, width);
+		memcpy(&target, data+pos+width, width);
+		e.source = source_begin + source;
+		e.target = target_begin + target;
+		if (weighted) {
+			memcpy(&e.weight, data+pos+width*2, sizeof(Weight));
+		}
+		f(e);
+	}
+}
+
+// calls f(Edge&) for every edge of an encoded run that lies in one block
+template <typename F>
+inline void decode_compact_edges(const char * data, long bytes, int edge_type, int width,
+	VertexId source_begin, VertexId target_begin, F & f) {
+	bool weighted = edge_type==1;
+	switch (width) {
+	case 2:
+		if (weighted) decode_compact_edges_width<2, true>(data, bytes, source_begin, target_begin, f);
+		else decode_compact_edges_width<2, false>(data, bytes, source_begin, target_begin, f);
+		break;
+	case 3:
+		if (weighted) decode_compact_edges_width<3, true>(data, bytes, source_begin, target_begin, f);
+		else decode_compact_edges_width<3, false>(data, bytes, source_begin, target_begin, f);
+		break;
+	case 4:
+		if (weighted) decode_compact_edges_width<4, true>(data, bytes, source_begin, target_begin, f);
+		else decode_compact_edges_width<4, false>(data, bytes, source_begin, target_begin, f);
+		break;
+	default:
+		assert(false);
+	}
+}
+
+#endif
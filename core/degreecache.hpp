@@ -0,0 +1,205 @@
+/*
+Copyright (c) 2014-2015 Xiaowei Zhu, Tsinghua University
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+*/
+
+#ifndef DEGREECACHE_H
+#define DEGREECACHE_H
+
+#include <stdio.h>
+#include <stdint.h>
+#include <string.h>
+#include <unistd.h>
+#include <fcntl.h>
+#include <errno.h>
+#include <assert.h>
+#include <sys/mman.h>
+
+#include <string>
+
+#include "core/type.hpp"
+#include "core/filesystem.hpp"
+
+inline bool write_all(int fd, const void * data, long bytes) {
+	const char * p = (const char *)data;
+	while (bytes > 0) {
+		long written = write(fd, p, bytes);
+		if (written==-1) return false;
+		p += written;
+		bytes -= written;
+	}
+	return true;
+}
+
+// Sidecar stored next to an edge list (<input>.degree): the exact vertex and edge counts and,
+// optionally, the out/in-degree arrays (uint32_t each). Written by txt2bin_fast and preprocess_dv,
+// read by both preprocessors. It is keyed by the input's size and mtime, so a rewritten edge list
+// never picks up stale counts.
+struct DegreeCacheHeader {
+	char magic[8];
+	int version;
+	int edge_type;
+	long vertices;
+	long edges;
+	long input_size;
+	long input_mtime;
+};
+
+const char DEGREE_CACHE_MAGIC[8] = "GGDEGC";
+const int DEGREE_CACHE_VERSION = 1;
+
+inline DegreeCacheHeader make_degree_cache_header(std::string input, long vertices, int edge_type, long edges) {
+	struct stat st;
+	assert(stat(input.c_str(), &st)==0);
+	DegreeCacheHeader header;
+	memset(&header, 0, sizeof(header));
+	memcpy(header.magic, DEGREE_CACHE_MAGIC, sizeof(header.magic));
+	header.version = DEGREE_CACHE_VERSION;
+	header.edge_type = edge_type;
+	header.vertices = vertices;
+	header.edges = edges;
+	header.input_size = st.st_size;
+	header.input_mtime = st.st_mtim.tv_sec * 1000000000l + st.st_mtim.tv_nsec;
+	return header;
+}
+
+// reads the header of <input>.degree; false if there is none or it does not match the input
+inline bool read_degree_cache_header(std::string input, int edge_type, DegreeCacheHeader & header) {
+	std::string cache = input + ".degree";
+	if (!file_exists(cache)) return false;
+	int edge_unit = (edge_type==0) ? sizeof(VertexId) * 2 : sizeof(VertexId) * 2 + sizeof(Weight);
+	int fin = open(cache.c_str(), O_RDONLY);
+	if (fin==-1) return false;
+	bool valid = read(fin, &header, sizeof(header))==sizeof(header);
+	close(fin);
+	if (valid) {
+		DegreeCacheHeader expected = make_degree_cache_header(input, header.vertices, edge_type, file_size(input) / edge_unit);
+		valid = memcmp(&header, &expected, sizeof(header))==0;
+	}
+	if (!valid) printf("ignoring stale degree cache %s\n", cache.c_str());
+	return valid;
+}
+
+// true if <input>.degree also holds the degree arrays (txt2bin_fast -D writes the counts only)
+inline bool degree_cache_has_degrees(std::string input, const DegreeCacheHeader & header) {
+	return file_size(input + ".degree")==(long)(sizeof(header) + sizeof(uint32_t) * 2 * header.vertices);
+}
+
+// fills out_degree/in_degree (vertices entries each) and edges from <input>.degree
+inline bool load_degree_cache(std::string input, long vertices, int edge_type, uint32_t * out_degree, uint32_t * in_degree, long & edges) {
+	DegreeCacheHeader header;
+	if (!read_degree_cache_header(input, edge_type, header)) return false;
+	if (header.vertices!=vertices || !degree_cache_has_degrees(input, header)) return false;
+	int fin = open((input + ".degree").c_str(), O_RDONLY);
+	if (fin==-1) return false;
+	long bytes = sizeof(uint32_t) * vertices;
+	bool valid = pread(fin, out_degree, bytes, sizeof(header))==bytes
+		&& pread(fin, in_degree, bytes, sizeof(header) + bytes)==bytes;
+	close(fin);
+	edges = header.edges;
+	return valid;
+}
+
+// writes <input>.degree atomically; the degree arrays may be NULL to record the counts only
+inline bool save_degree_cache(std::string input, long vertices, int edge_type, long edges, const uint32_t * out_degree, const uint32_t * in_degree) {
+	std::string cache = input + ".degree";
+	DegreeCacheHeader header = make_degree_cache_header(input, vertices, edge_type, edges);
+	int fout = open((cache + ".tmp").c_str(), O_WRONLY|O_CREAT|O_TRUNC, 0644);
+	if (fout==-1) {
+		printf("cannot write degree cache %s: %s\n", cache.c_str(), strerror(errno));
+		return false;
+	}
+	long bytes = sizeof(uint32_t) * vertices;
+	bool ok = write_all(fout, &header, sizeof(header));
+	if (out_degree!=NULL && in_degree!=NULL) {
+		ok = ok && write_all(fout, out_degree, bytes) && write_all(fout, in_degree, bytes);
+	}
+	close(fout);
+	if (ok) {
+		rename((cache + ".tmp").c_str(), cache.c_str());
+	} else {
+		unlink((cache + ".tmp").c_str());
+	}
+	return ok;
+}
+
+// Degree file of a grid (<grid>/degrees): this header, then out_degree[vertices] and
+// in_degree[vertices] (uint32_t, in the grid's vertex IDs). Both preprocessors write it and Graph
+// maps it read-only, so applications get degrees without an edge pass.
+struct GridDegreeHeader {
+	char magic[8];
+	int version;
+	int header_bytes;
+	long vertices;
+	long edges;
+};
+
+const char GRID_DEGREE_MAGIC[8] = "GGDEGS";
+const int GRID_DEGREE_VERSION = 1;
+
+inline void save_grid_degrees(std::string output, long vertices, long edges, const uint32_t * out_degree, const uint32_t * in_degree) {
+	GridDegreeHeader header;
+	memset(&header, 0, sizeof(header));
+	memcpy(header.magic, GRID_DEGREE_MAGIC, sizeof(header.magic));
+	header.version = GRID_DEGREE_VERSION;
+	header.header_bytes = sizeof(header);
+	header.vertices = vertices;
+	header.edges = edges;
+	std::string filename = output + "/degrees";
+	int fout = open(filename.c_str(), O_WRONLY|O_CREAT|O_TRUNC, 0644);
+	assert(fout!=-1);
+	bool ok = write_all(fout, &header, sizeof(header))
+		&& write_all(fout, out_degree, sizeof(uint32_t) * vertices)
+		&& write_all(fout, in_degree, sizeof(uint32_t) * vertices);
+	if (!ok) {
+		fprintf(stderr, "cannot write %s: %s\n", filename.c_str(), strerror(errno));
+		exit(-1);
+	}
+	close(fout);
+}
+
+// creates <filename> as a grid degree file with zeroed arrays and maps it shared, so that the degrees
+// can be counted in place and the file linked into every grid (preprocess_dv -L); returns the mapping
+inline char * map_new_grid_degrees(std::string filename, long vertices, long & bytes) {
+	GridDegreeHeader header;
+	memset(&header, 0, sizeof(header));
+	memcpy(header.magic, GRID_DEGREE_MAGIC, sizeof(header.magic));
+	header.version = GRID_DEGREE_VERSION;
+	header.header_bytes = sizeof(header);
+	header.vertices = vertices;
+	bytes = sizeof(header) + sizeof(uint32_t) * 2 * vertices;
+	int fd = open(filename.c_str(), O_RDWR|O_CREAT|O_TRUNC, 0644);
+	if (fd==-1 || ftruncate(fd, bytes)!=0) {
+		fprintf(stderr, "cannot create %s: %s\n", filename.c_str(), strerror(errno));
+		exit(-1);
+	}
+	char * data = (char *)mmap(NULL, bytes, PROT_READ|PROT_WRITE, MAP_SHARED, fd, 0);
+	assert(data!=MAP_FAILED);
+	close(fd);
+	memcpy(data, &header, sizeof(header));
+	return data;
+}
+
+// checks a mapped degree file against the grid; returns NULL if it is valid, otherwise the reason
+inline const char * check_grid_degrees(const char * data, long bytes, long vertices, long edges) {
+	if (bytes < (long)sizeof(GridDegreeHeader)) return "truncated header";
+	const GridDegreeHeader * header = (const GridDegreeHeader *)data;
+	if (memcmp(header->magic, GRID_DEGREE_MAGIC, sizeof(header->magic))!=0) return "bad magic";
+	if (header->version!=GRID_DEGREE_VERSION) return "unsupported version";
+	if (header->vertices!=vertices || header->edges!=edges) return "vertex or edge count does not match meta";
+	if (bytes!=header->header_bytes + (long)sizeof(uint32_t) * 2 * vertices) return "wrong size";
+	return NULL;
+}
+
+#endif
@@ -24,9 +24,12 @@ Copyright (c) 2014-2015 Xiaowei Zhu, Tsinghua University
 #include <malloc.h>
 #include <omp.h>
 #include <string.h>
+#include <sys/mman.h>
 
 #include <thread>
 #include <vector>
+#include <functional>
+#include <algorithm>
 
 #include "core/constants.hpp"
 #include "core/type.hpp"
@@ -36,6 +39,10 @@ Copyright (c) 2014-2015 Xiaowei Zhu, Tsinghua University
 #include "core/partition.hpp"
 #include "core/bigvector.hpp"
 #include "core/time.hpp"
+#include "core/trace.hpp"
+#include "core/degreecache.hpp"
+#include "core/compact.hpp"
+#include "core/activity.hpp"
 
 bool f_true(VertexId v) {
 	return true;
@@ -49,6 +56,23 @@ void f_none_2(std::pair<VertexId,VertexId> source_vid_range, std::pair<VertexId,
 
 }
 
+// One analytic's share of a fused edge pass (Graph::stream_edges_fused): process is called for the
+// edges whose source is set in bitmap (all edges if it is nullptr), and source_bytes is the size of
+// the vertex data it reads by source, which the pass uses to size its source windows.
+struct EdgeKernel {
+	std::function<void(Edge&)> process;
+	Bitmap * bitmap;
+	long source_bytes;
+	std::function<void(std::pair<VertexId,VertexId>)> pre_source_window;
+	std::function<void(std::pair<VertexId,VertexId>)> post_source_window;
+
+	EdgeKernel(std::function<void(Edge&)> process, Bitmap * bitmap = nullptr, long source_bytes = 0,
+		std::function<void(std::pair<VertexId,VertexId>)> pre_source_window = f_none_1,
+		std::function<void(std::pair<VertexId,VertexId>)> post_source_window = f_none_1)
+		: process(process), bitmap(bitmap), source_bytes(source_bytes),
+		pre_source_window(pre_source_window), post_source_window(post_source_window) { }
+};
+
 class Graph {
 	int parallelism;
 	int edge_unit;
@@ -57,10 +81,35 @@ class Graph {
 	char ** buffer_pool;
 	long * column_offset;
 	long * row_offset;
+	VertexId * source_boundary;
+	VertexId * target_boundary;
 	long memory_bytes;
 	int partition_batch;
 	long vertex_data_bytes;
 	long PAGESIZE;
+	Tracer tracer;
+	char * degree_data;
+	long degree_data_bytes;
+	unsigned char * block_width; // compact grids only (core/compact.hpp), else NULL
+	int io_depth;
+	int io_buffer_count;
+	char ** io_buffers;
+	long io_bytes;
+	double io_seconds;
+	int io_calls;
+	// edge block cache: row-file bytes of the pinned blocks (i*partitions+j), NULL if not cached
+	bool edge_cache_enabled;
+	char ** cached_block;
+	char ** cached_alloc;
+	long * block_accesses;
+	long cache_bytes;
+	long io_cached_bytes;
+	// vertex window cache: BigVectors hinted while the vertex data does not fit keep their windows resident
+	bool vector_cache_enabled;
+	// activity index of both files (core/activity.hpp), NULL for grids without one
+	VertexId * row_activity;
+	VertexId * column_activity;
+	Bitmap * fused_bitmap; // union of the kernels' bitmaps in stream_edges_fused
 public:
 	std::string path;
 
@@ -68,6 +117,9 @@ public:
 	VertexId vertices;
 	EdgeId edges;
 	int partitions;
+	// read-only views of <path>/degrees; NULL if the grid has no (valid) degree file
+	const uint32_t * out_degree;
+	const uint32_t * in_degree;
 
 	Graph (std::string path) {
 		PAGESIZE = 4096;
@@ -79,6 +131,31 @@ public:
 			memset(buffer_pool[i], 0, IOSIZE);
 		}
 		init(path);
+		tracer.open(parallelism, partitions, edge_type, vertices, edges);
+		const char * depth = getenv("GRIDGRAPH_IO_DEPTH");
+		io_depth = (depth!=NULL) ? atoi(depth) : 0;
+		assert(io_depth>=0);
+		io_buffer_count = 0;
+		io_buffers = NULL;
+		io_bytes = 0;
+		io_seconds = 0;
+		io_calls = 0;
+		const char * cache = getenv("GRIDGRAPH_EDGE_CACHE");
+		edge_cache_enabled = (cache==NULL || atoi(cache)!=0);
+		const char * vector_cache = getenv("GRIDGRAPH_VECTOR_CACHE");
+		vector_cache_enabled = (vector_cache==NULL || atoi(vector_cache)!=0);
+		long blocks = (long)partitions * partitions;
+		cached_block = new char * [blocks];
+		cached_alloc = new char * [blocks];
+		block_accesses = new long [blocks];
+		for (long ij=0;ij<blocks;ij++) {
+			cached_block[ij] = NULL;
+			cached_alloc[ij] = NULL;
+			block_accesses[ij] = 0;
+		}
+		cache_bytes = 0;
+		io_cached_bytes = 0;
+		fused_bitmap = nullptr;
 	}
 
 	void set_memory_bytes(long memory_bytes) {
@@ -89,6 +166,160 @@ public:
 		this->vertex_data_bytes = vertex_data_bytes;
 	}
 
+	// preads kept in flight by stream_edges' reader threads; 0 (default) reads in the workers
+	void set_io_depth(int io_depth) {
+		assert(io_depth>=0);
+		this->io_depth = io_depth;
+	}
+
+	int get_io_depth() {
+		return io_depth;
+	}
+
+	// IOSIZE buffers shared by the reader threads and the workers: one in flight per reader plus
+	// one being processed per worker
+	void alloc_io_buffers() {
+		if (io_buffer_count==io_depth+parallelism) return;
+		for (int i=0;i<io_buffer_count;i++) {
+			free(io_buffers[i]);
+		}
+		delete [] io_buffers;
+		io_buffer_count = io_depth + parallelism;
+		io_buffers = new char * [io_buffer_count];
+		for (int i=0;i<io_buffer_count;i++) {
+			io_buffers[i] = (char *)memalign(4096, IOSIZE);
+			assert(io_buffers[i]!=NULL);
+		}
+	}
+
+	// edge bytes read and wall time spent in stream_edges since the graph was opened
+	double get_edge_bandwidth() {
+		return io_seconds > 0 ? io_bytes / io_seconds / 1024 / 1024 : 0;
+	}
+
+	void print_io_stats() {
+		printf("stream_edges read %.1f MB in %.2f seconds over %d calls (%.1f MB/s, io depth %d)\n",
+			io_bytes / 1024.0 / 1024, io_seconds, io_calls, get_edge_bandwidth(), io_depth);
+		if (io_cached_bytes > 0) {
+			printf("edge cache served %.1f MB (%.1f MB pinned)\n", io_cached_bytes / 1024.0 / 1024, cache_bytes / 1024.0 / 1024);
+		}
+	}
+
+	// keep blocks in memory across stream_edges calls when the grid does not fit (default: on)
+	void set_edge_cache(bool enabled) {
+		edge_cache_enabled = enabled;
+		if (!enabled) release_edge_cache();
+	}
+
+	// keep the windows of stream_vertices resident across calls when the vertex data does not fit
+	// (default: on); takes effect at the next hint
+	void set_vector_cache(bool enabled) {
+		vector_cache_enabled = enabled;
+	}
+
+	// memory left for edge blocks: the budget stream_vertices/hint plan with (0.8 of memory_bytes)
+	// minus the vertex data and the I/O buffers
+	long get_edge_cache_budget() {
+		long buffers = parallelism + (io_depth > 0 ? io_depth + parallelism : 0);
+		long budget = (long)(0.8 * memory_bytes) - vertex_data_bytes - (long)IOSIZE * buffers;
+		return budget > 0 ? budget : 0;
+	}
+
+	void evict_block(long ij) {
+		free(cached_alloc[ij]);
+		cached_alloc[ij] = NULL;
+		cached_block[ij] = NULL;
+		cache_bytes -= fsize[ij / partitions][ij % partitions];
+	}
+
+	void release_edge_cache() {
+		for (long ij=0;ij<(long)partitions*partitions;ij++) {
+			if (cached_block[ij]!=NULL) evict_block(ij);
+		}
+	}
+
+	// frees the least accessed (then smallest) pinned blocks until the cache fits its budget again
+	void trim_edge_cache() {
+		long budget = get_edge_cache_budget();
+		if (cache_bytes <= budget) return;
+		std::vector<long> pinned;
+		for (long ij=0;ij<(long)partitions*partitions;ij++) {
+			if (cached_block[ij]!=NULL) pinned.push_back(ij);
+		}
+		std::sort(pinned.begin(), pinned.end(), [&](long a, long b) {
+			if (block_accesses[a]!=block_accesses[b]) return block_accesses[a] < block_accesses[b];
+			long size_a = fsize[a / partitions][a % partitions], size_b = fsize[b / partitions][b % partitions];
+			if (size_a!=size_b) return size_a < size_b;
+			return a > b;
+		});
+		for (size_t k=0;k<pinned.size() && cache_bytes > budget;k++) {
+			evict_block(pinned[k]);
+		}
+	}
+
+	// Counts the blocks this call will access, then pins the most frequently accessed blocks of at
+	// least four pages (already pinned ones first on ties, then larger ones) that fit the budget. Pinned
+	// blocks that fall out of the plan are freed; newly planned blocks are read now only if this
+	// call accesses them, so the cache never reads a block the call would not have read anyway.
+	// Returns the bytes read.
+	long update_edge_cache(int read_mode) {
+		long blocks = (long)partitions * partitions;
+		std::vector<long> candidates;
+		for (long ij=0;ij<blocks;ij++) {
+			if (should_access_shard[ij / partitions]) block_accesses[ij]++;
+			// the reads next to a pinned block still fetch its boundary pages, so small blocks save nothing
+			if (fsize[ij / partitions][ij % partitions] >= 4 * PAGESIZE) candidates.push_back(ij);
+		}
+		std::sort(candidates.begin(), candidates.end(), [&](long a, long b) {
+			if (block_accesses[a]!=block_accesses[b]) return block_accesses[a] > block_accesses[b];
+			if ((cached_block[a]!=NULL)!=(cached_block[b]!=NULL)) return cached_block[a]!=NULL;
+			long size_a = fsize[a / partitions][a % partitions], size_b = fsize[b / partitions][b % partitions];
+			if (size_a!=size_b) return size_a > size_b;
+			return a < b;
+		});
+		long budget = get_edge_cache_budget();
+		std::vector<bool> planned(blocks, false);
+		long planned_bytes = 0;
+		for (long ij : candidates) {
+			long bytes = fsize[ij / partitions][ij % partitions];
+			if (planned_bytes + bytes <= budget) {
+				planned[ij] = true;
+				planned_bytes += bytes;
+			}
+		}
+		std::vector<long> loads;
+		for (long ij=0;ij<blocks;ij++) {
+			if (!planned[ij] && cached_block[ij]!=NULL) evict_block(ij);
+			if (planned[ij] && cached_block[ij]==NULL && should_access_shard[ij / partitions]) loads.push_back(ij);
+		}
+		if (loads.empty()) return 0;
+		long loaded_bytes = 0;
+		int fin = open((path+"/row").c_str(), read_mode);
+		assert(fin!=-1);
+		#pragma omp parallel for schedule(dynamic, 1) num_threads(parallelism)
+		for (size_t l=0;l<loads.size();l++) {
+			long ij = loads[l];
+			long begin = row_offset[ij] / PAGESIZE * PAGESIZE;
+			long end = (row_offset[ij+1] + PAGESIZE - 1) / PAGESIZE * PAGESIZE;
+			char * data = (char *)memalign(4096, end - begin);
+			assert(data!=NULL);
+			for (long offset=begin;offset<end;) {
+				long bytes = pread(fin, data + (offset - begin), std::min(end - offset, (long)IOSIZE), offset);
+				assert(bytes>0);
+				write_add(&loaded_bytes, bytes);
+				offset += bytes;
+				if (offset >= row_offset[ij+1]) break;
+			}
+			cached_alloc[ij] = data;
+			cached_block[ij] = data + (row_offset[ij] - begin);
+		}
+		close(fin);
+		for (long ij : loads) {
+			cache_bytes += fsize[ij / partitions][ij % partitions];
+		}
+		return loaded_bytes;
+	}
+
 	void init(std::string path) {
 		this->path = path;
 
@@ -114,16 +345,6 @@ public:
 		partition_batch = partitions;
 		vertex_data_bytes = 0;
 
-		char filename[1024];
-		fsize = new long * [partitions];
-		for (int i=0;i<partitions;i++) {
-			fsize[i] = new long [partitions];
-			for (int j=0;j<partitions;j++) {
-				sprintf(filename, "%s/block-%d-%d", path.c_str(), i, j);
-				fsize[i][j] = file_size(filename);
-			}
-		}
-
 		long bytes;
 
 		column_offset = new long [partitions*partitions+1];
@@ -137,6 +358,122 @@ public:
 		bytes = read(fin_row_offset, row_offset, sizeof(long)*(partitions*partitions+1));
 		assert(bytes==sizeof(long)*(partitions*partitions+1));
 		close(fin_row_offset);
+
+		fsize = new long * [partitions];
+		for (int i=0;i<partitions;i++) {
+			fsize[i] = new long [partitions];
+			for (int j=0;j<partitions;j++) {
+				fsize[i][j] = row_offset[i*partitions+j+1] - row_offset[i*partitions+j];
+			}
+		}
+
+		source_boundary = new VertexId [partitions+1];
+		load_boundary(path+"/source_boundary", source_boundary);
+		target_boundary = new VertexId [partitions+1];
+		load_boundary(path+"/target_boundary", target_boundary);
+
+		load_degrees(path+"/degrees");
+		load_block_width(path+"/block_width");
+		row_activity = load_activity(path+"/row_activity", row_offset[partitions*partitions]);
+		column_activity = load_activity(path+"/column_activity", column_offset[partitions*partitions]);
+	}
+
+	VertexId * load_activity(std::string filename, long file_bytes) {
+		if (!file_exists(filename)) return NULL;
+		long pages = get_activity_pages(file_bytes);
+		if (file_size(filename)!=(long)sizeof(VertexId) * 2 * pages) {
+			fprintf(stderr, "warning: ignoring %s (wrong size)\n", filename.c_str());
+			return NULL;
+		}
+		VertexId * activity = new VertexId [pages*2];
+		int fin = open(filename.c_str(), O_RDONLY);
+		long bytes = read(fin, activity, sizeof(VertexId) * 2 * pages);
+		assert(bytes==(long)sizeof(VertexId) * 2 * pages);
+		close(fin);
+		return activity;
+	}
+
+	void load_block_width(std::string filename) {
+		block_width = NULL;
+		if (!file_exists(filename)) return;
+		long blocks = (long)partitions * partitions;
+		block_width = new unsigned char [blocks];
+		int fin = open(filename.c_str(), O_RDONLY);
+		long bytes = read(fin, block_width, blocks);
+		assert(bytes==blocks);
+		close(fin);
+		for (long ij=0;ij<blocks;ij++) {
+			assert(block_width[ij]>=2 && block_width[ij]<=4);
+		}
+	}
+
+	bool is_compact() const {
+		return block_width!=NULL;
+	}
+
+	// bytes per edge of block ij on disk
+	int get_block_unit(long ij) {
+		return block_width!=NULL ? compact_edge_unit(block_width[ij], edge_type) : edge_unit;
+	}
+
+	// maps the degree file written by the preprocessors; nothing is copied or read up front
+	void load_degrees(std::string filename) {
+		degree_data = NULL;
+		degree_data_bytes = 0;
+		out_degree = NULL;
+		in_degree = NULL;
+		if (!file_exists(filename)) return;
+		int fin = open(filename.c_str(), O_RDONLY);
+		assert(fin!=-1);
+		long bytes = file_size(filename);
+		char * data = bytes > 0 ? (char *)mmap(NULL, bytes, PROT_READ, MAP_SHARED, fin, 0) : NULL;
+		close(fin);
+		assert(data!=MAP_FAILED);
+		const char * error = check_grid_degrees(data, bytes, vertices, edges);
+		if (error!=NULL) {
+			fprintf(stderr, "warning: ignoring %s (%s)\n", filename.c_str(), error);
+			if (data!=NULL) munmap(data, bytes);
+			return;
+		}
+		degree_data = data;
+		degree_data_bytes = bytes;
+		out_degree = (const uint32_t *)(data + ((GridDegreeHeader *)data)->header_bytes);
+		in_degree = out_degree + vertices;
+	}
+
+	bool has_degrees() const {
+		return out_degree!=NULL;
+	}
+
+	// degree-balanced grids store their partition boundaries; baseline grids fall back to ID ranges
+	void load_boundary(std::string filename, VertexId * boundary) {
+		if (file_exists(filename)) {
+			int fin = open(filename.c_str(), O_RDONLY);
+			long bytes = read(fin, boundary, sizeof(VertexId)*(partitions+1));
+			assert(bytes==sizeof(VertexId)*(partitions+1));
+			close(fin);
+			assert(boundary[0]==0 && boundary[partitions]==vertices);
+		} else {
+			for (int i=0;i<partitions;i++) {
+				boundary[i] = get_partition_range(vertices, partitions, i).first;
+			}
+			boundary[partitions] = vertices;
+		}
+	}
+
+	std::pair<VertexId,VertexId> get_source_range(int partition_id) {
+		return std::make_pair(source_boundary[partition_id], source_boundary[partition_id+1]);
+	}
+
+	std::pair<VertexId,VertexId> get_target_range(int partition_id) {
+		return std::make_pair(target_boundary[partition_id], target_boundary[partition_id+1]);
+	}
+
+	// vertex range covered by source partitions [begin_partition, begin_partition+partition_batch)
+	std::pair<VertexId,VertexId> get_source_window(int begin_partition) {
+		int end_partition = begin_partition + partition_batch;
+		if (end_partition > partitions) end_partition = partitions;
+		return std::make_pair(source_boundary[begin_partition], source_boundary[end_partition]);
 	}
 
 	Bitmap * alloc_bitmap() {
@@ -151,19 +488,14 @@ public:
 		if (bitmap==nullptr && vertex_data_bytes > (0.8 * memory_bytes)) {
 			for (int cur_partition=0;cur_partition<partitions;cur_partition+=partition_batch) {
 				VertexId begin_vid, end_vid;
-				begin_vid = get_partition_range(vertices, partitions, cur_partition).first;
-				if (cur_partition+partition_batch>=partitions) {
-					end_vid = vertices;
-				} else {
-					end_vid = get_partition_range(vertices, partitions, cur_partition+partition_batch).first;
-				}
+				std::tie(begin_vid, end_vid) = get_source_window(cur_partition);
 				pre(std::make_pair(begin_vid, end_vid));
 				#pragma omp parallel for schedule(dynamic) num_threads(parallelism)
 				for (int partition_id=cur_partition;partition_id<cur_partition+partition_batch;partition_id++) {
 					if (partition_id < partitions) {
 						T local_value = zero;
 						VertexId begin_vid, end_vid;
-						std::tie(begin_vid, end_vid) = get_partition_range(vertices, partitions, partition_id);
+						std::tie(begin_vid, end_vid) = get_source_range(partition_id);
 						for (VertexId i=begin_vid;i<end_vid;i++) {
 							local_value += process(i);
 						}
@@ -178,7 +510,7 @@ public:
 			for (int partition_id=0;partition_id<partitions;partition_id++) {
 				T local_value = zero;
 				VertexId begin_vid, end_vid;
-				std::tie(begin_vid, end_vid) = get_partition_range(vertices, partitions, partition_id);
+				std::tie(begin_vid, end_vid) = get_source_range(partition_id);
 				if (bitmap==nullptr) {
 					for (VertexId i=begin_vid;i<end_vid;i++) {
 						local_value += process(i);
@@ -217,6 +549,37 @@ public:
 		partition_batch = partitions / x;
 	}
 
+	// out- plus in-degree of the vertices [begin_vid, end_vid): how hub-heavy a cached vector window is
+	double degree_mass(size_t begin_vid, size_t end_vid) {
+		double mass = 0;
+		for (size_t i=begin_vid;i<end_vid && i<(size_t)vertices;i++) {
+			mass += (double)out_degree[i] + in_degree[i];
+		}
+		return mass;
+	}
+
+	// When the vertex data does not fit, the hinted vectors share the 0.8 * memory_bytes that
+	// stream_vertices plans its windows with as window cache, in proportion to their size, and
+	// keep the chunks with the most degree mass (see BigVector::set_cache). With a degree file,
+	// the most hub-heavy chunks are pinned in a quarter of each vector's cache, so that they stay
+	// resident whatever window is processed; the rest is left to eviction.
+	template <typename A>
+	void cache_vector(BigVector<A> & a, long bytes) {
+		if (!vector_cache_enabled || vertex_data_bytes <= 0.8 * memory_bytes) {
+			a.set_cache(0);
+			return;
+		}
+		long budget = (long)(0.8 * memory_bytes * ((double)sizeof(A) * a.length / bytes));
+		if (has_degrees()) {
+			a.set_cache(budget, [this](size_t begin_vid, size_t end_vid){
+				return degree_mass(begin_vid, end_vid);
+			});
+			a.pin_hottest(budget / 4);
+		} else {
+			a.set_cache(budget);
+		}
+	}
+
 	template <typename... Args>
 	void hint(Args... args);
 
@@ -224,18 +587,46 @@ public:
 	void hint(BigVector<A> & a) {
 		long bytes = sizeof(A) * a.length;
 		set_partition_batch(bytes);
+		cache_vector(a, bytes);
 	}
 
 	template <typename A, typename B>
 	void hint(BigVector<A> & a, BigVector<B> & b) {
 		long bytes = sizeof(A) * a.length + sizeof(B) * b.length;
 		set_partition_batch(bytes);
+		cache_vector(a, bytes);
+		cache_vector(b, bytes);
 	}
 
 	template <typename A, typename B, typename C>
 	void hint(BigVector<A> & a, BigVector<B> & b, BigVector<C> & c) {
 		long bytes = sizeof(A) * a.length + sizeof(B) * b.length + sizeof(C) * c.length;
 		set_partition_batch(bytes);
+		cache_vector(a, bytes);
+		cache_vector(b, bytes);
+		cache_vector(c, bytes);
+	}
+
+	// Decodes the compact edges in [begin, end) of the row (or column) file, read into buffer at
+	// buffer_offset; block (i*partitions+j) is the first block of the run, which may span several
+	// consecutive blocks of the file. Returns the number of edges.
+	template <typename F>
+	long decode_compact_run(char * buffer, long buffer_offset, long begin, long end, int block, bool column_oriented, F & f) {
+		long * file_offset = column_oriented ? column_offset : row_offset;
+		long k = column_oriented ? (long)(block % partitions) * partitions + block / partitions : block;
+		long edges = 0;
+		long pos = begin;
+		while (pos < end) {
+			while (file_offset[k+1] <= pos) k++;
+			long run_end = std::min(file_offset[k+1], end);
+			int i = column_oriented ? k % partitions : k / partitions;
+			int j = column_oriented ? k / partitions : k % partitions;
+			int width = block_width[(long)i*partitions+j];
+			decode_compact_edges(buffer + (pos - buffer_offset), run_end - pos, edge_type, width, source_boundary[i], target_boundary[j], f);
+			edges += (run_end - pos) / compact_edge_unit(width, edge_type);
+			pos = run_end;
+		}
+		return edges;
 	}
 
 	template <typename T>
@@ -255,7 +646,7 @@ public:
 			#pragma omp parallel for schedule(dynamic) num_threads(parallelism)
 			for (int partition_id=0;partition_id<partitions;partition_id++) {
 				VertexId begin_vid, end_vid;
-				std::tie(begin_vid, end_vid) = get_partition_range(vertices, partitions, partition_id);
+				std::tie(begin_vid, end_vid) = get_source_range(partition_id);
 				VertexId i = begin_vid;
 				while (i<end_vid) {
 					unsigned long word = bitmap->data[WORD_OFFSET(i)];
@@ -270,9 +661,15 @@ public:
 		}
 
 		T value = zero;
-		Queue<std::tuple<int, long, long> > tasks(65536);
+		// (fd, offset, length, i*partitions+j of the block that issued the read)
+		Queue<std::tuple<int, long, long, int> > tasks(65536);
 		std::vector<std::thread> threads;
 		long read_bytes = 0;
+		bool tracing = tracer.enabled();
+		int trace_call = tracing ? tracer.begin_call() : 0;
+		int trace_window = 0;
+		double call_begin_time = tracing ? Tracer::now() : 0;
+		double io_begin_time = get_time();
 
 		long total_bytes = 0;
 		for (int i=0;i<partitions;i++) {
@@ -290,41 +687,269 @@ public:
 			// printf("use buffered I/O\n");
 		}
 
-		int fin;
-		long offset = 0;
-		switch(update_mode) {
-		case 0: // source oriented update
+		// Blocks pinned by the edge cache are processed from memory (tasks with fin==-2) and only
+		// the others are read. The cache is planned and filled only by calls that read with O_DIRECT;
+		// calls whose shards fit in memory read with buffered I/O but still serve the pinned blocks
+		// from memory, so that the next O_DIRECT call does not have to read them back in.
+		bool column_oriented = update_mode==1;
+		if (edge_cache_enabled && (read_mode & O_DIRECT)) {
+			read_bytes += update_edge_cache(read_mode);
+		} else if (cache_bytes > 0) {
+			trim_edge_cache();
+		}
+		bool use_cache = cache_bytes > 0;
+		long cached_bytes = 0;
+
+		// Compact grids, and grids with pinned blocks, queue (fin, offset, length, block) tasks that
+		// hold exact runs of whole edges rather than page-aligned reads: a run covers consecutive
+		// blocks of the file and is cut at an edge boundary so that the pages around it still fit
+		// one buffer. Pinned blocks break runs, so no edge is both read and served from memory.
+		// With a bitmap and an activity index, only the pages whose source range holds an active
+		// vertex are read (as exact runs of the edges that start in them).
+		VertexId * activity = column_oriented ? column_activity : row_activity;
+		bool use_activity = bitmap!=nullptr && activity!=NULL;
+		ActiveCounts active;
+		if (use_activity) active.build(bitmap);
+
+		bool compact = is_compact();
+		bool exact = compact || cache_bytes > 0 || use_activity;
+		long max_run = IOSIZE - 2 * PAGESIZE;
+		long run_begin = 0, run_end = 0;
+		int run_block = -1;
+		auto flush_run = [&](int fin) {
+			if (run_end > run_begin) {
+				tasks.push(std::make_tuple(fin, run_begin, run_end - run_begin, run_block));
+			}
+			run_begin = run_end = 0;
+			run_block = -1;
+		};
+		auto push_run_block = [&](int fin, long begin_offset, long end_offset, int i, int j) {
+			if (end_offset <= begin_offset) return;
+			if (run_block==-1 || run_end!=begin_offset) {
+				flush_run(fin);
+				run_begin = begin_offset;
+				run_block = i*partitions+j;
+			}
+			run_end = end_offset;
+			int unit = get_block_unit((long)i*partitions+j);
+			while (run_end - run_begin > max_run) {
+				long cut = begin_offset + (run_begin + max_run - begin_offset) / unit * unit;
+				tasks.push(std::make_tuple(fin, run_begin, cut - run_begin, run_block));
+				run_begin = cut;
+				run_block = i*partitions+j;
+			}
+		};
+		auto push_active_pages = [&](int fin, long begin_offset, long end_offset, int i, int j) {
+			int unit = get_block_unit((long)i*partitions+j);
+			// first edge of the block that starts at or after x
+			auto align = [&](long x) {
+				return begin_offset + (x - begin_offset + unit - 1) / unit * unit;
+			};
+			for (long page=begin_offset/ACTIVITY_PAGE;page*ACTIVITY_PAGE<end_offset;page++) {
+				if (!active.any(activity[page*2], activity[page*2+1])) continue;
+				long begin = align(std::max(page*ACTIVITY_PAGE, begin_offset));
+				long end = align(std::min((page+1)*ACTIVITY_PAGE, end_offset));
+				push_run_block(fin, begin, end, i, j);
+			}
+		};
+		auto push_cached_block = [&](long begin_offset, long end_offset, int i, int j) {
+			int unit = get_block_unit((long)i*partitions+j);
+			for (long offset=begin_offset;offset<end_offset;) {
+				long length = std::min(end_offset - offset, max_run / unit * unit);
+				tasks.push(std::make_tuple(-2, offset, length, i*partitions+j));
+				offset += length;
+			}
+		};
+		// a task of a pinned block: its bytes, laid out from the block's offset in the current file
+		auto cached_task = [&](long offset, int block, char * & buffer, long & read_offset, long & bytes) {
+			int i = block / partitions;
+			int j = block % partitions;
+			buffer = cached_block[block];
+			read_offset = column_oriented ? column_offset[(long)j*partitions+i] : row_offset[block];
+			bytes = fsize[i][j];
+		};
+
+		// reads a task into buffer and returns the bytes read from read_offset
+		auto read_task = [&](int fin, char * buffer, long offset, long length, long & read_offset) {
+			read_offset = offset;
+			long read_length = length;
+			if (exact) {
+				read_offset = offset / PAGESIZE * PAGESIZE;
+				read_length = (offset + length - read_offset + PAGESIZE - 1) / PAGESIZE * PAGESIZE;
+			}
+			long bytes = pread(fin, buffer, read_length, read_offset);
+			assert(bytes>0);
+			assert(!exact || bytes>=offset + length - read_offset);
+			return bytes;
+		};
+
+		// processes the edges of one task; returns the number of edges in it
+		VertexId window_begin_vid = 0, window_end_vid = vertices;
+		auto consume = [&](T & local_value, char * buffer, long read_offset, long bytes, long offset, long length, int block) {
+			if (compact) {
+				// only blocks of the current window are queued, so no source range check is needed
+				auto visit = [&](Edge & e) {
+					if (bitmap==nullptr || bitmap->get_bit(e.source)) {
+						local_value += process(e);
+					}
+				};
+				return decode_compact_run(buffer, read_offset, offset, offset + length, block, column_oriented, visit);
+			}
+			// page-aligned tasks cover everything read; exact tasks only [offset, offset+length)
+			long begin = offset - read_offset + offset % edge_unit;
+			long end = exact ? offset + length - read_offset : bytes;
+			for (long pos=begin;pos+edge_unit<=end;pos+=edge_unit) {
+				Edge & e = *(Edge*)(buffer+pos);
+				if (column_oriented && (e.source < window_begin_vid || e.source >= window_end_vid)) {
+					continue;
+				}
+				if (bitmap==nullptr || bitmap->get_bit(e.source)) {
+					local_value += process(e);
+				}
+			}
+			return (end - begin) / edge_unit;
+		};
+
+		// With io_depth==0 every worker preads a task into its own buffer and then processes it. With
+		// io_depth>0, io_depth reader threads keep that many preads in flight into a pool of
+		// io_depth+parallelism buffers, and the workers only process filled buffers, so reading
+		// overlaps with computing. Filled buffers are (buffer, read_offset, bytes, offset, length, block).
+		bool async = io_depth > 0;
+		if (async) alloc_io_buffers();
+		Queue<std::tuple<int, long, long, long, long, int> > filled(async ? io_buffer_count : 1);
+		Queue<int> free_buffers(async ? io_buffer_count : 1);
+		std::vector<std::thread> readers;
+		auto start_workers = [&]() {
 			threads.clear();
+			if (async) {
+				for (int b=0;b<io_buffer_count;b++) {
+					free_buffers.push(b);
+				}
+				for (int ri=0;ri<io_depth;ri++) {
+					readers.emplace_back([&]() {
+						while (true) {
+							int fin, block;
+							long offset, length;
+							std::tie(fin, offset, length, block) = tasks.pop();
+							if (fin==-1) break;
+							if (fin==-2) {
+								filled.push(std::make_tuple(-2, 0, 0, offset, length, block));
+								continue;
+							}
+							int buffer_id = free_buffers.pop();
+							long read_offset;
+							long bytes = read_task(fin, io_buffers[buffer_id], offset, length, read_offset);
+							filled.push(std::make_tuple(buffer_id, read_offset, bytes, offset, length, block));
+						}
+					});
+				}
+			}
 			for (int ti=0;ti<parallelism;ti++) {
 				threads.emplace_back([&](int thread_id){
 					T local_value = zero;
 					long local_read_bytes = 0;
+					long local_cached_bytes = 0;
 					while (true) {
-						int fin;
-						long offset, length;
-						std::tie(fin, offset, length) = tasks.pop();
-						if (fin==-1) break;
-						char * buffer = buffer_pool[thread_id];
-						long bytes = pread(fin, buffer, length, offset);
-						assert(bytes>0);
-						local_read_bytes += bytes;
-						// CHECK: start position should be offset % edge_unit
-						for (long pos=offset % edge_unit;pos+edge_unit<=bytes;pos+=edge_unit) {
-							Edge & e = *(Edge*)(buffer+pos);
-							if (bitmap==nullptr || bitmap->get_bit(e.source)) {
-								local_value += process(e);
+						int block;
+						long offset, length, read_offset, bytes;
+						char * buffer;
+						int buffer_id = -1;
+						double pop_time = tracing ? Tracer::now() : 0;
+						double popped_time, read_time;
+						if (async) {
+							std::tie(buffer_id, read_offset, bytes, offset, length, block) = filled.pop();
+							popped_time = read_time = tracing ? Tracer::now() : 0;
+							if (buffer_id==-1) {
+								if (tracing) tracer.record(thread_id, TRACE_TASK, trace_call, trace_window, -1, partition_batch, 0, 0, pop_time, popped_time, popped_time, popped_time);
+								break;
+							}
+							if (buffer_id==-2) {
+								cached_task(offset, block, buffer, read_offset, bytes);
+							} else {
+								buffer = io_buffers[buffer_id];
+							}
+						} else {
+							int fin;
+							std::tie(fin, offset, length, block) = tasks.pop();
+							popped_time = tracing ? Tracer::now() : 0;
+							if (fin==-1) {
+								if (tracing) tracer.record(thread_id, TRACE_TASK, trace_call, trace_window, -1, partition_batch, 0, 0, pop_time, popped_time, popped_time, popped_time);
+								break;
+							}
+							if (fin==-2) {
+								cached_task(offset, block, buffer, read_offset, bytes);
+								buffer_id = -2;
+							} else {
+								buffer = buffer_pool[thread_id];
+								bytes = read_task(fin, buffer, offset, length, read_offset);
 							}
+							read_time = tracing ? Tracer::now() : 0;
 						}
+						long edges = consume(local_value, buffer, read_offset, bytes, offset, length, block);
+						if (buffer_id==-2) {
+							local_cached_bytes += length;
+							bytes = 0;
+						} else {
+							local_read_bytes += bytes;
+							if (async) free_buffers.push(buffer_id);
+						}
+						if (tracing) tracer.record(thread_id, TRACE_TASK, trace_call, trace_window, block, partition_batch, bytes, edges, pop_time, popped_time, read_time, Tracer::now());
 					}
 					write_add(&value, local_value);
 					write_add(&read_bytes, local_read_bytes);
+					write_add(&cached_bytes, local_cached_bytes);
 				}, ti);
 			}
+		};
+		auto finish_workers = [&]() {
+			if (async) {
+				for (int ri=0;ri<io_depth;ri++) {
+					tasks.push(std::make_tuple(-1, 0, 0, -1));
+				}
+				for (int ri=0;ri<io_depth;ri++) {
+					readers[ri].join();
+				}
+				readers.clear();
+				for (int i=0;i<parallelism;i++) {
+					filled.push(std::make_tuple(-1, 0, 0, 0, 0, -1));
+				}
+			} else {
+				for (int i=0;i<parallelism;i++) {
+					tasks.push(std::make_tuple(-1, 0, 0, -1));
+				}
+			}
+			for (int i=0;i<parallelism;i++) {
+				threads[i].join();
+			}
+			if (async) {
+				for (int b=0;b<io_buffer_count;b++) {
+					free_buffers.pop();
+				}
+			}
+		};
+
+		int fin;
+		long offset = 0;
+		switch(update_mode) {
+		case 0: // source oriented update
+			start_workers();
 			fin = open((path+"/row").c_str(), read_mode);
 			posix_fadvise(fin, 0, 0, POSIX_FADV_SEQUENTIAL);
 			for (int i=0;i<partitions;i++) {
 				if (!should_access_shard[i]) continue;
 				for (int j=0;j<partitions;j++) {
+					if (use_cache && cached_block[i*partitions+j]!=NULL) {
+						push_cached_block(row_offset[i*partitions+j], row_offset[i*partitions+j+1], i, j);
+						continue;
+					}
+					if (use_activity) {
+						push_active_pages(fin, row_offset[i*partitions+j], row_offset[i*partitions+j+1], i, j);
+						continue;
+					}
+					if (exact) {
+						push_run_block(fin, row_offset[i*partitions+j], row_offset[i*partitions+j+1], i, j);
+						continue;
+					}
 					long begin_offset = row_offset[i*partitions+j];
 					if (begin_offset - offset >= PAGESIZE) {
 						offset = begin_offset / PAGESIZE * PAGESIZE;
@@ -332,21 +957,18 @@ public:
 					long end_offset = row_offset[i*partitions+j+1];
 					if (end_offset <= offset) continue;
 					while (end_offset - offset >= IOSIZE) {
-						tasks.push(std::make_tuple(fin, offset, IOSIZE));
+						tasks.push(std::make_tuple(fin, offset, IOSIZE, i*partitions+j));
 						offset += IOSIZE;
 					}
 					if (end_offset > offset) {
-						tasks.push(std::make_tuple(fin, offset, (end_offset - offset + PAGESIZE - 1) / PAGESIZE * PAGESIZE));
+						tasks.push(std::make_tuple(fin, offset, (end_offset - offset + PAGESIZE - 1) / PAGESIZE * PAGESIZE, i*partitions+j));
 						offset += (end_offset - offset + PAGESIZE - 1) / PAGESIZE * PAGESIZE;
 					}
 				}
 			}
-			for (int i=0;i<parallelism;i++) {
-				tasks.push(std::make_tuple(-1, 0, 0));
-			}
-			for (int i=0;i<parallelism;i++) {
-				threads[i].join();
-			}
+			flush_run(fin);
+			finish_workers();
+			if (tracing) tracer.record(-1, TRACE_WINDOW, trace_call, trace_window, 0, partitions, read_bytes, 0, call_begin_time, call_begin_time, call_begin_time, Tracer::now());
 			break;
 		case 1: // target oriented update
 			fin = open((path+"/column").c_str(), read_mode);
@@ -354,48 +976,31 @@ public:
 
 			for (int cur_partition=0;cur_partition<partitions;cur_partition+=partition_batch) {
 				VertexId begin_vid, end_vid;
-				begin_vid = get_partition_range(vertices, partitions, cur_partition).first;
-				if (cur_partition+partition_batch>=partitions) {
-					end_vid = vertices;
-				} else {
-					end_vid = get_partition_range(vertices, partitions, cur_partition+partition_batch).first;
-				}
+				std::tie(begin_vid, end_vid) = get_source_window(cur_partition);
 				pre_source_window(std::make_pair(begin_vid, end_vid));
 				// printf("pre %d %d\n", begin_vid, end_vid);
-				threads.clear();
-				for (int ti=0;ti<parallelism;ti++) {
-					threads.emplace_back([&](int thread_id){
-						T local_value = zero;
-						long local_read_bytes = 0;
-						while (true) {
-							int fin;
-							long offset, length;
-							std::tie(fin, offset, length) = tasks.pop();
-							if (fin==-1) break;
-							char * buffer = buffer_pool[thread_id];
-							long bytes = pread(fin, buffer, length, offset);
-							assert(bytes>0);
-							local_read_bytes += bytes;
-							// CHECK: start position should be offset % edge_unit
-							for (long pos=offset % edge_unit;pos+edge_unit<=bytes;pos+=edge_unit) {
-								Edge & e = *(Edge*)(buffer+pos);
-								if (e.source < begin_vid || e.source >= end_vid) {
-									continue;
-								}
-								if (bitmap==nullptr || bitmap->get_bit(e.source)) {
-									local_value += process(e);
-								}
-							}
-						}
-						write_add(&value, local_value);
-						write_add(&read_bytes, local_read_bytes);
-					}, ti);
-				}
+				double window_begin_time = tracing ? Tracer::now() : 0;
+				long window_begin_bytes = read_bytes;
+				window_begin_vid = begin_vid;
+				window_end_vid = end_vid;
+				start_workers();
 				offset = 0;
 				for (int j=0;j<partitions;j++) {
 					for (int i=cur_partition;i<cur_partition+partition_batch;i++) {
 						if (i>=partitions) break;
 						if (!should_access_shard[i]) continue;
+						if (use_cache && cached_block[i*partitions+j]!=NULL) {
+							push_cached_block(column_offset[j*partitions+i], column_offset[j*partitions+i+1], i, j);
+							continue;
+						}
+						if (use_activity) {
+							push_active_pages(fin, column_offset[j*partitions+i], column_offset[j*partitions+i+1], i, j);
+							continue;
+						}
+						if (exact) {
+							push_run_block(fin, column_offset[j*partitions+i], column_offset[j*partitions+i+1], i, j);
+							continue;
+						}
 						long begin_offset = column_offset[j*partitions+i];
 						if (begin_offset - offset >= PAGESIZE) {
 							offset = begin_offset / PAGESIZE * PAGESIZE;
@@ -403,21 +1008,19 @@ public:
 						long end_offset = column_offset[j*partitions+i+1];
 						if (end_offset <= offset) continue;
 						while (end_offset - offset >= IOSIZE) {
-							tasks.push(std::make_tuple(fin, offset, IOSIZE));
+							tasks.push(std::make_tuple(fin, offset, IOSIZE, i*partitions+j));
 							offset += IOSIZE;
 						}
 						if (end_offset > offset) {
-							tasks.push(std::make_tuple(fin, offset, (end_offset - offset + PAGESIZE - 1) / PAGESIZE * PAGESIZE));
+							tasks.push(std::make_tuple(fin, offset, (end_offset - offset + PAGESIZE - 1) / PAGESIZE * PAGESIZE, i*partitions+j));
 							offset += (end_offset - offset + PAGESIZE - 1) / PAGESIZE * PAGESIZE;
 						}
 					}
 				}
-				for (int i=0;i<parallelism;i++) {
-					tasks.push(std::make_tuple(-1, 0, 0));
-				}
-				for (int i=0;i<parallelism;i++) {
-					threads[i].join();
-				}
+				flush_run(fin);
+				finish_workers();
+				if (tracing) tracer.record(-1, TRACE_WINDOW, trace_call, trace_window, cur_partition, partition_batch, read_bytes - window_begin_bytes, 0, window_begin_time, window_begin_time, window_begin_time, Tracer::now());
+				trace_window++;
 				post_source_window(std::make_pair(begin_vid, end_vid));
 				// printf("post %d %d\n", begin_vid, end_vid);
 			}
@@ -429,8 +1032,65 @@ public:
 
 		close(fin);
 		// printf("streamed %ld bytes of edges\n", read_bytes);
+		io_bytes += read_bytes;
+		io_cached_bytes += cached_bytes;
+		io_seconds += get_time() - io_begin_time;
+		io_calls++;
+		if (tracing) {
+			tracer.record(-1, TRACE_CALL, trace_call, 0, update_mode, partition_batch, read_bytes, 0, call_begin_time, call_begin_time, call_begin_time, Tracer::now());
+			tracer.flush();
+		}
 		return value;
 	}
+
+	// Streams the edges once for several kernels: each edge goes to every kernel whose bitmap holds
+	// its source, so the pass reads what the most demanding kernel would read on its own rather than
+	// the sum over all of them. The pass streams the union of the bitmaps (all sources if a kernel
+	// has none), and its source windows hold the source data of all kernels at once.
+	void stream_edges_fused(std::vector<EdgeKernel> & kernels, int update_mode = 1) {
+		if (kernels.empty()) return;
+		bool all_sources = false;
+		long source_bytes = 0;
+		for (size_t k=0;k<kernels.size();k++) {
+			if (kernels[k].bitmap==nullptr) all_sources = true;
+			source_bytes += kernels[k].source_bytes;
+		}
+		Bitmap * bitmap = nullptr;
+		if (!all_sources) {
+			if (fused_bitmap==nullptr) fused_bitmap = alloc_bitmap();
+			bitmap = fused_bitmap;
+			long words = WORD_OFFSET(vertices) + 1;
+			#pragma omp parallel for num_threads(parallelism)
+			for (long w=0;w<words;w++) {
+				unsigned long word = 0;
+				for (size_t k=0;k<kernels.size();k++) {
+					word |= kernels[k].bitmap->data[w];
+				}
+				bitmap->data[w] = word;
+			}
+		}
+		if (source_bytes > 0) set_partition_batch(source_bytes);
+		stream_edges<VertexId>(
+			[&](Edge & e){
+				for (size_t k=0;k<kernels.size();k++) {
+					if (kernels[k].bitmap==nullptr || kernels[k].bitmap->get_bit(e.source)) {
+						kernels[k].process(e);
+					}
+				}
+				return 0;
+			}, bitmap, 0, update_mode,
+			[&](std::pair<VertexId,VertexId> source_vid_range){
+				for (size_t k=0;k<kernels.size();k++) {
+					kernels[k].pre_source_window(source_vid_range);
+				}
+			},
+			[&](std::pair<VertexId,VertexId> source_vid_range){
+				for (size_t k=0;k<kernels.size();k++) {
+					kernels[k].post_source_window(source_vid_range);
+				}
+			}
+		);
+	}
 };
 
 #endif
@@ -0,0 +1,654 @@
+/*
+Copyright (c) 2014-2015 Xiaowei Zhu, Tsinghua University
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+*/
+
+#ifndef GRIDWRITER_H
+#define GRIDWRITER_H
+
+#include <stdio.h>
+#include <stdlib.h>
+#include <unistd.h>
+#include <fcntl.h>
+#include <malloc.h>
+#include <errno.h>
+#include <assert.h>
+#include <string.h>
+#include <omp.h>
+
+#include <string>
+#include <vector>
+#include <thread>
+#include <functional>
+#include <algorithm>
+
+#include "core/constants.hpp"
+#include "core/type.hpp"
+#include "core/filesystem.hpp"
+#include "core/queue.hpp"
+#include "core/partition.hpp"
+#include "core/time.hpp"
+#include "core/compact.hpp"
+#include "core/activity.hpp"
+#include "core/blocksort.hpp"
+#include "core/degreecache.hpp"
+
+inline int get_edge_unit(int edge_type) {
+	switch (edge_type) {
+	case 0:
+		return sizeof(VertexId) * 2;
+	case 1:
+		return sizeof(VertexId) * 2 + sizeof(Weight);
+	default:
+		fprintf(stderr, "edge type (%d) is not supported.\n", edge_type);
+		exit(-1);
+	}
+}
+
+// read the edge list sequentially in IOSIZE chunks and hand them to worker threads
+inline void scan_edge_list(std::string input, int parallelism, std::function<void(int thread_id, char * buffer, long bytes)> process) {
+	char ** buffers = new char * [parallelism*2];
+	bool * occupied = new bool [parallelism*2];
+	for (int i=0;i<parallelism*2;i++) {
+		buffers[i] = (char *)memalign(4096, IOSIZE);
+		occupied[i] = false;
+	}
+	Queue<std::tuple<int, long> > tasks(parallelism);
+	std::vector<std::thread> threads;
+	for (int ti=0;ti<parallelism;ti++) {
+		threads.emplace_back([&](int thread_id) {
+			while (true) {
+				int cursor;
+				long bytes;
+				std::tie(cursor, bytes) = tasks.pop();
+				if (cursor==-1) break;
+				process(thread_id, buffers[cursor], bytes);
+				occupied[cursor] = false;
+			}
+		}, ti);
+	}
+
+	int fin = open(input.c_str(), O_RDONLY);
+	if (fin==-1) printf("%s\n", strerror(errno));
+	assert(fin!=-1);
+	posix_fadvise(fin, 0, 0, POSIX_FADV_SEQUENTIAL);
+	int cursor = 0;
+	while (true) {
+		long bytes = read(fin, buffers[cursor], IOSIZE);
+		assert(bytes!=-1);
+		if (bytes==0) break;
+		occupied[cursor] = true;
+		tasks.push(std::make_tuple(cursor, bytes));
+		while (occupied[cursor]) {
+			cursor = (cursor + 1) % (parallelism * 2);
+		}
+	}
+	close(fin);
+
+	for (int ti=0;ti<parallelism;ti++) {
+		tasks.push(std::make_tuple(-1, 0));
+	}
+	for (int ti=0;ti<parallelism;ti++) {
+		threads[ti].join();
+	}
+	for (int i=0;i<parallelism*2;i++) {
+		free(buffers[i]);
+	}
+	delete [] buffers;
+	delete [] occupied;
+}
+
+/*
+Writes one grid directly into its row/column files. A first pass over the input
+counts the edges of every block (count), which fixes row_offset/column_offset
+(prepare); a second pass scatters each chunk into per-block spill buffers that
+are written with pwrite to both layouts (scatter/finish). No block-i-j files are
+created, so P is limited by memory (about 29 bytes per block plus the spill
+budget) rather than by the number of open file descriptors. With set_compact(true)
+blocks are stored in the compact encoding of core/compact.hpp. The activity index of
+both files (core/activity.hpp, 8 bytes per 4 KB page) is built as blocks are written.
+*/
+class GridWriter {
+	int edge_unit;
+	const int * source_partition_map;
+	const int * target_partition_map;
+	// partition boundaries (P+1 each), an alternative to the per-vertex maps
+	const VertexId * source_boundary;
+	const VertexId * target_boundary;
+	long * counts;
+	long * row_offset;
+	long * column_offset;
+	long * cursor;
+	char * spill;
+	int * spill_bytes;
+	char * locks;
+	long spill_size;
+	int fout_row;
+	int fout_column;
+	// compact encoding: bytes per endpoint of every block, first vertex of every partition
+	unsigned char * block_width;
+	VertexId * source_begin;
+	VertexId * target_begin;
+	// activity index of both files (core/activity.hpp)
+	VertexId * row_activity;
+	VertexId * column_activity;
+public:
+	std::string output;
+	VertexId vertices;
+	int partitions;
+	int edge_type;
+	bool compact;
+
+	// partition maps (or boundaries, see set_boundaries) are optional; without them vertices are split into ID ranges
+	GridWriter(std::string output, VertexId vertices, int partitions, int edge_type,
+		const int * source_partition_map = nullptr, const int * target_partition_map = nullptr) {
+		this->output = output;
+		this->vertices = vertices;
+		this->partitions = partitions;
+		this->edge_type = edge_type;
+		this->source_partition_map = source_partition_map;
+		this->target_partition_map = target_partition_map;
+		source_boundary = nullptr;
+		target_boundary = nullptr;
+		edge_unit = get_edge_unit(edge_type);
+		long blocks = (long)partitions * partitions;
+		counts = new long [blocks];
+		memset(counts, 0, sizeof(long) * blocks);
+		row_offset = new long [blocks+1];
+		column_offset = new long [blocks+1];
+		cursor = nullptr;
+		spill = nullptr;
+		spill_bytes = nullptr;
+		locks = nullptr;
+		compact = false;
+		block_width = nullptr;
+		source_begin = nullptr;
+		target_begin = nullptr;
+		row_activity = nullptr;
+		column_activity = nullptr;
+	}
+
+	~GridWriter() {
+		delete [] counts;
+		delete [] row_offset;
+		delete [] column_offset;
+		delete [] cursor;
+		delete [] spill_bytes;
+		delete [] locks;
+		delete [] block_width;
+		delete [] source_begin;
+		delete [] target_begin;
+		delete [] row_activity;
+		delete [] column_activity;
+		free(spill);
+	}
+
+	void set_compact(bool compact) {
+		this->compact = compact;
+	}
+
+	// partitions given by P+1 boundaries each instead of maps: 8(P+1) bytes rather than 8 per vertex,
+	// at the cost of a log2(P) search per lookup over arrays that stay in cache
+	void set_boundaries(const VertexId * source_boundary, const VertexId * target_boundary) {
+		this->source_boundary = source_boundary;
+		this->target_boundary = target_boundary;
+	}
+
+	int get_source_partition(VertexId v) {
+		if (source_partition_map) return source_partition_map[v];
+		if (source_boundary) return get_boundary_partition(source_boundary, partitions, v);
+		return get_partition_id(vertices, partitions, v);
+	}
+
+	int get_target_partition(VertexId v) {
+		if (target_partition_map) return target_partition_map[v];
+		if (target_boundary) return get_boundary_partition(target_boundary, partitions, v);
+		return get_partition_id(vertices, partitions, v);
+	}
+
+	// counting sort of a chunk by (source partition, target partition) using O(P) counters,
+	// then emit(block, data, bytes) for every run of edges that belong to the same block
+	void sort_chunk(char * buffer, long bytes, char * tmp, char * sorted, int * counter,
+		std::function<void(long block, char * data, long bytes)> emit) {
+		memset(counter, 0, sizeof(int) * (partitions + 1));
+		for (long pos=0;pos<bytes;pos+=edge_unit) {
+			counter[get_target_partition(*(VertexId*)(buffer+pos+sizeof(VertexId)))+1] += edge_unit;
+		}
+		for (int j=0;j<partitions;j++) counter[j+1] += counter[j];
+		for (long pos=0;pos<bytes;pos+=edge_unit) {
+			int j = get_target_partition(*(VertexId*)(buffer+pos+sizeof(VertexId)));
+			memcpy(tmp+counter[j], buffer+pos, edge_unit);
+			counter[j] += edge_unit;
+		}
+		memset(counter, 0, sizeof(int) * (partitions + 1));
+		for (long pos=0;pos<bytes;pos+=edge_unit) {
+			counter[get_source_partition(*(VertexId*)(tmp+pos))+1] += edge_unit;
+		}
+		for (int i=0;i<partitions;i++) counter[i+1] += counter[i];
+		for (long pos=0;pos<bytes;pos+=edge_unit) {
+			int i = get_source_partition(*(VertexId*)(tmp+pos));
+			memcpy(sorted+counter[i], tmp+pos, edge_unit);
+			counter[i] += edge_unit;
+		}
+		long start = 0;
+		long start_block = -1;
+		for (long pos=0;pos<bytes;pos+=edge_unit) {
+			long block = (long)get_source_partition(*(VertexId*)(sorted+pos)) * partitions
+				+ get_target_partition(*(VertexId*)(sorted+pos+sizeof(VertexId)));
+			if (block!=start_block) {
+				if (pos > start) emit(start_block, sorted+start, pos-start);
+				start = pos;
+				start_block = block;
+			}
+		}
+		if (bytes > start) emit(start_block, sorted+start, bytes-start);
+	}
+
+	// bytes per edge of block ij on disk
+	int get_block_unit(long ij) {
+		return compact ? compact_edge_unit(block_width[ij], edge_type) : edge_unit;
+	}
+
+	// first vertex of every partition and, from the widest of the two ranges, the width of every block
+	void prepare_ranges() {
+		if (source_begin!=nullptr) return;
+		source_begin = new VertexId [partitions+1];
+		target_begin = new VertexId [partitions+1];
+		if (source_boundary!=nullptr && target_boundary!=nullptr) {
+			memcpy(source_begin, source_boundary, sizeof(VertexId) * (partitions+1));
+			memcpy(target_begin, target_boundary, sizeof(VertexId) * (partitions+1));
+		} else {
+			for (int p=0;p<=partitions;p++) {
+				source_begin[p] = vertices;
+				target_begin[p] = vertices;
+			}
+			for (VertexId v=vertices-1;v>=0;v--) {
+				source_begin[get_source_partition(v)] = v;
+				target_begin[get_target_partition(v)] = v;
+			}
+			for (int p=partitions-1;p>=0;p--) {
+				if (source_begin[p] > source_begin[p+1]) source_begin[p] = source_begin[p+1];
+				if (target_begin[p] > target_begin[p+1]) target_begin[p] = target_begin[p+1];
+			}
+		}
+	}
+
+	void prepare_compact() {
+		prepare_ranges();
+		long blocks = (long)partitions * partitions;
+		block_width = new unsigned char [blocks];
+		for (int i=0;i<partitions;i++) {
+			for (int j=0;j<partitions;j++) {
+				block_width[(long)i*partitions+j] = std::max(compact_width(source_begin[i+1] - source_begin[i]),
+					compact_width(target_begin[j+1] - target_begin[j]));
+			}
+		}
+	}
+
+	void count(char * buffer, long bytes, char * tmp, char * sorted, int * counter) {
+		sort_chunk(buffer, bytes, tmp, sorted, counter, [&](long block, char * data, long run_bytes) {
+			__sync_fetch_and_add(&counts[block], run_bytes / edge_unit);
+		});
+	}
+
+	// lay out both files from the block histogram and size the spill buffers from spill_budget bytes
+	void prepare(long spill_budget) {
+		long blocks = (long)partitions * partitions;
+		if (compact) prepare_compact();
+		row_offset[0] = 0;
+		for (long ij=0;ij<blocks;ij++) {
+			row_offset[ij+1] = row_offset[ij] + counts[ij] * get_block_unit(ij);
+		}
+		column_offset[0] = 0;
+		for (int j=0;j<partitions;j++) {
+			for (int i=0;i<partitions;i++) {
+				long ji = (long)j * partitions + i;
+				long ij = (long)i * partitions + j;
+				column_offset[ji+1] = column_offset[ji] + counts[ij] * get_block_unit(ij);
+			}
+		}
+		write_offsets("row_offset", row_offset);
+		write_offsets("column_offset", column_offset);
+		row_activity = new VertexId [get_activity_pages(row_offset[blocks])*2];
+		clear_activity(row_activity, get_activity_pages(row_offset[blocks]));
+		column_activity = new VertexId [get_activity_pages(column_offset[blocks])*2];
+		clear_activity(column_activity, get_activity_pages(column_offset[blocks]));
+
+		cursor = new long [blocks];
+		memcpy(cursor, row_offset, sizeof(long) * blocks);
+		spill_size = std::min(spill_budget / blocks, 65536l) / edge_unit * edge_unit;
+		if (spill_size < edge_unit) spill_size = edge_unit;
+		spill = (char *)memalign(4096, spill_size * blocks);
+		assert(spill!=NULL);
+		spill_bytes = new int [blocks];
+		memset(spill_bytes, 0, sizeof(int) * blocks);
+		locks = new char [blocks];
+		memset(locks, 0, blocks);
+
+		fout_row = open((output+"/row").c_str(), O_WRONLY|O_CREAT|O_TRUNC, 0644);
+		fout_column = open((output+"/column").c_str(), O_WRONLY|O_CREAT|O_TRUNC, 0644);
+		assert(fout_row!=-1 && fout_column!=-1);
+		assert(ftruncate(fout_row, row_offset[blocks])==0);
+		assert(ftruncate(fout_column, column_offset[blocks])==0);
+	}
+
+	void write_offsets(std::string name, long * offset) {
+		int fout = open((output+"/"+name).c_str(), O_WRONLY|O_CREAT|O_TRUNC, 0644);
+		assert(fout!=-1);
+		pwrite_all(fout, (char *)offset, sizeof(long) * ((long)partitions * partitions + 1), 0);
+		close(fout);
+	}
+
+	void write_activity(std::string name, VertexId * activity, long pages) {
+		int fout = open((output+"/"+name).c_str(), O_WRONLY|O_CREAT|O_TRUNC, 0644);
+		assert(fout!=-1);
+		pwrite_all(fout, (char *)activity, sizeof(VertexId) * 2 * pages, 0);
+		close(fout);
+	}
+
+	// append data to block ij in both layouts; callers hold locks[ij]
+	void write_block(long ij, char * data, long bytes) {
+		long i = ij / partitions;
+		long j = ij % partitions;
+		long row_position = cursor[ij];
+		long column_position = column_offset[j*partitions+i] + (row_position - row_offset[ij]);
+		pwrite_all(fout_row, data, bytes, row_position);
+		pwrite_all(fout_column, data, bytes, column_position);
+		cursor[ij] += bytes;
+		int unit = get_block_unit(ij);
+		auto source = [&](long k) -> VertexId {
+			if (!compact) return *(VertexId *)(data + k * unit);
+			uint32_t offset = 0;
+			memcpy(&offset, data + k * unit, block_width[ij]);
+			return source_begin[i] + (VertexId)offset;
+		};
+		record_activity(row_activity, row_position, bytes / unit, unit, source);
+		record_activity(column_activity, column_position, bytes / unit, unit, source);
+	}
+
+	void flush_spill(long ij) {
+		if (spill_bytes[ij] > 0) {
+			write_block(ij, spill + ij * spill_size, spill_bytes[ij]);
+			spill_bytes[ij] = 0;
+		}
+	}
+
+	void append(long ij, char * data, long bytes) {
+		while (__sync_lock_test_and_set(&locks[ij], 1));
+		if (spill_bytes[ij] + bytes > spill_size) {
+			flush_spill(ij);
+		}
+		if (bytes >= spill_size) {
+			write_block(ij, data, bytes);
+		} else {
+			memcpy(spill + ij * spill_size + spill_bytes[ij], data, bytes);
+			spill_bytes[ij] += bytes;
+		}
+		__sync_lock_release(&locks[ij]);
+	}
+
+	void scatter(char * buffer, long bytes, char * tmp, char * sorted, int * counter) {
+		sort_chunk(buffer, bytes, tmp, sorted, counter, [&](long block, char * data, long run_bytes) {
+			if (compact) {
+				// tmp is free once the chunk is sorted; the encoded run fits where the plain one was
+				char * encoded = tmp + (data - sorted);
+				long i = block / partitions;
+				long j = block % partitions;
+				run_bytes = encode_compact_edges(data, run_bytes, edge_type, block_width[block], source_begin[i], target_begin[j], encoded);
+				data = encoded;
+			}
+			append(block, data, run_bytes);
+		});
+	}
+
+	void finish(EdgeId edges) {
+		long blocks = (long)partitions * partitions;
+		#pragma omp parallel for schedule(dynamic, 1024)
+		for (long ij=0;ij<blocks;ij++) {
+			flush_spill(ij);
+		}
+		for (long ij=0;ij<blocks;ij++) {
+			assert(cursor[ij]==row_offset[ij+1]);
+		}
+		close(fout_row);
+		close(fout_column);
+		free(spill);
+		spill = nullptr;
+
+		if (compact) {
+			int fout = open((output+"/block_width").c_str(), O_WRONLY|O_CREAT|O_TRUNC, 0644);
+			assert(fout!=-1);
+			pwrite_all(fout, (char *)block_width, (long)partitions * partitions, 0);
+			close(fout);
+		}
+		write_activity("row_activity", row_activity, get_activity_pages(row_offset[blocks]));
+		write_activity("column_activity", column_activity, get_activity_pages(column_offset[blocks]));
+		write_meta(edges);
+	}
+
+	void write_meta(EdgeId edges) {
+		FILE * fmeta = fopen((output+"/meta").c_str(), "w");
+		fprintf(fmeta, "%d %d %ld %d", edge_type, vertices, edges, partitions);
+		fclose(fmeta);
+	}
+
+	// Moves the blocks of a file (in file order) from their old offsets down to the new ones,
+	// rebuilding its activity index and, if given, counting degrees. Blocks only ever move towards
+	// the start of the file, so a forward copy never overwrites data that is still to be read.
+	void compact_file(int fd, long * old_offset, long * new_offset, bool column_order, VertexId * activity,
+		uint32_t * out_degree, uint32_t * in_degree) {
+		long blocks = (long)partitions * partitions;
+		clear_activity(activity, get_activity_pages(new_offset[blocks]));
+		char * buffer = (char *)memalign(4096, IOSIZE);
+		assert(buffer!=NULL);
+		for (long k=0;k<blocks;k++) {
+			long i = column_order ? k % partitions : k / partitions;
+			long j = column_order ? k / partitions : k % partitions;
+			int width = compact ? block_width[i*partitions+j] : 0;
+			BlockCodec codec(edge_type, width, source_begin[i], source_begin[i+1], target_begin[j], target_begin[j+1], SORT_BY_SOURCE);
+			long bytes = new_offset[k+1] - new_offset[k];
+			long chunk_size = IOSIZE / codec.unit * codec.unit;
+			for (long copied=0;copied<bytes;copied+=chunk_size) {
+				long chunk = std::min(chunk_size, bytes - copied);
+				pread_all(fd, buffer, chunk, old_offset[k] + copied);
+				if (new_offset[k]!=old_offset[k]) pwrite_all(fd, buffer, chunk, new_offset[k] + copied);
+				SortedEdge e;
+				auto source = [&](long n) -> VertexId {
+					codec.decode(buffer + n * codec.unit, codec.unit, &e);
+					if (out_degree!=nullptr) {
+						out_degree[source_begin[i] + e.source]++;
+						in_degree[target_begin[j] + e.target]++;
+					}
+					return source_begin[i] + (VertexId)e.source;
+				};
+				record_activity(activity, new_offset[k] + copied, chunk / codec.unit, codec.unit, source);
+			}
+		}
+		free(buffer);
+		assert(ftruncate(fd, new_offset[blocks])==0);
+	}
+
+	// Sorts the edges within every block of the finished grid (core/blocksort.hpp) by "source",
+	// "target" or "hilbert" order, or by "layout": row blocks by source and column blocks by
+	// target. Blocks that fit budget / threads are sorted in parallel, larger ones one at a time
+	// with the whole budget. Both files are then compacted if edges were dropped (rewriting the
+	// offsets, meta and degrees), and their activity index is rebuilt from the new order.
+	void sort_blocks(std::string order, bool dedup, bool drop_self_loops, long budget) {
+		double start_time = get_time();
+		long blocks = (long)partitions * partitions;
+		int parallelism = std::thread::hardware_concurrency();
+		prepare_ranges();
+		SortKey row_key = order=="target" ? SORT_BY_TARGET : (order=="hilbert" ? SORT_BY_HILBERT : SORT_BY_SOURCE);
+		SortKey column_key = order=="layout" ? SORT_BY_TARGET : row_key;
+		int fd_row = open((output+"/row").c_str(), O_RDWR);
+		int fd_column = open((output+"/column").c_str(), O_RDWR);
+		assert(fd_row!=-1 && fd_column!=-1);
+
+		long * sorted_bytes = new long [blocks];
+		auto sort_one = [&](long ij, long block_budget, int thread_id) {
+			long i = ij / partitions;
+			long j = ij % partitions;
+			int width = compact ? block_width[ij] : 0;
+			BlockCodec row_codec(edge_type, width, source_begin[i], source_begin[i+1], target_begin[j], target_begin[j+1], row_key);
+			BlockCodec column_codec(edge_type, width, source_begin[i], source_begin[i+1], target_begin[j], target_begin[j+1], column_key);
+			long bytes = row_offset[ij+1] - row_offset[ij];
+			long column_position = column_offset[j*partitions+i];
+			std::string scratch = output + "/sort.tmp." + std::to_string(thread_id);
+			if (column_key==row_key) {
+				sorted_bytes[ij] = sort_block(fd_row, row_offset[ij], bytes, row_codec, dedup, drop_self_loops, block_budget, scratch, fd_column, column_position);
+			} else {
+				sorted_bytes[ij] = sort_block(fd_row, row_offset[ij], bytes, row_codec, dedup, drop_self_loops, block_budget, scratch);
+				long column_bytes = sort_block(fd_column, column_position, bytes, column_codec, dedup, drop_self_loops, block_budget, scratch);
+				assert(column_bytes==sorted_bytes[ij]);
+			}
+		};
+		long thread_budget = budget / parallelism;
+		std::vector<long> small_blocks, large_blocks;
+		for (long ij=0;ij<blocks;ij++) {
+			long bytes = row_offset[ij+1] - row_offset[ij];
+			if (block_sort_memory(bytes, get_block_unit(ij)) <= thread_budget) {
+				small_blocks.push_back(ij);
+			} else {
+				large_blocks.push_back(ij);
+			}
+		}
+		#pragma omp parallel for schedule(dynamic, 1) num_threads(parallelism)
+		for (long k=0;k<(long)small_blocks.size();k++) {
+			sort_one(small_blocks[k], thread_budget, omp_get_thread_num());
+		}
+		for (long ij : large_blocks) {
+			sort_one(ij, budget, 0);
+		}
+
+		long * new_row_offset = new long [blocks+1];
+		long * new_column_offset = new long [blocks+1];
+		new_row_offset[0] = 0;
+		EdgeId edges = 0, old_edges = 0;
+		for (long ij=0;ij<blocks;ij++) {
+			new_row_offset[ij+1] = new_row_offset[ij] + sorted_bytes[ij];
+			old_edges += counts[ij];
+			counts[ij] = sorted_bytes[ij] / get_block_unit(ij);
+			edges += counts[ij];
+		}
+		new_column_offset[0] = 0;
+		for (int j=0;j<partitions;j++) {
+			for (int i=0;i<partitions;i++) {
+				long ji = (long)j * partitions + i;
+				new_column_offset[ji+1] = new_column_offset[ji] + sorted_bytes[(long)i*partitions+j];
+			}
+		}
+		// dropped edges change the degrees, which are then recounted from the row file
+		uint32_t * out_degree = nullptr;
+		uint32_t * in_degree = nullptr;
+		if (edges!=old_edges) {
+			out_degree = new uint32_t [vertices]();
+			in_degree = new uint32_t [vertices]();
+		}
+		compact_file(fd_row, row_offset, new_row_offset, false, row_activity, out_degree, in_degree);
+		compact_file(fd_column, column_offset, new_column_offset, true, column_activity, nullptr, nullptr);
+		close(fd_row);
+		close(fd_column);
+		memcpy(row_offset, new_row_offset, sizeof(long) * (blocks+1));
+		memcpy(column_offset, new_column_offset, sizeof(long) * (blocks+1));
+		write_offsets("row_offset", row_offset);
+		write_offsets("column_offset", column_offset);
+		write_activity("row_activity", row_activity, get_activity_pages(row_offset[blocks]));
+		write_activity("column_activity", column_activity, get_activity_pages(column_offset[blocks]));
+		if (edges!=old_edges) {
+			write_meta(edges);
+			// the degree file may be a hard link shared with other grids (preprocess_dv -L)
+			unlink((output+"/degrees").c_str());
+			save_grid_degrees(output, vertices, edges, out_degree, in_degree);
+			delete [] out_degree;
+			delete [] in_degree;
+		}
+		delete [] sorted_bytes;
+		delete [] new_row_offset;
+		delete [] new_column_offset;
+		printf("blocks of %s sorted by %s in %.2f seconds, %ld of %ld edges dropped\n", output.c_str(), order.c_str(), get_time() - start_time, old_edges - edges, old_edges);
+	}
+};
+
+// build every grid from two sequential scans of the input (block histogram, then scatter);
+// with a relabel map, edge (u, v) is written as (relabel[u], relabel[v]); out_degree/in_degree,
+// if given, are counted (in the grid's IDs) during the first scan
+inline void generate_edge_grids(std::string input, std::vector<GridWriter*> grids, long spill_budget,
+	const VertexId * relabel = nullptr, uint32_t * out_degree = nullptr, uint32_t * in_degree = nullptr) {
+	assert(!grids.empty());
+	int parallelism = std::thread::hardware_concurrency();
+	int edge_type = grids[0]->edge_type;
+	VertexId vertices = grids[0]->vertices;
+	int edge_unit = get_edge_unit(edge_type);
+	EdgeId edges = file_size(input) / edge_unit;
+	printf("vertices = %d, edges = %ld\n", vertices, edges);
+
+	int max_partitions = 0;
+	for (auto grid : grids) {
+		max_partitions = std::max(max_partitions, grid->partitions);
+	}
+	std::vector<char *> tmp(parallelism), sorted(parallelism);
+	std::vector<int *> counter(parallelism);
+	for (int ti=0;ti<parallelism;ti++) {
+		tmp[ti] = (char *)memalign(4096, IOSIZE);
+		sorted[ti] = (char *)memalign(4096, IOSIZE);
+		counter[ti] = new int [max_partitions+1];
+	}
+
+	auto apply_relabel = [&](char * buffer, long bytes) {
+		if (relabel==nullptr) return;
+		for (long pos=0;pos<bytes;pos+=edge_unit) {
+			VertexId * edge = (VertexId *)(buffer+pos);
+			edge[0] = relabel[edge[0]];
+			edge[1] = relabel[edge[1]];
+		}
+	};
+
+	double start_time = get_time();
+	scan_edge_list(input, parallelism, [&](int thread_id, char * buffer, long bytes) {
+		apply_relabel(buffer, bytes);
+		if (out_degree!=nullptr) {
+			for (long pos=0;pos<bytes;pos+=edge_unit) {
+				__sync_fetch_and_add(&out_degree[*(VertexId *)(buffer+pos)], 1);
+				__sync_fetch_and_add(&in_degree[*(VertexId *)(buffer+pos+sizeof(VertexId))], 1);
+			}
+		}
+		for (auto grid : grids) {
+			grid->count(buffer, bytes, tmp[thread_id], sorted[thread_id], counter[thread_id]);
+		}
+	});
+	printf("it takes %.2f seconds to count edges per block\n", get_time() - start_time);
+
+	for (auto grid : grids) {
+		grid->prepare(spill_budget / grids.size());
+	}
+	scan_edge_list(input, parallelism, [&](int thread_id, char * buffer, long bytes) {
+		apply_relabel(buffer, bytes);
+		for (auto grid : grids) {
+			grid->scatter(buffer, bytes, tmp[thread_id], sorted[thread_id], counter[thread_id]);
+		}
+	});
+	for (auto grid : grids) {
+		grid->finish(edges);
+	}
+	printf("row and column oriented grids generated\n");
+
+	for (int ti=0;ti<parallelism;ti++) {
+		free(tmp[ti]);
+		free(sorted[ti]);
+		delete [] counter[ti];
+	}
+	printf("it takes %.2f seconds to generate edge grid\n", get_time() - start_time);
+}
+
+#endif
@@ -0,0 +1,181 @@
+/*
+Copyright (c) 2014-2015 Xiaowei Zhu, Tsinghua University
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+*/
+
+#ifndef METRICS_H
+#define METRICS_H
+
+#include <stdio.h>
+#include <stdlib.h>
+#include <string.h>
+#include <unistd.h>
+
+#include <string>
+#include <vector>
+
+#include "core/time.hpp"
+
+// Optional structured output: when GRIDGRAPH_METRICS names a file, every phase appends one
+// JSON line with the program, its configuration, wall time, bytes read/written (from
+// /proc/self/io) and per-iteration times. GRIDGRAPH_METRICS_TAGS="dataset=twitter,run=2"
+// adds labels to the configuration. Without GRIDGRAPH_METRICS nothing is written.
+
+struct IOCounters {
+	long rchar;
+	long wchar;
+	long read_bytes;
+	long write_bytes;
+};
+
+inline IOCounters read_io_counters() {
+	IOCounters counters = {0, 0, 0, 0};
+	FILE * fin = fopen("/proc/self/io", "r");
+	if (fin==NULL) return counters;
+	char key[64];
+	long value;
+	while (fscanf(fin, "%63[^:]: %ld\n", key, &value)==2) {
+		if (strcmp(key, "rchar")==0) counters.rchar = value;
+		else if (strcmp(key, "wchar")==0) counters.wchar = value;
+		else if (strcmp(key, "read_bytes")==0) counters.read_bytes = value;
+		else if (strcmp(key, "write_bytes")==0) counters.write_bytes = value;
+	}
+	fclose(fin);
+	return counters;
+}
+
+class MetricsLog {
+	FILE * fout;
+	std::string program;
+	std::string config;
+	double start_time;
+	double phase_start_time;
+	IOCounters phase_start_io;
+	std::vector<double> iteration_times;
+
+	static std::string quote(const std::string & s) {
+		std::string quoted = "\"";
+		for (char c : s) {
+			if (c=='"' || c=='\\') {
+				quoted += '\\';
+				quoted += c;
+			} else if ((unsigned char)c < 0x20) {
+				char escaped[8];
+				sprintf(escaped, "\\u%04x", c);
+				quoted += escaped;
+			} else {
+				quoted += c;
+			}
+		}
+		return quoted + "\"";
+	}
+
+	void add_member(const std::string & key, const std::string & json_value) {
+		if (!config.empty()) config += ",";
+		config += quote(key) + ":" + json_value;
+	}
+public:
+	MetricsLog(std::string program) : fout(NULL), program(program) {
+		start_time = get_time();
+		const char * filename = getenv("GRIDGRAPH_METRICS");
+		if (filename!=NULL && filename[0]!='\0') {
+			fout = fopen(filename, "a");
+			if (fout==NULL) {
+				fprintf(stderr, "warning: cannot open metrics file %s\n", filename);
+			}
+		}
+		const char * tags = getenv("GRIDGRAPH_METRICS_TAGS");
+		if (tags!=NULL) {
+			std::string list = tags;
+			size_t begin = 0;
+			while (begin < list.size()) {
+				size_t end = list.find(',', begin);
+				if (end==std::string::npos) end = list.size();
+				std::string item = list.substr(begin, end - begin);
+				size_t eq = item.find('=');
+				if (eq!=std::string::npos) {
+					set(item.substr(0, eq), item.substr(eq + 1));
+				}
+				begin = end + 1;
+			}
+		}
+		begin_phase();
+	}
+
+	~MetricsLog() {
+		if (fout!=NULL) fclose(fout);
+	}
+
+	bool enabled() const {
+		return fout!=NULL;
+	}
+
+	void set(const std::string & key, const std::string & value) {
+		add_member(key, quote(value));
+	}
+
+	void set(const std::string & key, const char * value) {
+		add_member(key, quote(value));
+	}
+
+	void set(const std::string & key, long value) {
+		add_member(key, std::to_string(value));
+	}
+
+	void set(const std::string & key, int value) {
+		add_member(key, std::to_string(value));
+	}
+
+	void set(const std::string & key, double value) {
+		char buffer[32];
+		sprintf(buffer, "%.17g", value);
+		add_member(key, buffer);
+	}
+
+	// starts timing a phase (called implicitly by the constructor and end_phase)
+	void begin_phase() {
+		phase_start_time = get_time();
+		if (fout!=NULL) phase_start_io = read_io_counters();
+		iteration_times.clear();
+	}
+
+	void add_iteration(double seconds) {
+		iteration_times.push_back(seconds);
+	}
+
+	// writes the record of the phase started by the last begin_phase/end_phase
+	void end_phase(const std::string & phase) {
+		double now = get_time();
+		if (fout!=NULL) {
+			IOCounters io = read_io_counters();
+			fprintf(fout, "{\"program\":%s,\"pid\":%d,\"start_time\":%.6f,\"phase\":%s,\"config\":{%s},"
+				"\"seconds\":%.6f,\"bytes_read\":%ld,\"bytes_written\":%ld,\"storage_bytes_read\":%ld,\"storage_bytes_written\":%ld",
+				quote(program).c_str(), (int)getpid(), start_time, quote(phase).c_str(), config.c_str(),
+				now - phase_start_time, io.rchar - phase_start_io.rchar, io.wchar - phase_start_io.wchar,
+				io.read_bytes - phase_start_io.read_bytes, io.write_bytes - phase_start_io.write_bytes);
+			if (!iteration_times.empty()) {
+				fprintf(fout, ",\"iteration_seconds\":[");
+				for (size_t i=0;i<iteration_times.size();i++) {
+					fprintf(fout, "%s%.6f", i==0?"":",", iteration_times[i]);
+				}
+				fprintf(fout, "]");
+			}
+			fprintf(fout, "}\n");
+			fflush(fout);
+		}
+		begin_phase();
+	}
+};
+
+#endif
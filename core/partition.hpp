@@ -41,4 +41,19 @@ inline std::pair<size_t, size_t> get_partition_range(const size_t vertices, cons
         return std::make_pair(begin, end);
 }
 
+// partition of vertex_id under boundaries boundary[0]=0 <= ... <= boundary[partitions]=vertices, i.e.
+// the last p with boundary[p] <= vertex_id (empty partitions are skipped). The search halves a
+// window of fixed length, so the loop has log2(partitions) iterations and no data-dependent branch.
+template <typename T>
+inline int get_boundary_partition(const T * boundary, const int partitions, const T vertex_id) {
+        const T * base = boundary;
+        int length = partitions;
+        while (length > 1) {
+                const int half = length / 2;
+                base = (base[half] <= vertex_id) ? base + half : base;
+                length -= half;
+        }
+        return base - boundary;
+}
+
 #endif
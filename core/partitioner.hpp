@@ -0,0 +1,333 @@
+/*
+Copyright (c) 2014-2015 Xiaowei Zhu, Tsinghua University
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+*/
+
+#ifndef PARTITIONER_H
+#define PARTITIONER_H
+
+#include <stdio.h>
+#include <stdlib.h>
+#include <unistd.h>
+#include <fcntl.h>
+#include <assert.h>
+#include <math.h>
+
+#include <string>
+#include <vector>
+#include <algorithm>
+#include <iterator>
+
+#include "core/type.hpp"
+#include "core/filesystem.hpp"
+
+// Vertex partitioners of preprocess_dv (-s). They all describe a partitioning by P+1 boundaries:
+// partition p holds the vertices [boundary[p], boundary[p+1]).
+
+// boundaries of a non-decreasing partition map
+inline std::vector<VertexId> partition_map_to_boundary(const std::vector<int>& partition_map, int partitions, VertexId vertices) {
+	std::vector<VertexId> boundary(partitions + 1, vertices);
+	boundary[0] = 0;
+	int partition_id = 1;
+	for (VertexId v_id = 0; v_id < vertices && partition_id < partitions; ++v_id) {
+		while (partition_id < partitions && partition_map[v_id] >= partition_id) {
+			boundary[partition_id++] = v_id;
+		}
+	}
+	return boundary;
+}
+
+inline std::vector<int> boundary_to_partition_map(const std::vector<VertexId>& boundary, int partitions, VertexId vertices) {
+	std::vector<int> partition_map(vertices);
+	#pragma omp parallel for schedule(dynamic, 1)
+	for (int p = 0; p < partitions; ++p) {
+		std::fill(partition_map.begin() + boundary[p], partition_map.begin() + boundary[p+1], p);
+	}
+	return partition_map;
+}
+
+// Optimal 1-D linear partition: the contiguous split of weight(0..vertices-1) into `partitions`
+// ranges whose largest sum is minimal. The bottleneck B is found by binary search over greedy
+// feasibility probes (O(V) each, no extra memory). A plain greedy sweep with B would fill the
+// first ranges up to B and leave the last ones nearly empty whenever one heavy vertex sets B, so
+// the final sweep aims at remaining weight / remaining partitions like the greedy strategy and
+// only cuts early where a right-to-left greedy pass shows the rest still fits in the partitions left.
+template <class WeightOf>
+std::vector<VertexId> linear_partition(WeightOf weight, VertexId vertices, int partitions) {
+	long total = 0, heaviest = 0;
+	#pragma omp parallel for reduction(+:total) reduction(max:heaviest)
+	for (VertexId v_id = 0; v_id < vertices; ++v_id) {
+		long w = weight(v_id);
+		total += w;
+		if (w > heaviest) heaviest = w;
+	}
+	auto feasible = [&](long bottleneck) {
+		int parts = 1;
+		long sum = 0;
+		for (VertexId v_id = 0; v_id < vertices; ++v_id) {
+			long w = weight(v_id);
+			if (sum + w > bottleneck) {
+				if (++parts > partitions) return false;
+				sum = 0;
+			}
+			sum += w;
+		}
+		return true;
+	};
+	long low = std::max(heaviest, (total + partitions - 1) / partitions), high = std::max(total, 1l);
+	while (low < high) {
+		long middle = low + (high - low) / 2;
+		if (feasible(middle)) high = middle;
+		else low = middle + 1;
+	}
+
+	// right-to-left greedy: a suffix starting at v needs 1 + |{c in starts : c > v}| ranges
+	std::vector<VertexId> starts;
+	long sum = 0;
+	for (VertexId v_id = vertices - 1; v_id >= 0; --v_id) {
+		long w = weight(v_id);
+		if (sum + w > low) {
+			starts.push_back(v_id + 1);
+			sum = 0;
+		}
+		sum += w;
+	}
+	std::reverse(starts.begin(), starts.end());
+	auto needed = [&](VertexId v_id) {
+		return 1 + (int)(starts.end() - std::upper_bound(starts.begin(), starts.end(), v_id));
+	};
+
+	std::vector<VertexId> boundary(partitions + 1, vertices);
+	boundary[0] = 0;
+	int p = 0;
+	long remaining = total;
+	sum = 0;
+	for (VertexId v_id = 0; v_id < vertices && p < partitions - 1; ++v_id) {
+		long w = weight(v_id);
+		if (v_id > boundary[p]) {
+			double target = (double)remaining / (partitions - p);
+			bool full = sum + w > low;
+			bool balanced = sum + w > target && target - sum <= sum + w - target && needed(v_id) <= partitions - 1 - p;
+			bool nonempty = (long)vertices - v_id - 1 < partitions - 1 - p;
+			if (full || balanced || nonempty) {
+				boundary[++p] = v_id;
+				remaining -= sum;
+				sum = 0;
+			}
+		}
+		sum += w;
+	}
+	return boundary;
+}
+
+// Edges read from evenly spaced windows of the input; used to estimate the joint (source,
+// target) distribution that the per-vertex degrees do not capture.
+struct EdgeSample {
+	std::vector<VertexId> source;
+	std::vector<VertexId> target;
+	long edges; // edges in the input
+};
+
+inline EdgeSample sample_edges(std::string input, int edge_type, long samples, const VertexId * relabel = nullptr) {
+	const long windows = 1024;
+	int edge_unit = (edge_type==0) ? sizeof(VertexId) * 2 : sizeof(VertexId) * 2 + sizeof(Weight);
+	EdgeSample sample;
+	sample.edges = file_size(input) / edge_unit;
+	long per_window = std::max(1l, samples / windows);
+	long window_count = std::min(windows, (sample.edges + per_window - 1) / per_window);
+	if (sample.edges <= samples) {
+		per_window = sample.edges;
+		window_count = sample.edges > 0 ? 1 : 0;
+	}
+	int fin = open(input.c_str(), O_RDONLY);
+	assert(fin!=-1);
+	char * buffer = new char [per_window * edge_unit];
+	for (long w = 0; w < window_count; w++) {
+		long first = (window_count > 1) ? (sample.edges - per_window) / (window_count - 1) * w : 0;
+		long bytes = pread(fin, buffer, per_window * edge_unit, first * edge_unit);
+		assert(bytes==per_window * edge_unit);
+		for (long pos = 0; pos < bytes; pos += edge_unit) {
+			VertexId source = *(VertexId *)(buffer + pos);
+			VertexId target = *(VertexId *)(buffer + pos + sizeof(VertexId));
+			sample.source.push_back(relabel ? relabel[source] : source);
+			sample.target.push_back(relabel ? relabel[target] : target);
+		}
+	}
+	delete [] buffer;
+	close(fin);
+	return sample;
+}
+
+inline int find_partition(const std::vector<VertexId>& boundary, VertexId v_id) {
+	return std::upper_bound(boundary.begin(), boundary.end(), v_id) - boundary.begin() - 1;
+}
+
+// predicted P x P block sizes (in edges) of a pair of partitionings
+inline std::vector<double> predict_blocks(const EdgeSample& sample, const std::vector<VertexId>& source_boundary,
+	const std::vector<VertexId>& target_boundary, int partitions) {
+	std::vector<double> blocks((long)partitions * partitions, 0);
+	double scale = sample.source.empty() ? 0 : (double)sample.edges / sample.source.size();
+	for (size_t e = 0; e < sample.source.size(); e++) {
+		blocks[(long)find_partition(source_boundary, sample.source[e]) * partitions + find_partition(target_boundary, sample.target[e])] += scale;
+	}
+	return blocks;
+}
+
+inline void report_blocks(const std::vector<double>& blocks, int partitions, long samples) {
+	double total = 0, squares = 0, largest = 0;
+	long empty = 0;
+	std::vector<double> rows(partitions, 0), columns(partitions, 0);
+	for (int i = 0; i < partitions; i++) {
+		for (int j = 0; j < partitions; j++) {
+			double b = blocks[(long)i * partitions + j];
+			total += b;
+			squares += b * b;
+			largest = std::max(largest, b);
+			rows[i] += b;
+			columns[j] += b;
+			if (b==0) empty++;
+		}
+	}
+	long count = (long)partitions * partitions;
+	double mean = total / count;
+	double cv = mean > 0 ? sqrt(std::max(0.0, squares / count - mean * mean)) / mean : 0;
+	printf("Predicted blocks (P=%d, %ld sampled edges): max %.0f edges (%.2fx mean), CV %.3f, %ld empty; "
+		"max row %.2fx, max column %.2fx mean\n", partitions, samples, largest, mean > 0 ? largest / mean : 0, cv, empty,
+		total > 0 ? *std::max_element(rows.begin(), rows.end()) / (total / partitions) : 0,
+		total > 0 ? *std::max_element(columns.begin(), columns.end()) / (total / partitions) : 0);
+}
+
+// Iterative 2-D refinement. Each axis is cut into fine ranges: the given starting boundaries
+// plus min(16P, 4096) equal-degree ranges. The sampled edges form a histogram over the fine
+// ranges with 2-D prefix sums, so any block is estimated in O(1). Coordinate descent then moves
+// one boundary at a time between its neighbours, keeping the position that minimises the
+// largest block (ties: the sum of squares) or, for the variance objective, the sum of squared
+// block sizes, until a sweep over both axes no longer improves. It starts from the given
+// boundaries and only accepts improvements, so the estimate never gets worse than the start.
+class GridRefiner {
+	long width; // fine target ranges + 1
+	std::vector<int> prefix; // (fine source ranges + 1) x width sampled edge counts
+public:
+	std::vector<VertexId> fine_source;
+	std::vector<VertexId> fine_target;
+
+	static int fine_ranges(int partitions, VertexId vertices) {
+		return std::min<long>(std::min(16l * partitions, 4096l), vertices);
+	}
+
+	// fine boundaries: sorted union of the starting and the equal-degree boundaries
+	static std::vector<VertexId> merge_boundaries(const std::vector<VertexId>& a, const std::vector<VertexId>& b) {
+		std::vector<VertexId> merged;
+		std::set_union(a.begin(), a.end(), b.begin(), b.end(), std::back_inserter(merged));
+		merged.erase(std::unique(merged.begin(), merged.end()), merged.end());
+		return merged;
+	}
+
+	GridRefiner(const EdgeSample& sample, std::vector<VertexId> fine_source, std::vector<VertexId> fine_target) {
+		this->fine_source = fine_source;
+		this->fine_target = fine_target;
+		long height = fine_source.size();
+		width = fine_target.size();
+		prefix.assign(height * width, 0);
+		for (size_t e = 0; e < sample.source.size(); e++) {
+			prefix[(long)(find_partition(fine_source, sample.source[e]) + 1) * width + find_partition(fine_target, sample.target[e]) + 1]++;
+		}
+		for (long a = 1; a < height; a++) {
+			for (long c = 1; c < width; c++) {
+				prefix[a * width + c] += prefix[(a - 1) * width + c] + prefix[a * width + c - 1] - prefix[(a - 1) * width + c - 1];
+			}
+		}
+	}
+
+	// sampled edges with source in fine ranges [a, b) and target in fine ranges [c, d)
+	long count(int a, int b, int c, int d) const {
+		return (long)prefix[b * width + d] - prefix[a * width + d] - prefix[b * width + c] + prefix[a * width + c];
+	}
+
+	// refines source_boundary/target_boundary (which must be fine boundaries) in place
+	void refine(int partitions, bool minimise_variance, std::vector<VertexId>& source_boundary,
+		std::vector<VertexId>& target_boundary, int max_rounds = 32) {
+		std::vector<int> source(partitions + 1), target(partitions + 1);
+		for (int k = 0; k <= partitions; k++) {
+			source[k] = find_partition(fine_source, source_boundary[k]);
+			target[k] = find_partition(fine_target, target_boundary[k]);
+		}
+		// stripe k of the moving axis: its P blocks against every range of the other axis
+		auto stripe = [&](const std::vector<int>& moving, const std::vector<int>& other, bool moving_is_source, int k,
+			double & largest, double & squares) {
+			largest = squares = 0;
+			for (int m = 0; m < partitions; m++) {
+				double b = moving_is_source ? count(moving[k], moving[k+1], other[m], other[m+1])
+					: count(other[m], other[m+1], moving[k], moving[k+1]);
+				largest = std::max(largest, b);
+				squares += b * b;
+			}
+		};
+		auto better = [&](double largest, double squares, double best_largest, double best_squares) {
+			if (minimise_variance) return squares < best_squares;
+			return largest < best_largest || (largest==best_largest && squares < best_squares);
+		};
+		int round = 0;
+		bool improved = true;
+		for (; round < max_rounds && improved; round++) {
+			improved = false;
+			for (int axis = 0; axis < 2; axis++) {
+				std::vector<int>& moving = axis==0 ? source : target;
+				std::vector<int>& other = axis==0 ? target : source;
+				std::vector<double> stripe_largest(partitions), stripe_squares(partitions);
+				for (int k = 0; k < partitions; k++) {
+					stripe(moving, other, axis==0, k, stripe_largest[k], stripe_squares[k]);
+				}
+				for (int k = 1; k < partitions; k++) {
+					double rest_largest = 0, rest_squares = 0;
+					for (int m = 0; m < partitions; m++) {
+						if (m==k-1 || m==k) continue;
+						rest_largest = std::max(rest_largest, stripe_largest[m]);
+						rest_squares += stripe_squares[m];
+					}
+					int original = moving[k], best = original;
+					double best_largest = std::max(rest_largest, std::max(stripe_largest[k-1], stripe_largest[k]));
+					double best_squares = rest_squares + stripe_squares[k-1] + stripe_squares[k];
+					for (int position = moving[k-1] + 1; position < moving[k+1]; position++) {
+						if (position==original) continue;
+						moving[k] = position;
+						double l0, s0, l1, s1;
+						stripe(moving, other, axis==0, k-1, l0, s0);
+						stripe(moving, other, axis==0, k, l1, s1);
+						double largest = std::max(rest_largest, std::max(l0, l1));
+						double squares = rest_squares + s0 + s1;
+						if (better(largest, squares, best_largest, best_squares)) {
+							best = position;
+							best_largest = largest;
+							best_squares = squares;
+						}
+					}
+					moving[k] = best;
+					if (best!=original) {
+						improved = true;
+						stripe(moving, other, axis==0, k-1, stripe_largest[k-1], stripe_squares[k-1]);
+						stripe(moving, other, axis==0, k, stripe_largest[k], stripe_squares[k]);
+					}
+				}
+			}
+		}
+		printf("2-D refinement %s after %d rounds\n", improved ? "stopped" : "converged", round);
+		for (int k = 0; k <= partitions; k++) {
+			source_boundary[k] = fine_source[source[k]];
+			target_boundary[k] = fine_target[target[k]];
+		}
+	}
+};
+
+#endif
@@ -0,0 +1,147 @@
+/*
+Copyright (c) 2014-2015 Xiaowei Zhu, Tsinghua University
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+*/
+
+#ifndef TRACE_H
+#define TRACE_H
+
+#include <stdio.h>
+#include <stdlib.h>
+#include <string.h>
+#include <time.h>
+
+#include <vector>
+
+// Opt-in tracing of Graph::stream_edges: when GRIDGRAPH_TRACE names a file, every call appends
+// fixed-size binary records (read by gridgraph/trace.py). Worker threads fill their own buffer and
+// the calling thread writes all buffers once at the end of the call.
+
+#define TRACE_MAGIC "GGTRACE"
+#define TRACE_VERSION 1
+
+enum TraceRecordType {
+	TRACE_CALL = 0,   // one stream_edges call: block = update mode
+	TRACE_WINDOW = 1, // one partition_batch window: block = first source partition
+	TRACE_TASK = 2,   // one pread task: block = i*partitions+j of the block that issued it, -1 for the final pop
+};
+
+struct TraceHeader {
+	char magic[8];
+	int version;
+	int partitions;
+	int threads;
+	int edge_type;
+	long vertices;
+	long edges;
+	double start_time;
+};
+
+struct TraceRecord {
+	int type;
+	int call;
+	int window;
+	int thread;
+	int block;
+	int batch;     // partition_batch of the call
+	long bytes;    // bytes returned by pread (tasks), bytes read (windows, calls)
+	long edges;    // edges scanned
+	double begin;  // pop() called (tasks), start (windows, calls)
+	double popped; // pop() returned
+	double read;   // pread returned
+	double end;    // edges processed (tasks), end (windows, calls)
+};
+
+class Tracer {
+	FILE * fout;
+	int calls;
+	std::vector<std::vector<TraceRecord> > buffers;
+public:
+	Tracer() : fout(NULL), calls(0) { }
+
+	~Tracer() {
+		if (fout!=NULL) fclose(fout);
+	}
+
+	void open(int threads, int partitions, int edge_type, long vertices, long edges) {
+		const char * filename = getenv("GRIDGRAPH_TRACE");
+		if (filename==NULL || filename[0]=='\0') return;
+		fout = fopen(filename, "wb");
+		if (fout==NULL) {
+			fprintf(stderr, "warning: cannot open trace file %s\n", filename);
+			return;
+		}
+		TraceHeader header;
+		memset(&header, 0, sizeof(header));
+		strncpy(header.magic, TRACE_MAGIC, sizeof(header.magic));
+		header.version = TRACE_VERSION;
+		header.partitions = partitions;
+		header.threads = threads;
+		header.edge_type = edge_type;
+		header.vertices = vertices;
+		header.edges = edges;
+		header.start_time = now();
+		fwrite(&header, sizeof(header), 1, fout);
+		// one buffer per worker thread, plus one for the calling thread
+		buffers.resize(threads + 1);
+		for (auto & buffer : buffers) {
+			buffer.reserve(1024);
+		}
+	}
+
+	bool enabled() const {
+		return fout!=NULL;
+	}
+
+	static double now() {
+		struct timespec ts;
+		clock_gettime(CLOCK_MONOTONIC, &ts);
+		return ts.tv_sec + ts.tv_nsec / 1e9;
+	}
+
+	int begin_call() {
+		return calls++;
+	}
+
+	// thread = -1 records from the calling thread
+	void record(int thread, int type, int call, int window, int block, int batch, long bytes, long edges,
+		double begin, double popped, double read, double end) {
+		TraceRecord r;
+		r.type = type;
+		r.call = call;
+		r.window = window;
+		r.thread = thread;
+		r.block = block;
+		r.batch = batch;
+		r.bytes = bytes;
+		r.edges = edges;
+		r.begin = begin;
+		r.popped = popped;
+		r.read = read;
+		r.end = end;
+		buffers[thread + 1].push_back(r);
+	}
+
+	void flush() {
+		for (auto & buffer : buffers) {
+			if (!buffer.empty()) {
+				fwrite(buffer.data(), sizeof(TraceRecord), buffer.size(), fout);
+				buffer.clear();
+			}
+		}
+		fflush(fout);
+	}
+};
+
+#endif
@@ -15,6 +15,7 @@ Copyright (c) 2014-2015 Xiaowei Zhu, Tsinghua University
 */
 
 #include "core/graph.hpp"
+#include "core/metrics.hpp"
 
 int main(int argc, char ** argv) {
 	if (argc<3) {
@@ -38,7 +39,17 @@ int main(int argc, char ** argv) {
 	parent[start_vid] = start_vid;
 	VertexId active_vertices = 1;
 
+	MetricsLog metrics("bfs");
+	metrics.set("path", path);
+	metrics.set("memory_bytes", memory_bytes);
+	metrics.set("vertices", (long)graph.vertices);
+	metrics.set("edges", (long)graph.edges);
+	metrics.set("partitions", graph.partitions);
+	metrics.set("io_depth", graph.get_io_depth());
+	metrics.set("start_vertex", (long)start_vid);
+
 	double start_time = get_time();
+	metrics.begin_phase();
 	int iteration = 0;
 	while (active_vertices!=0) {
 		iteration++;
@@ -57,11 +68,13 @@ int main(int argc, char ** argv) {
 		}, active_in);
 	}
 	double end_time = get_time();
+	metrics.end_phase("run");
 
 	int discovered_vertices = graph.stream_vertices<VertexId>([&](VertexId i){
 		return parent[i]!=-1;
 	});
 	printf("discovered %d vertices from %d in %.2f seconds.\n", discovered_vertices, start_vid, end_time - start_time);
+	graph.print_io_stats();
 
 	return 0;
 }
@@ -0,0 +1,385 @@
+/*
+Copyright (c) 2014-2015 Xiaowei Zhu, Tsinghua University
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+*/
+
+#include "core/graph.hpp"
+#include "core/metrics.hpp"
+
+#include <string>
+#include <vector>
+
+// Runs several analytics over one grid with a single edge pass per round (Graph::stream_edges_fused).
+// Every round, each algorithm that has not finished contributes one iteration's edge kernel; after
+// the pass each runs its own vertex update. All kernels use target oriented updates over source
+// windows, so any iterations of them can share a pass. Results are written to the same files as the
+// standalone binaries (pagerank, output, label, parent).
+
+class Analytic {
+public:
+	std::string name;
+	int passes;
+	Analytic(std::string name) : name(name), passes(0) { }
+	virtual ~Analytic() { }
+	// bytes of vertex data the algorithm keeps
+	virtual long vertex_bytes() = 0;
+	virtual void init() = 0;
+	// the edge kernel of the next iteration
+	virtual EdgeKernel kernel() = 0;
+	// the vertex update after the pass; false once the algorithm is done
+	virtual bool apply() = 0;
+	virtual void report() = 0;
+};
+
+class PageRank : public Analytic {
+	Graph & graph;
+	int iterations;
+	BigVector<float> pagerank;
+	BigVector<float> sum;
+public:
+	PageRank(Graph & graph, int iterations) : Analytic("pagerank"), graph(graph), iterations(iterations),
+		pagerank(graph.path+"/pagerank", graph.vertices), sum(graph.path+"/sum", graph.vertices) { }
+	long vertex_bytes() {
+		return (long)graph.vertices * ( sizeof(VertexId) + sizeof(float) + sizeof(float) );
+	}
+	void init() {
+		graph.hint(pagerank, sum);
+		graph.stream_vertices<VertexId>(
+			[&](VertexId i){
+				pagerank[i] = 1.f / graph.out_degree[i];
+				sum[i] = 0;
+				return 0;
+			}, nullptr, 0,
+			[&](std::pair<VertexId,VertexId> vid_range){
+				pagerank.load(vid_range.first, vid_range.second);
+				sum.load(vid_range.first, vid_range.second);
+			},
+			[&](std::pair<VertexId,VertexId> vid_range){
+				pagerank.save();
+				sum.save();
+			}
+		);
+	}
+	EdgeKernel kernel() {
+		return EdgeKernel(
+			[&](Edge & e){
+				write_add(&sum[e.target], pagerank[e.source]);
+			}, nullptr, (long)graph.vertices * sizeof(float),
+			[&](std::pair<VertexId,VertexId> source_vid_range){
+				pagerank.lock(source_vid_range.first, source_vid_range.second);
+			},
+			[&](std::pair<VertexId,VertexId> source_vid_range){
+				pagerank.unlock(source_vid_range.first, source_vid_range.second);
+			}
+		);
+	}
+	bool apply() {
+		passes++;
+		bool last = passes==iterations;
+		graph.hint(pagerank, sum);
+		graph.stream_vertices<VertexId>(
+			[&](VertexId i){
+				if (last) {
+					pagerank[i] = 0.15f + 0.85f * sum[i];
+				} else {
+					pagerank[i] = (0.15f + 0.85f * sum[i]) / graph.out_degree[i];
+					sum[i] = 0;
+				}
+				return 0;
+			}, nullptr, 0,
+			[&](std::pair<VertexId,VertexId> vid_range){
+				pagerank.load(vid_range.first, vid_range.second);
+				sum.load(vid_range.first, vid_range.second);
+			},
+			[&](std::pair<VertexId,VertexId> vid_range){
+				pagerank.save();
+				sum.save();
+			}
+		);
+		return !last;
+	}
+	void report() {
+		printf("pagerank: %d iterations\n", passes);
+	}
+};
+
+class SpMV : public Analytic {
+	Graph & graph;
+	BigVector<float> input;
+	BigVector<float> output;
+public:
+	SpMV(Graph & graph) : Analytic("spmv"), graph(graph),
+		input(graph.path+"/input", graph.vertices), output(graph.path+"/output", graph.vertices) { }
+	long vertex_bytes() {
+		return (long)graph.vertices * ( sizeof(float) * 2 );
+	}
+	void init() {
+		graph.hint(input, output);
+		graph.stream_vertices<float>(
+			[&](VertexId i){
+				input[i] = i;
+				output[i] = 0;
+				return 0;
+			}, nullptr, 0,
+			[&](std::pair<VertexId,VertexId> vid_range){
+				input.load(vid_range.first, vid_range.second);
+				output.load(vid_range.first, vid_range.second);
+			},
+			[&](std::pair<VertexId,VertexId> vid_range){
+				input.save();
+				output.save();
+			}
+		);
+	}
+	EdgeKernel kernel() {
+		return EdgeKernel(
+			[&](Edge & e){
+				write_add(&output[e.target], input[e.source] * e.weight);
+			}, nullptr, (long)graph.vertices * sizeof(float),
+			[&](std::pair<VertexId,VertexId> source_vid_range){
+				input.lock(source_vid_range.first, source_vid_range.second);
+			},
+			[&](std::pair<VertexId,VertexId> source_vid_range){
+				input.unlock(source_vid_range.first, source_vid_range.second);
+			}
+		);
+	}
+	bool apply() {
+		passes++;
+		return false;
+	}
+	void report() {
+		printf("spmv: %d pass\n", passes);
+	}
+};
+
+class WCC : public Analytic {
+	Graph & graph;
+	Bitmap * active_in;
+	Bitmap * active_out;
+	BigVector<VertexId> label;
+public:
+	WCC(Graph & graph) : Analytic("wcc"), graph(graph), label(graph.path+"/label", graph.vertices) {
+		active_in = graph.alloc_bitmap();
+		active_out = graph.alloc_bitmap();
+	}
+	~WCC() {
+		delete active_in;
+		delete active_out;
+	}
+	long vertex_bytes() {
+		return (long)graph.vertices * sizeof(VertexId);
+	}
+	void init() {
+		active_out->fill();
+		graph.stream_vertices<VertexId>([&](VertexId i){
+			label[i] = i;
+			return 1;
+		});
+	}
+	EdgeKernel kernel() {
+		std::swap(active_in, active_out);
+		active_out->clear();
+		return EdgeKernel(
+			[&](Edge & e){
+				if (label[e.source]<label[e.target]) {
+					if (write_min(&label[e.target], label[e.source])) {
+						active_out->set_bit(e.target);
+					}
+				}
+			}, active_in, (long)graph.vertices * sizeof(VertexId)
+		);
+	}
+	bool apply() {
+		passes++;
+		VertexId active_vertices = graph.stream_vertices<VertexId>([&](VertexId i){
+			return 1;
+		}, active_out);
+		return active_vertices!=0;
+	}
+	void report() {
+		BigVector<VertexId> label_stat(graph.path+"/label_stat", graph.vertices);
+		label_stat.fill(0);
+		graph.stream_vertices<VertexId>([&](VertexId i){
+			write_add(&label_stat[label[i]], 1);
+			return 1;
+		});
+		VertexId components = graph.stream_vertices<VertexId>([&](VertexId i){
+			return label_stat[i]!=0;
+		});
+		printf("wcc: %d components found in %d iterations\n", components, passes);
+	}
+};
+
+class BFS : public Analytic {
+	Graph & graph;
+	VertexId start_vid;
+	Bitmap * active_in;
+	Bitmap * active_out;
+	BigVector<VertexId> parent;
+public:
+	BFS(Graph & graph, VertexId start_vid) : Analytic("bfs"), graph(graph), start_vid(start_vid),
+		parent(graph.path+"/parent", graph.vertices) {
+		active_in = graph.alloc_bitmap();
+		active_out = graph.alloc_bitmap();
+	}
+	~BFS() {
+		delete active_in;
+		delete active_out;
+	}
+	long vertex_bytes() {
+		return (long)graph.vertices * sizeof(VertexId);
+	}
+	void init() {
+		active_out->clear();
+		active_out->set_bit(start_vid);
+		parent.fill(-1);
+		parent[start_vid] = start_vid;
+	}
+	EdgeKernel kernel() {
+		std::swap(active_in, active_out);
+		active_out->clear();
+		return EdgeKernel(
+			[&](Edge & e){
+				if (parent[e.target]==-1) {
+					if (cas(&parent[e.target], -1, e.source)) {
+						active_out->set_bit(e.target);
+					}
+				}
+			}, active_in, (long)graph.vertices * sizeof(VertexId)
+		);
+	}
+	bool apply() {
+		passes++;
+		VertexId active_vertices = graph.stream_vertices<VertexId>([&](VertexId i){
+			return 1;
+		}, active_out);
+		return active_vertices!=0;
+	}
+	void report() {
+		int discovered_vertices = graph.stream_vertices<VertexId>([&](VertexId i){
+			return parent[i]!=-1;
+		});
+		printf("bfs: discovered %d vertices from %d in %d iterations\n", discovered_vertices, start_vid, passes);
+	}
+};
+
+int main(int argc, char ** argv) {
+	if (argc<3) {
+		fprintf(stderr, "usage: fused [path] [algorithms, e.g. pagerank,spmv,wcc,bfs] [pagerank iterations] [bfs start vertex id] [memory budget in GB]\n");
+		exit(-1);
+	}
+	std::string path = argv[1];
+	std::string algorithms = argv[2];
+	int iterations = (argc>=4)?atoi(argv[3]):20;
+	VertexId start_vid = (argc>=5)?atoi(argv[4]):0;
+	long memory_bytes = (argc>=6)?atol(argv[5])*1024l*1024l*1024l:8l*1024l*1024l*1024l;
+
+	Graph graph(path);
+	graph.set_memory_bytes(memory_bytes);
+
+	std::vector<Analytic *> analytics;
+	size_t begin = 0;
+	while (begin < algorithms.size()) {
+		size_t end = algorithms.find(',', begin);
+		if (end==std::string::npos) end = algorithms.size();
+		std::string name = algorithms.substr(begin, end - begin);
+		begin = end + 1;
+		if (name=="pagerank") {
+			if (!graph.has_degrees()) {
+				fprintf(stderr, "pagerank needs the grid's degrees file; rebuild the grid with preprocess or preprocess_dv\n");
+				exit(-1);
+			}
+			if (iterations<=0) continue;
+			analytics.push_back(new PageRank(graph, iterations));
+		} else if (name=="spmv") {
+			if (graph.edge_type!=1) {
+				fprintf(stderr, "spmv needs a weighted grid\n");
+				exit(-1);
+			}
+			analytics.push_back(new SpMV(graph));
+		} else if (name=="wcc") {
+			analytics.push_back(new WCC(graph));
+		} else if (name=="bfs") {
+			if (start_vid<0 || start_vid>=graph.vertices) {
+				fprintf(stderr, "bfs start vertex %d is out of range\n", start_vid);
+				exit(-1);
+			}
+			analytics.push_back(new BFS(graph, start_vid));
+		} else {
+			fprintf(stderr, "unknown algorithm: %s\n", name.c_str());
+			exit(-1);
+		}
+	}
+	if (analytics.empty()) {
+		fprintf(stderr, "no algorithm to run\n");
+		exit(-1);
+	}
+
+	long vertex_data_bytes = 0;
+	for (Analytic * a : analytics) {
+		vertex_data_bytes += a->vertex_bytes();
+	}
+	graph.set_vertex_data_bytes(vertex_data_bytes);
+
+	MetricsLog metrics("fused");
+	metrics.set("path", path);
+	metrics.set("algorithms", algorithms);
+	metrics.set("iterations", iterations);
+	metrics.set("memory_bytes", memory_bytes);
+	metrics.set("vertices", (long)graph.vertices);
+	metrics.set("edges", (long)graph.edges);
+	metrics.set("partitions", graph.partitions);
+	metrics.set("io_depth", graph.get_io_depth());
+
+	double begin_time = get_time();
+	for (Analytic * a : analytics) {
+		a->init();
+	}
+	metrics.end_phase("init");
+
+	std::vector<Analytic *> running = analytics;
+	int round = 0;
+	while (!running.empty()) {
+		double round_start_time = get_time();
+		round++;
+		std::vector<EdgeKernel> kernels;
+		std::string names;
+		for (Analytic * a : running) {
+			kernels.push_back(a->kernel());
+			names += (names.empty() ? "" : ",") + a->name;
+		}
+		graph.stream_edges_fused(kernels);
+		std::vector<Analytic *> next;
+		for (Analytic * a : running) {
+			if (a->apply()) next.push_back(a);
+		}
+		running = next;
+		metrics.add_iteration(get_time() - round_start_time);
+		printf("%7d: %s, %.2f seconds\n", round, names.c_str(), get_time() - round_start_time);
+		fflush(stdout);
+	}
+	double end_time = get_time();
+	metrics.set("rounds", round);
+	metrics.end_phase("rounds");
+
+	for (Analytic * a : analytics) {
+		a->report();
+		delete a;
+	}
+	printf("%d fused rounds took %.2f seconds\n", round, end_time - begin_time);
+	graph.print_io_stats();
+
+	return 0;
+}
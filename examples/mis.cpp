@@ -15,6 +15,7 @@ Copyright (c) 2014-2015 Xiaowei Zhu, Tsinghua University
 */
 
 #include "core/graph.hpp"
+#include "core/metrics.hpp"
 
 int main(int argc, char ** argv) {
 	if (argc<2) {
@@ -37,7 +38,16 @@ int main(int argc, char ** argv) {
 		return 1;
 	});
 
+	MetricsLog metrics("mis");
+	metrics.set("path", path);
+	metrics.set("memory_bytes", memory_bytes);
+	metrics.set("vertices", (long)graph.vertices);
+	metrics.set("edges", (long)graph.edges);
+	metrics.set("partitions", graph.partitions);
+	metrics.set("io_depth", graph.get_io_depth());
+
 	double start_time = get_time();
+	metrics.begin_phase();
 	int iteration = 0;
 	while (true) {
 		iteration++;
@@ -63,8 +73,10 @@ int main(int argc, char ** argv) {
 		active_vertices = next_active_vertices;
 	}
 	double end_time = get_time();
+	metrics.end_phase("run");
 	printf("in_mis: %d\n", active_vertices);
 	printf("time: %.2f seconds\n", end_time - start_time);
+	graph.print_io_stats();
 
 	return 0;
 }
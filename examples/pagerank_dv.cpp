@@ -15,6 +15,9 @@ Copyright (c) 2014-2015 Xiaowei Zhu, Tsinghua University
 */
 
 #include "core/graph.hpp"
+#include "core/metrics.hpp"
+#include <math.h>
+#include <float.h>
 #include <vector>
 #include <fstream>
 #include <iostream>
@@ -26,32 +29,52 @@ void load_out_degree(const std::string &path, size_t vertices, std::vector<uint3
         std::cerr << "Error opening file: " << path + "/out_degree.data" << std::endl;
         exit(1);
     }
-    for (size_t i = 0; i < vertices; ++i) {
-        out_degree_file.read(reinterpret_cast<char*>(&out_degree[i]), sizeof(uint32_t));
-    }
+    out_degree_file.read(reinterpret_cast<char*>(out_degree.data()), vertices * sizeof(uint32_t));
     out_degree_file.close();
 }
 
 int main(int argc, char ** argv) {
 	if (argc<3) {
-		fprintf(stderr, "usage: pagerank [path] [iterations] [memory budget in GB]\n");
+		fprintf(stderr, "usage: pagerank [path] [iterations] [memory budget in GB] [tolerance] [epsilon]\n");
 		exit(-1);
 	}
 	std::string path = argv[1];
 	int iterations = atoi(argv[2]);
 	long memory_bytes = (argc>=4)?atol(argv[3])*1024l*1024l*1024l:8l*1024l*1024l*1024l;
+	// with a tolerance, iterations is an upper bound and the run stops once the L1 residual drops below it
+	double tolerance = (argc>=5)?atof(argv[4]):0;
+	double epsilon = (argc>=6)?atof(argv[5]):0;
 
 	Graph graph(path);
 	graph.set_memory_bytes(memory_bytes);
 	// BigVector<VertexId> degree(graph.path+"/degree", graph.vertices);
 	// BigVector<VertexId> in_degree(graph.path+"/in_degree", graph.vertices);
 	BigVector<float> pagerank(graph.path+"/pagerank", graph.vertices);
-	BigVector<float> sum(graph.path+"/sum", graph.vertices);
 
 	long vertex_data_bytes = (long)graph.vertices * ( sizeof(VertexId) + sizeof(float) + sizeof(float) );
+	if (tolerance > 0) {
+		// the pushed rank, per-source delta and sum in double, and the active bitmap
+		vertex_data_bytes = (long)graph.vertices * ( sizeof(VertexId) + 3 * sizeof(double) ) + graph.vertices / 8;
+		// changes below the float32 spacing at rank 1 do not show in the float32 ranks written out
+		if (epsilon <= 0) epsilon = std::max(tolerance / graph.vertices, (double)FLT_EPSILON);
+	}
 	graph.set_vertex_data_bytes(vertex_data_bytes);
 
+	MetricsLog metrics("pagerank_dv");
+	metrics.set("path", path);
+	metrics.set("iterations", iterations);
+	metrics.set("memory_bytes", memory_bytes);
+	metrics.set("vertices", (long)graph.vertices);
+	metrics.set("edges", (long)graph.edges);
+	metrics.set("partitions", graph.partitions);
+	metrics.set("io_depth", graph.get_io_depth());
+	if (tolerance > 0) {
+		metrics.set("tolerance", tolerance);
+		metrics.set("epsilon", epsilon);
+	}
+
 	double begin_time = get_time();
+	metrics.begin_phase();
 
 	// degree.fill(0);
 	// in_degree.fill(0);
@@ -62,76 +85,200 @@ int main(int argc, char ** argv) {
 	// 		return 0;
 	// 	}, nullptr, 0, 0
 	// );
-	std::vector<uint32_t> degree(graph.vertices, 0);
-	load_out_degree(graph.path, graph.vertices, degree);
+	// the grid's degree file is mapped by Graph; grids from older builds only have out_degree_preprocess.data
+	std::vector<uint32_t> legacy_degree;
+	const uint32_t * degree = graph.out_degree;
+	if (!graph.has_degrees()) {
+		legacy_degree.resize(graph.vertices);
+		load_out_degree(graph.path, graph.vertices, legacy_degree);
+		degree = legacy_degree.data();
+	}
 	printf("degree read used %.2f seconds\n", get_time() - begin_time);
 	fflush(stdout);
+	metrics.end_phase("degree");
 
-	graph.hint(pagerank, sum);
-	graph.stream_vertices<VertexId>(
-		[&](VertexId i){
-			pagerank[i] = 1.f / degree[i];
-			sum[i] = 0;
-			return 0;
-		}, nullptr, 0,
-		[&](std::pair<VertexId,VertexId> vid_range){
-			pagerank.load(vid_range.first, vid_range.second);
-			sum.load(vid_range.first, vid_range.second);
-		},
-		[&](std::pair<VertexId,VertexId> vid_range){
-			pagerank.save();
-			sum.save();
-		}
-	);
-
-	for (int iter=0;iter<iterations;iter++) {
-		graph.hint(pagerank);
-		graph.stream_edges<VertexId>(
-			[&](Edge & e){
-				write_add(&sum[e.target], pagerank[e.source]);
-				return 0;
-			}, nullptr, 0, 1,
-			[&](std::pair<VertexId,VertexId> source_vid_range){
-				pagerank.lock(source_vid_range.first, source_vid_range.second);
+	if (tolerance > 0) {
+		// Delta PageRank: pagerank holds the rank each vertex has already pushed to its out-neighbours,
+		// delta the per-edge share of the change it pushes next, and sum accumulates (it is never reset),
+		// so sum[i] always equals the incoming share of the pushed ranks. A vertex is pushed again only
+		// once its rank has moved by more than epsilon; smaller changes are kept and pushed later. The
+		// residual is the L1 norm of the rank changes not yet pushed.
+		// All three are doubles: sum is never reset, so in float32 a delta below the precision of
+		// sum[i] would be rounded away and the residual would fall without the mass being delivered.
+		BigVector<double> pushed(graph.path+"/pagerank_pushed", graph.vertices);
+		BigVector<double> delta(graph.path+"/pagerank_delta", graph.vertices);
+		BigVector<double> sum(graph.path+"/pagerank_sum", graph.vertices);
+		Bitmap * active = graph.alloc_bitmap();
+		active->clear();
+		graph.hint(pushed, delta, sum);
+		VertexId active_vertices = graph.stream_vertices<VertexId>(
+			[&](VertexId i){
+				pushed[i] = 1;
+				delta[i] = 1.0 / degree[i];
+				sum[i] = 0;
+				if (degree[i]==0) return 0;
+				active->set_bit(i);
+				return 1;
+			}, nullptr, 0,
+			[&](std::pair<VertexId,VertexId> vid_range){
+				pushed.load(vid_range.first, vid_range.second);
+				delta.load(vid_range.first, vid_range.second);
+				sum.load(vid_range.first, vid_range.second);
 			},
-			[&](std::pair<VertexId,VertexId> source_vid_range){
-				pagerank.unlock(source_vid_range.first, source_vid_range.second);
+			[&](std::pair<VertexId,VertexId> vid_range){
+				pushed.save();
+				delta.save();
+				sum.save();
 			}
 		);
-		graph.hint(pagerank, sum);
-		if (iter==iterations-1) {
-			graph.stream_vertices<VertexId>(
-				[&](VertexId i){
-					pagerank[i] = 0.15f + 0.85f * sum[i];
+
+		double residual = 0;
+		int iter = 0;
+		while (iter<iterations && active_vertices>0) {
+			double iteration_start_time = get_time();
+			graph.hint(delta);
+			graph.stream_edges<VertexId>(
+				[&](Edge & e){
+					write_add(&sum[e.target], delta[e.source]);
 					return 0;
+				}, active, 0, 1,
+				[&](std::pair<VertexId,VertexId> source_vid_range){
+					delta.lock(source_vid_range.first, source_vid_range.second);
+				},
+				[&](std::pair<VertexId,VertexId> source_vid_range){
+					delta.unlock(source_vid_range.first, source_vid_range.second);
+				}
+			);
+			active->clear();
+			graph.hint(pushed, delta, sum);
+			residual = graph.stream_vertices<double>(
+				[&](VertexId i){
+					double rank = 0.15 + 0.85 * sum[i];
+					double change = rank - pushed[i];
+					if (degree[i]==0) {
+						pushed[i] = rank;
+					} else if (fabs(change) > epsilon) {
+						pushed[i] = rank;
+						delta[i] = change / degree[i];
+						active->set_bit(i);
+					}
+					return fabs(change);
 				}, nullptr, 0,
 				[&](std::pair<VertexId,VertexId> vid_range){
-					pagerank.load(vid_range.first, vid_range.second);
+					pushed.load(vid_range.first, vid_range.second);
+					delta.load(vid_range.first, vid_range.second);
 				},
 				[&](std::pair<VertexId,VertexId> vid_range){
-					pagerank.save();
+					pushed.save();
+					delta.save();
 				}
 			);
-		} else {
-			graph.stream_vertices<float>(
+			active_vertices = graph.stream_vertices<VertexId>(
 				[&](VertexId i){
-					pagerank[i] = (0.15f + 0.85f * sum[i]) / degree[i];
-					sum[i] = 0;
+					return 1;
+				}, active
+			);
+			iter++;
+			metrics.add_iteration(get_time() - iteration_start_time);
+			printf("%7d: residual %.6e, %d active vertices, %.2f seconds\n", iter, residual, active_vertices, get_time() - iteration_start_time);
+			fflush(stdout);
+			if (residual < tolerance) break;
+		}
+		iterations = iter;
+		metrics.set("iterations_run", iterations);
+		metrics.set("residual", residual);
+		metrics.set("converged", residual < tolerance ? 1 : 0);
+		if (residual >= tolerance) {
+			// e.g. the iteration limit, or changes held below epsilon adding up past the tolerance
+			printf("did not converge: residual %.6e is above the tolerance %.6e\n", residual, tolerance);
+		}
+
+		graph.hint(pagerank, sum);
+		graph.stream_vertices<VertexId>(
+			[&](VertexId i){
+				pagerank[i] = (float)(0.15 + 0.85 * sum[i]);
+				return 0;
+			}, nullptr, 0,
+			[&](std::pair<VertexId,VertexId> vid_range){
+				pagerank.load(vid_range.first, vid_range.second);
+			},
+			[&](std::pair<VertexId,VertexId> vid_range){
+				pagerank.save();
+			}
+		);
+		delete active;
+	} else {
+		BigVector<float> sum(graph.path+"/sum", graph.vertices);
+		graph.hint(pagerank, sum);
+		graph.stream_vertices<VertexId>(
+			[&](VertexId i){
+				pagerank[i] = 1.f / degree[i];
+				sum[i] = 0;
+				return 0;
+			}, nullptr, 0,
+			[&](std::pair<VertexId,VertexId> vid_range){
+				pagerank.load(vid_range.first, vid_range.second);
+				sum.load(vid_range.first, vid_range.second);
+			},
+			[&](std::pair<VertexId,VertexId> vid_range){
+				pagerank.save();
+				sum.save();
+			}
+		);
+
+		for (int iter=0;iter<iterations;iter++) {
+			double iteration_start_time = get_time();
+			graph.hint(pagerank);
+			graph.stream_edges<VertexId>(
+				[&](Edge & e){
+					write_add(&sum[e.target], pagerank[e.source]);
 					return 0;
-				}, nullptr, 0,
-				[&](std::pair<VertexId,VertexId> vid_range){
-					pagerank.load(vid_range.first, vid_range.second);
-					sum.load(vid_range.first, vid_range.second);
+				}, nullptr, 0, 1,
+				[&](std::pair<VertexId,VertexId> source_vid_range){
+					pagerank.lock(source_vid_range.first, source_vid_range.second);
 				},
-				[&](std::pair<VertexId,VertexId> vid_range){
-					pagerank.save();
-					sum.save();
+				[&](std::pair<VertexId,VertexId> source_vid_range){
+					pagerank.unlock(source_vid_range.first, source_vid_range.second);
 				}
 			);
+			graph.hint(pagerank, sum);
+			if (iter==iterations-1) {
+				graph.stream_vertices<VertexId>(
+					[&](VertexId i){
+						pagerank[i] = 0.15f + 0.85f * sum[i];
+						return 0;
+					}, nullptr, 0,
+					[&](std::pair<VertexId,VertexId> vid_range){
+						pagerank.load(vid_range.first, vid_range.second);
+					},
+					[&](std::pair<VertexId,VertexId> vid_range){
+						pagerank.save();
+					}
+				);
+			} else {
+				graph.stream_vertices<float>(
+					[&](VertexId i){
+						pagerank[i] = (0.15f + 0.85f * sum[i]) / degree[i];
+						sum[i] = 0;
+						return 0;
+					}, nullptr, 0,
+					[&](std::pair<VertexId,VertexId> vid_range){
+						pagerank.load(vid_range.first, vid_range.second);
+						sum.load(vid_range.first, vid_range.second);
+					},
+					[&](std::pair<VertexId,VertexId> vid_range){
+						pagerank.save();
+						sum.save();
+					}
+				);
+			}
+			metrics.add_iteration(get_time() - iteration_start_time);
 		}
 	}
 
 	double end_time = get_time();
+	metrics.end_phase("iterations");
 	printf("%d iterations of pagerank took %.2f seconds\n", iterations, end_time - begin_time);
+	graph.print_io_stats();
 
 }
@@ -15,6 +15,7 @@ Copyright (c) 2014-2015 Xiaowei Zhu, Tsinghua University
 */
 
 #include "core/graph.hpp"
+#include "core/metrics.hpp"
 
 #define K 64
 
@@ -36,7 +37,16 @@ int main(int argc, char ** argv) {
 
 	srand(time(NULL));
 
+	MetricsLog metrics("radii");
+	metrics.set("path", path);
+	metrics.set("memory_bytes", memory_bytes);
+	metrics.set("vertices", (long)graph.vertices);
+	metrics.set("edges", (long)graph.edges);
+	metrics.set("partitions", graph.partitions);
+	metrics.set("io_depth", graph.get_io_depth());
+
 	double start_time = get_time();
+	metrics.begin_phase();
 	int iteration;
 	VertexId active_vertices;
 	VertexId max_radii;
@@ -146,8 +156,10 @@ int main(int argc, char ** argv) {
 	printf("radii: %d\n", max_radii);
 
 	double end_time = get_time();
+	metrics.end_phase("run");
 	printf("radii: %d\n", max_radii);
 	printf("time: %.2f seconds\n", end_time - start_time);
+	graph.print_io_stats();
 
 	return 0;
 }
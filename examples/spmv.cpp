@@ -15,6 +15,7 @@ Copyright (c) 2014-2015 Xiaowei Zhu, Tsinghua University
 */
 
 #include "core/graph.hpp"
+#include "core/metrics.hpp"
 
 int main(int argc, char ** argv) {
 	if (argc<2) {
@@ -31,7 +32,16 @@ int main(int argc, char ** argv) {
 	BigVector<float> output(graph.path+"/output", graph.vertices);
 	graph.set_vertex_data_bytes( (long) graph.vertices * ( sizeof(float) * 2 ) );
 
+	MetricsLog metrics("spmv");
+	metrics.set("path", path);
+	metrics.set("memory_bytes", memory_bytes);
+	metrics.set("vertices", (long)graph.vertices);
+	metrics.set("edges", (long)graph.edges);
+	metrics.set("partitions", graph.partitions);
+	metrics.set("io_depth", graph.get_io_depth());
+
 	double begin_time = get_time();
+	metrics.begin_phase();
 	graph.hint(input, output);
 	graph.stream_vertices<float>(
 		[&](VertexId i){
@@ -62,6 +72,7 @@ int main(int argc, char ** argv) {
 		}
 	);
 	double end_time = get_time();
+	metrics.end_phase("run");
 
 	printf("spmv took %.2f seconds\n", end_time - begin_time);
 }
@@ -15,6 +15,7 @@ Copyright (c) 2014-2015 Xiaowei Zhu, Tsinghua University
 */
 
 #include "core/graph.hpp"
+#include "core/metrics.hpp"
 
 int main(int argc, char ** argv) {
 	if (argc<2) {
@@ -37,7 +38,16 @@ int main(int argc, char ** argv) {
 		return 1;
 	});
 
+	MetricsLog metrics("wcc");
+	metrics.set("path", path);
+	metrics.set("memory_bytes", memory_bytes);
+	metrics.set("vertices", (long)graph.vertices);
+	metrics.set("edges", (long)graph.edges);
+	metrics.set("partitions", graph.partitions);
+	metrics.set("io_depth", graph.get_io_depth());
+
 	double start_time = get_time();
+	metrics.begin_phase();
 	int iteration = 0;
 	while (active_vertices!=0) {
 		iteration++;
@@ -56,6 +66,7 @@ int main(int argc, char ** argv) {
 		}, active_in);
 	}
 	double end_time = get_time();
+	metrics.end_phase("run");
 
 	BigVector<VertexId> label_stat(graph.path+"/label_stat", graph.vertices);
 	label_stat.fill(0);
@@ -67,6 +78,7 @@ int main(int argc, char ** argv) {
 		return label_stat[i]!=0;
 	});
 	printf("%d components found in %.2f seconds\n", components, end_time - start_time);
+	graph.print_io_stats();
 
 	return 0;
 }
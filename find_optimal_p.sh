@@ -21,6 +21,8 @@ REPETITIONS_TW=3
 DATASETS=("LiveJournal" "twitter")
 VERSIONS=("baseline" "dv")
 P_VALUES=(4 8 16 32 64 128)
+# Restrict the sweep, e.g. to the candidates ranked best by `python -m gridgraph.iosim`
+if [ -n "$P_VALUES_OVERRIDE" ]; then read -r -a P_VALUES <<< "$P_VALUES_OVERRIDE"; fi
 
 mkdir -p "$TMP_RESULTS_DIR"
 
@@ -52,12 +54,24 @@ for DATASET in "${DATASETS[@]}"; do
             echo "--- Applying Pagerank-Only Time Methodology (Repetitions: $REPETITIONS) ---" >&2
         fi
 
+        # For Twitter DV, build the grids for every P in one scan of the input (written to <prefix>_p<P>;
+        # with a single P, preprocess_dv writes to the output path itself, so give it the suffixed one)
+        if [ "$DATASET" == "twitter" ] && [ "$VERSION" == "dv" ]; then
+            echo "  Preprocessing once for P=${P_VALUES[*]}..." >&2
+            GRID_PREFIX="${TMP_RESULTS_DIR}/${DATASET}_grid_${VERSION}"
+            if [ ${#P_VALUES[@]} -eq 1 ]; then GRID_PREFIX="${GRID_PREFIX}_p${P_VALUES[0]}"; fi
+            if ! $PREPROCESS_BIN -i "$INPUT_BIN" -o "$GRID_PREFIX" -v $V -p "$(IFS=,; echo "${P_VALUES[*]}")" -t 0 > /dev/null 2>&1; then
+                echo "  [Error] preprocessing $DATASET/$VERSION for P=${P_VALUES[*]} failed" >&2
+                continue
+            fi
+        fi
+
         for P in "${P_VALUES[@]}"; do
             GRID_OUTPUT_DIR="${TMP_RESULTS_DIR}/${DATASET}_grid_${VERSION}_p${P}"
             echo -e "\n--- Testing P=$P ---" >&2
             
             # For Twitter, preprocess once outside the repetition loop
-            if [ "$DATASET" == "twitter" ]; then
+            if [ "$DATASET" == "twitter" ] && [ "$VERSION" == "baseline" ]; then
                 echo "  Preprocessing once for P=$P..." >&2
                 $PREPROCESS_BIN -i "$INPUT_BIN" -o "$GRID_OUTPUT_DIR" -v $V -p $P -t 0 > /dev/null 2>&1
             fi
@@ -75,7 +89,10 @@ for DATASET in "${DATASETS[@]}"; do
                     PREPROC_LOG_FILE=$(mktemp)
                     PAGERANK_LOG_FILE=$(mktemp)
 
-                    $PREPROCESS_BIN -i "$INPUT_BIN" -o "$GRID_OUTPUT_DIR" -v $V -p $P -t 0 > "$PREPROC_LOG_FILE" 2>&1
+                    # -C: the end-to-end time must include the DV degree pass, so bypass the degree cache
+                    PREPROC_FLAGS=""
+                    if [ "$VERSION" == "dv" ]; then PREPROC_FLAGS="-C"; fi
+                    $PREPROCESS_BIN -i "$INPUT_BIN" -o "$GRID_OUTPUT_DIR" -v $V -p $P -t 0 $PREPROC_FLAGS > "$PREPROC_LOG_FILE" 2>&1
                     sudo /usr/local/bin/clear_caches.sh
                     sudo $PAGERANK_BIN "$GRID_OUTPUT_DIR" $ITERATIONS $FIXED_MEM_FOR_P_TEST > "$PAGERANK_LOG_FILE" 2>&1
                     
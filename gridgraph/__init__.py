@@ -0,0 +1 @@
+"""Python helpers for GridGraph grid directories (meta, row/column files and their offsets)."""
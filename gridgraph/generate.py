@@ -0,0 +1,214 @@
+"""
+Synthetic power-law graphs in the binary edge-list format of the preprocessors.
+
+Edges are generated and written in chunks, so memory stays at a few chunk-sized
+arrays (plus the degree arrays, 8 bytes per vertex, unless `--no-degrees`):
+
+* `kronecker`: stochastic Kronecker graph with an n x n initiator matrix; every
+  edge picks one initiator cell per level, which selects the next base-n digit
+  of its source and target, so |V| = n^levels.
+* `rmat`: the 2 x 2 case, |V| = 2^scale. The skew is the probability `a` of the
+  top-left quadrant; b, c and d share the rest in the Graph500 ratio 19:19:5, so
+  a = 0.57 is the Graph500 generator and a = 0.25 an Erdos-Renyi graph.
+* `chung-lu`: endpoints drawn independently with probability proportional to
+  (i + 1)^(-1 / (gamma - 1)), which gives a power-law degree distribution with
+  exponent gamma (the skew, e.g. 2.1); sampled through the inverse CDF of the
+  continuous weight function, so no per-vertex table is needed.
+
+Vertex IDs are scrambled by a multiplicative bijection so that hubs are not
+clustered at small IDs (`--no-scramble` keeps them there). Each chunk draws from
+its own generator seeded with (seed, chunk index), so a graph is a function of
+its parameters and the chunk size. Along with `<output>`, `<output>.degree` records |V|, |E| and the
+degree arrays (core/degreecache.hpp), so preprocess/preprocess_dv need no `-v`.
+
+    python -m gridgraph.generate rmat --scale 24 --edge-factor 16 --skew 0.57 -o data/rmat24.bin
+"""
+import os
+import argparse
+import numpy as np
+
+MODELS = ('rmat', 'kronecker', 'chung-lu')
+GRAPH500_BCD = np.array([0.19, 0.19, 0.05])
+DEGREE_CACHE_DTYPE = np.dtype([('magic', 'S8'), ('version', '<i4'), ('edge_type', '<i4'), ('vertices', '<i8'),
+                               ('edges', '<i8'), ('input_size', '<i8'), ('input_mtime', '<i8')])
+MAX_VERTICES = 2 ** 31 - 1  # VertexId is a 32-bit int
+
+
+def rmat_initiator(skew: float) -> np.ndarray:
+    """2 x 2 R-MAT initiator with a = skew and b:c:d = 19:19:5."""
+    assert 0 < skew < 1, "the R-MAT skew (a) must be in (0, 1)"
+    return np.concatenate(([skew], (1 - skew) * GRAPH500_BCD / GRAPH500_BCD.sum())).reshape(2, 2)
+
+
+def kronecker_edges(rng: np.random.Generator, count: int, initiator: np.ndarray, levels: int):
+    """(source, target) of `count` edges of a stochastic Kronecker graph."""
+    n = initiator.shape[0]
+    thresholds = np.cumsum(initiator.ravel() / initiator.sum())[:-1].astype(np.float32)
+    source = np.zeros(count, dtype=np.uint32)
+    target = np.zeros(count, dtype=np.uint32)
+    # wide enough for the n*n cells of any initiator (uint8 would wrap above 16 x 16)
+    cell = np.empty(count, dtype=np.min_scalar_type(n * n - 1))
+    for _ in range(levels):
+        # the initiator cell of every edge: how many cumulative probabilities its draw passes
+        draw = rng.random(count, dtype=np.float32)
+        cell[:] = draw >= thresholds[0]
+        for threshold in thresholds[1:]:
+            cell += draw >= threshold
+        source *= n
+        source += cell // n
+        target *= n
+        target += cell % n
+    return source, target
+
+
+def chung_lu_endpoints(rng: np.random.Generator, count: int, vertices: int, gamma: float) -> np.ndarray:
+    """`count` vertices drawn with probability ~ (i + 1)^(-1 / (gamma - 1))."""
+    assert gamma > 2, "the Chung-Lu exponent must be above 2"
+    beta = 1.0 / (gamma - 1)
+    # inverse CDF of x^(-beta) on [1, vertices + 1)
+    top = (vertices + 1.0) ** (1 - beta) - 1
+    x = (1 + rng.random(count) * top) ** (1 / (1 - beta))
+    return np.minimum(x.astype(np.int64) - 1, vertices - 1)
+
+
+def scramble(ids: np.ndarray, vertices: int, seed: int) -> np.ndarray:
+    """Bijection of [0, vertices): an affine map modulo the next power of two, cycle-walked into range."""
+    bits = max(int(vertices - 1).bit_length(), 1)
+    mask = (1 << bits) - 1
+    multiplier = (0x9E3779B97F4A7C15 ^ seed * 0x5851F42D4C957F2D) & mask | 1
+    offset = (seed * 0x2545F4914F6CDD1D) & mask
+    ids = ids.astype(np.int64)
+    pending = np.ones(len(ids), dtype=bool)
+    while pending.any():
+        ids[pending] = (ids[pending] * multiplier + offset) & mask
+        pending = ids >= vertices
+    return ids
+
+
+class GraphSpec:
+    """Parameters of one synthetic graph; `vertices` and `edges` follow from them."""
+
+    def __init__(self, model: str, scale: int, skew: float, edge_factor: int = 16, seed: int = 1,
+                 initiator: list = None, weighted: bool = False, scrambled: bool = True):
+        assert model in MODELS, f"unknown model {model} ({', '.join(MODELS)})"
+        self.model = model
+        self.scale = scale
+        self.skew = skew
+        self.edge_factor = edge_factor
+        self.seed = seed
+        self.weighted = weighted
+        self.scrambled = scrambled
+        if model == 'kronecker' and initiator is not None:
+            size = int(round(len(initiator) ** 0.5))
+            assert size * size == len(initiator) and size >= 2, "the initiator must be a square matrix, given row by row"
+            self.initiator = np.array(initiator, dtype=np.float64).reshape(size, size)
+        else:
+            self.initiator = rmat_initiator(skew) if model != 'chung-lu' else None
+        # scale is log2 |V| for rmat/chung-lu and the number of levels for kronecker
+        base = self.initiator.shape[0] if model == 'kronecker' else 2
+        self.vertices = base ** scale
+        assert self.vertices <= MAX_VERTICES, f"|V| = {self.vertices} does not fit a 32-bit VertexId"
+        self.edges = edge_factor * self.vertices
+
+    def name(self) -> str:
+        """File name stem that identifies the graph, e.g. rmat_s20_k0.57_e16."""
+        if self.model == 'kronecker':
+            skew = 'i' + '-'.join(f'{x:g}' for x in self.initiator.ravel())
+        else:
+            skew = f'k{self.skew:g}'
+        name = f"{self.model}_s{self.scale}_{skew}_e{self.edge_factor}"
+        if self.seed != 1:
+            name += f"_r{self.seed}"
+        if self.weighted:
+            name += '_w'
+        if not self.scrambled:
+            name += '_u'
+        return name
+
+    def chunk(self, index: int, count: int) -> np.ndarray:
+        """Edges [index * chunk, index * chunk + count) as a structured array in the .bin layout."""
+        rng = np.random.default_rng([self.seed, index])
+        if self.model == 'chung-lu':
+            source = chung_lu_endpoints(rng, count, self.vertices, self.skew)
+            target = chung_lu_endpoints(rng, count, self.vertices, self.skew)
+        else:
+            source, target = kronecker_edges(rng, count, self.initiator, self.scale)
+        if self.scrambled:
+            source = scramble(source, self.vertices, self.seed)
+            target = scramble(target, self.vertices, self.seed)
+        fields = [('source', '<u4'), ('target', '<u4')] + ([('weight', '<f4')] if self.weighted else [])
+        edges = np.empty(count, dtype=fields)
+        edges['source'] = source
+        edges['target'] = target
+        if self.weighted:
+            edges['weight'] = rng.random(count, dtype=np.float32)
+        return edges
+
+
+def write_degree_cache(output: str, spec: GraphSpec, out_degree: np.ndarray = None, in_degree: np.ndarray = None):
+    """Writes `<output>.degree` (the sidecar of txt2bin_fast) for a finished edge list."""
+    st = os.stat(output)
+    header = np.zeros(1, dtype=DEGREE_CACHE_DTYPE)
+    header['magic'] = b'GGDEGC'
+    header['version'] = 1
+    header['edge_type'] = 1 if spec.weighted else 0
+    header['vertices'] = spec.vertices
+    header['edges'] = spec.edges
+    header['input_size'] = st.st_size
+    header['input_mtime'] = st.st_mtime_ns
+    with open(output + '.degree.tmp', 'wb') as f:
+        header.tofile(f)
+        if out_degree is not None:
+            out_degree.tofile(f)
+            in_degree.tofile(f)
+    os.replace(output + '.degree.tmp', output + '.degree')
+
+
+def generate(spec: GraphSpec, output: str, chunk_edges: int = 1 << 24, degrees: bool = True, progress: bool = True):
+    """Writes the edge list of `spec` to `output` (and its .degree sidecar)."""
+    out_degree = np.zeros(spec.vertices, dtype=np.uint32) if degrees else None
+    in_degree = np.zeros(spec.vertices, dtype=np.uint32) if degrees else None
+    with open(output + '.tmp', 'wb') as f:
+        for index, begin in enumerate(range(0, spec.edges, chunk_edges)):
+            edges = spec.chunk(index, min(chunk_edges, spec.edges - begin))
+            edges.tofile(f)
+            if degrees:
+                np.add(out_degree, np.bincount(edges['source'], minlength=spec.vertices), out=out_degree, casting='unsafe')
+                np.add(in_degree, np.bincount(edges['target'], minlength=spec.vertices), out=in_degree, casting='unsafe')
+            if progress:
+                print(f"Progress: {100.0 * (begin + len(edges)) / spec.edges:.2f}% ({begin + len(edges):,} edges)", end='\r', flush=True)
+    if progress:
+        print()
+    os.replace(output + '.tmp', output)
+    write_degree_cache(output, spec, out_degree, in_degree)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic power-law graph in the binary edge-list format.")
+    parser.add_argument('model', choices=MODELS)
+    parser.add_argument('--scale', type=int, required=True, help="log2 |V| (rmat, chung-lu) or Kronecker levels.")
+    parser.add_argument('--skew', type=float, default=None,
+                        help="R-MAT/Kronecker: probability a of the top-left quadrant (default 0.57); Chung-Lu: power-law exponent (default 2.1).")
+    parser.add_argument('--edge-factor', type=int, default=16, help="|E| / |V| (default: 16).")
+    parser.add_argument('--initiator', type=str, default=None, help="Kronecker initiator matrix, row by row, comma-separated (e.g. 4 or 9 values).")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('-t', '--edge-type', type=int, default=0, choices=(0, 1), help="1 adds a random float32 weight in [0, 1) to every edge.")
+    parser.add_argument('--no-scramble', action='store_true', help="Keep the generator's vertex IDs (hubs at small IDs).")
+    parser.add_argument('--no-degrees', action='store_true', help="Record only |V| and |E| in the .degree sidecar.")
+    parser.add_argument('--chunk', type=int, default=1 << 24, help="Edges generated per chunk (default: 16M).")
+    parser.add_argument('-o', '--output', type=str, default=None, help="Output path (default: <name>.bin).")
+    args = parser.parse_args()
+
+    skew = args.skew if args.skew is not None else (2.1 if args.model == 'chung-lu' else 0.57)
+    initiator = [float(x) for x in args.initiator.split(',')] if args.initiator else None
+    spec = GraphSpec(args.model, args.scale, skew, args.edge_factor, args.seed, initiator,
+                     weighted=args.edge_type == 1, scrambled=not args.no_scramble)
+    output = args.output or spec.name() + '.bin'
+    generate(spec, output, args.chunk, degrees=not args.no_degrees)
+    print(f"|V|={spec.vertices}")
+    print(f"|E|={spec.edges}")
+    print(f"written to {output} and {output}.degree")
+
+
+if __name__ == '__main__':
+    main()
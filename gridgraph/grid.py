@@ -0,0 +1,109 @@
+"""
+Zero-copy access to a grid directory.
+
+`Grid` maps `row` and `column` once and hands out blocks as structured arrays
+(source, target[, weight]) that are views into those maps, so iterating a plain
+grid never copies an edge. Compact grids (`-z`) are decoded block by block into
+new arrays. Offsets, boundaries, degrees, relabel maps and the per-vertex
+BigVector files the applications write are memory maps as well.
+"""
+import os
+import numpy as np
+
+from gridgraph.stats import (read_meta, load_offsets, load_boundary, load_block_width, load_degrees,
+                             edge_dtype, edge_unit, decode_compact, WEIGHT_SIZE)
+from gridgraph.relabel import load_relabel
+
+LAYOUTS = ('row', 'column')
+
+
+class Grid:
+    """A grid directory written by preprocess/preprocess_dv, opened read-only."""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        meta = read_meta(directory)
+        self.edge_type = meta['edge_type']
+        self.vertices = meta['vertices']
+        self.edges = meta['edges']
+        self.partitions = meta['partitions']
+        self.dtype = edge_dtype(self.edge_type)
+        self.offsets = {layout: load_offsets(directory, layout) for layout in LAYOUTS}
+        for layout, offsets in self.offsets.items():
+            assert len(offsets) == self.partitions ** 2 + 1, f"{layout}_offset of {directory} does not match P={self.partitions}"
+        self.source_boundary = load_boundary(directory, 'source')
+        self.target_boundary = load_boundary(directory, 'target')
+        self.block_width = load_block_width(directory)
+        self._files = {}
+
+    @property
+    def compact(self) -> bool:
+        return self.block_width is not None
+
+    def _file(self, layout: str) -> np.ndarray:
+        if layout not in self._files:
+            path = os.path.join(self.directory, layout)
+            self._files[layout] = np.memmap(path, dtype=np.uint8, mode='r') if os.path.getsize(path) > 0 else np.empty(0, np.uint8)
+        return self._files[layout]
+
+    def block_unit(self, i: int, j: int) -> int:
+        """Bytes per edge of block i-j."""
+        if self.block_width is None:
+            return edge_unit(self.edge_type)
+        return int(self.block_width[i, j]) * 2 + (WEIGHT_SIZE if self.edge_type == 1 else 0)
+
+    def block_range(self, i: int, j: int, layout: str = 'row'):
+        """Byte range [begin, end) of block i-j in the `row` or `column` file."""
+        p = self.partitions
+        assert 0 <= i < p and 0 <= j < p, f"block ({i}, {j}) is outside a {p} x {p} grid"
+        k = i * p + j if layout == 'row' else j * p + i
+        offsets = self.offsets[layout]
+        return int(offsets[k]), int(offsets[k + 1])
+
+    def block(self, i: int, j: int, layout: str = 'row') -> np.ndarray:
+        """Edges of block i-j: a view into the mapped file, or a decoded copy for compact grids."""
+        begin, end = self.block_range(i, j, layout)
+        if begin == end:
+            return np.empty(0, dtype=self.dtype)
+        raw = self._file(layout)[begin:end]
+        if self.block_width is None:
+            return raw.view(self.dtype)
+        return decode_compact(raw.reshape(-1, self.block_unit(i, j)), int(self.block_width[i, j]), self.edge_type,
+                              self.source_boundary[i], self.target_boundary[j])
+
+    def blocks(self, layout: str = 'row'):
+        """Yields (i, j, edges) in file order: i-major for `row`, j-major for `column`."""
+        p = self.partitions
+        for k in range(p * p):
+            if layout == 'row':
+                i, j = divmod(k, p)
+            else:
+                j, i = divmod(k, p)
+            yield i, j, self.block(i, j, layout)
+
+    def edge_list(self, layout: str = 'row') -> np.ndarray:
+        """Every edge in file order: a view of the whole file for plain grids."""
+        if self.block_width is None:
+            return self._file(layout)[:int(self.offsets[layout][-1])].view(self.dtype)
+        parts = [edges for _, _, edges in self.blocks(layout)]
+        return np.concatenate(parts) if parts else np.empty(0, dtype=self.dtype)
+
+    def degrees(self):
+        """(out_degree, in_degree) from the grid's degree file; (None, None) without one."""
+        return load_degrees(self.directory)
+
+    def relabel(self):
+        """(relabel_map, relabel_inverse) of a grid built with `preprocess_dv -r`, else (None, None)."""
+        return load_relabel(self.directory)
+
+    def vector(self, name: str, dtype=np.float32) -> np.ndarray:
+        """
+        The first |V| entries of a per-vertex BigVector file (e.g. `pagerank`,
+        `parent`, `label`); out-of-core runs pad the file past |V| entries.
+        """
+        values = np.memmap(os.path.join(self.directory, name), dtype=np.dtype(dtype), mode='r')
+        assert len(values) >= self.vertices, f"{name} of {self.directory} has {len(values)} entries, |V|={self.vertices}"
+        return values[:self.vertices]
+
+    def has_vector(self, name: str) -> bool:
+        return os.path.exists(os.path.join(self.directory, name))
@@ -0,0 +1,417 @@
+"""
+Offline replay of the I/O issued by `Graph::stream_edges` (core/graph.hpp).
+
+The requests depend only on the grid's offset files and the memory budget:
+blocks are visited in file order, reads start at `PAGESIZE`-aligned offsets,
+are cut into `IOSIZE` chunks and rounded up to `PAGESIZE`, target-oriented
+passes are split into windows of `partition_batch` source partitions, and
+`O_DIRECT` is used when the accessed edges exceed the budget. Compact grids
+(`-z`) are read differently: consecutive blocks are merged into exact runs of
+whole edges of at most `IOSIZE - 2 * PAGESIZE` bytes, each read from its
+page-aligned start (`replay_runs`). Replaying that schedule gives bytes read, request count, window count and the per-thread load
+(requests are handed out through one queue to `parallelism` threads) for any
+P without running an application.
+
+Under `O_DIRECT` the edge block cache is replayed too (`plan_edge_cache`): the
+blocks of at least four pages that `Graph::update_edge_cache` pins within
+`get_edge_cache_budget` are read once, by the first call, and then served from
+memory, while the other blocks are read as exact runs. `edge_cache=False`
+replays a run with GRIDGRAPH_EDGE_CACHE=0.
+
+A linear cost model over these features is fitted to the PageRank timings in
+the experiment logs (`--calibrate`) and used to rank candidate grids, so the
+P sweep can be pruned to the best one or two real runs.
+"""
+import os
+import json
+import heapq
+import argparse
+import numpy as np
+
+from gridgraph.stats import (read_meta, load_offsets, load_degrees, load_block_width, partition_batch,
+                             VERTEX_ID_SIZE, WEIGHT_SIZE)
+from gridgraph.logs import parse_log_file, parse_log_name
+
+IOSIZE = 1048576 * 24  # core/constants.hpp
+EDGE_CACHE_MIN_PAGES = 4  # Graph::update_edge_cache only pins blocks of at least four pages
+SOURCE_ORIENTED = 0
+TARGET_ORIENTED = 1
+FEATURES = ('direct_bytes', 'buffered_bytes', 'requests', 'windows', 'critical_bytes', 'vertex_bytes')
+
+
+def page_size(edge_type: int) -> int:
+    """PAGESIZE chosen by Graph::init (a multiple of both 4 KB and the 12-byte weighted edge)."""
+    return 4096 if edge_type == 0 else 12288
+
+
+def replay_requests(begins: list, ends: list, pagesize: int, file_size: int, offset: int = 0) -> list:
+    """
+    Replays the request loop of stream_edges over blocks given by their byte
+    ranges, in visiting order. Returns the number of bytes each pread returns.
+    """
+    requests = []
+    for begin_offset, end_offset in zip(begins, ends):
+        if begin_offset - offset >= pagesize:
+            offset = begin_offset // pagesize * pagesize
+        if end_offset <= offset:
+            continue
+        while end_offset - offset >= IOSIZE:
+            requests.append(min(IOSIZE, file_size - offset))
+            offset += IOSIZE
+        if end_offset > offset:
+            length = (end_offset - offset + pagesize - 1) // pagesize * pagesize
+            requests.append(min(length, file_size - offset))
+            offset += length
+    return requests
+
+
+def replay_runs(begins: list, ends: list, units: list, pagesize: int, file_size: int) -> list:
+    """
+    Replays the exact-run schedule of stream_edges (`push_run_block` and
+    `read_task`), used for compact grids: blocks that follow each other in the
+    file extend one run, a run longer than IOSIZE - 2 * pagesize is cut at an
+    edge boundary of the block being added (`units` bytes per edge), and each
+    run is read from its page-aligned start, rounded up to whole pages.
+    Returns the number of bytes each pread returns.
+    """
+    max_run = IOSIZE - 2 * pagesize
+    runs = []
+    run_begin = run_end = None
+    for begin_offset, end_offset, unit in zip(begins, ends, units):
+        if end_offset <= begin_offset:
+            continue
+        if run_begin is None or run_end != begin_offset:
+            if run_begin is not None and run_end > run_begin:
+                runs.append((run_begin, run_end))
+            run_begin = begin_offset
+        run_end = end_offset
+        while run_end - run_begin > max_run:
+            cut = begin_offset + (run_begin + max_run - begin_offset) // unit * unit
+            runs.append((run_begin, cut))
+            run_begin = cut
+    if run_begin is not None and run_end > run_begin:
+        runs.append((run_begin, run_end))
+    requests = []
+    for begin, end in runs:
+        read_offset = begin // pagesize * pagesize
+        length = (end - read_offset + pagesize - 1) // pagesize * pagesize
+        requests.append(min(length, file_size - read_offset))
+    return requests
+
+
+def edge_cache_budget(memory_bytes: int, vertex_data_bytes: int, threads: int, io_depth: int = 0) -> int:
+    """Mirrors Graph::get_edge_cache_budget: 0.8 of the budget minus the vertex data and the I/O buffers."""
+    buffers = threads + (io_depth + threads if io_depth > 0 else 0)
+    return max(int(0.8 * memory_bytes) - vertex_data_bytes - IOSIZE * buffers, 0)
+
+
+def plan_edge_cache(row_offsets: np.ndarray, pagesize: int, budget: int) -> np.ndarray:
+    """
+    Blocks (i*P+j) pinned by Graph::update_edge_cache when every call accesses
+    every block, as in PageRank: with equal access counts the blocks of at least
+    four pages are taken largest first (then by index) while they fit the
+    budget. The plan is the same on every later call, because pinned blocks
+    win ties and still fit.
+    """
+    sizes = np.diff(np.asarray(row_offsets, dtype=np.int64))
+    pinned = np.zeros(len(sizes), dtype=bool)
+    planned_bytes = 0
+    for ij in np.lexsort((np.arange(len(sizes)), -sizes)):
+        if sizes[ij] >= EDGE_CACHE_MIN_PAGES * pagesize and planned_bytes + sizes[ij] <= budget:
+            pinned[ij] = True
+            planned_bytes += int(sizes[ij])
+    return pinned
+
+
+def replay_cache_load(row_offsets: np.ndarray, pinned: np.ndarray, pagesize: int) -> list:
+    """
+    Replays the reads of update_edge_cache that load the pinned blocks from
+    `row`: each block from its page-aligned start in IOSIZE chunks until its end.
+    Returns the number of bytes each pread returns.
+    """
+    file_size = int(row_offsets[-1])
+    requests = []
+    for ij in np.flatnonzero(pinned):
+        begin = int(row_offsets[ij]) // pagesize * pagesize
+        end = (int(row_offsets[ij + 1]) + pagesize - 1) // pagesize * pagesize
+        offset = begin
+        while offset < end:
+            length = min(end - offset, IOSIZE, file_size - offset)
+            requests.append(length)
+            offset += length
+            if offset >= row_offsets[ij + 1]:
+                break
+    return requests
+
+
+def schedule(requests: list, threads: int) -> list:
+    """Per-thread bytes when each request is popped by the first idle thread."""
+    loads = [(0, t) for t in range(threads)]
+    for length in requests:
+        load, t = heapq.heappop(loads)
+        heapq.heappush(loads, (load + length, t))
+    return [load for load, _ in sorted(loads, key=lambda x: x[1])]
+
+
+def simulate_stream_edges(directory: str, update_mode: int = TARGET_ORIENTED, batch: int = None,
+                          memory_bytes: int = 1024 ** 4, threads: int = None, pinned: np.ndarray = None) -> dict:
+    """
+    Simulates one stream_edges call with every source partition active.
+    `batch` is partition_batch (default: P); it only matters for target-oriented passes.
+    `pinned` marks the blocks (i*P+j) already held by the edge cache: they are
+    served from memory and the other blocks are read as exact runs.
+    """
+    meta = read_meta(directory)
+    p = meta['partitions']
+    pagesize = page_size(meta['edge_type'])
+    threads = threads or os.cpu_count()
+    batch = p if batch is None else max(1, min(batch, p))
+
+    # bytes per edge of every block in file order, for exact runs (compact grids or pinned blocks)
+    width = load_block_width(directory)
+    cached = pinned is not None and pinned.any()
+    units = None
+    if width is not None:
+        units = width.astype(np.int64) * 2 + (WEIGHT_SIZE if meta['edge_type'] == 1 else 0)
+    elif cached:
+        units = np.full((p, p), VERTEX_ID_SIZE * 2 + (WEIGHT_SIZE if meta['edge_type'] == 1 else 0), dtype=np.int64)
+    if units is not None:
+        units = (units if update_mode == SOURCE_ORIENTED else units.T).ravel()
+    if cached:
+        pinned = np.asarray(pinned, dtype=bool).reshape(p, p)
+        pinned = (pinned if update_mode == SOURCE_ORIENTED else pinned.T).ravel()
+
+    if update_mode == SOURCE_ORIENTED:
+        offsets = load_offsets(directory, 'row')
+        order = [np.arange(p * p)]
+    else:
+        offsets = load_offsets(directory, 'column')
+        order = []
+        for cur_partition in range(0, p, batch):
+            i = np.arange(cur_partition, min(cur_partition + batch, p))
+            order.append((np.arange(p)[:, None] * p + i[None, :]).ravel())
+    offsets = np.asarray(offsets)
+    file_size = int(offsets[-1])
+
+    windows = []
+    cached_bytes = 0
+    for blocks in order:
+        if cached:
+            cached_bytes += int((offsets[blocks + 1] - offsets[blocks])[pinned[blocks]].sum())
+            blocks = blocks[~pinned[blocks]]
+        if units is None:
+            requests = replay_requests(offsets[blocks].tolist(), offsets[blocks + 1].tolist(), pagesize, file_size)
+        else:
+            requests = replay_runs(offsets[blocks].tolist(), offsets[blocks + 1].tolist(), units[blocks].tolist(), pagesize, file_size)
+        loads = schedule(requests, threads)
+        windows.append({'requests': len(requests), 'bytes': sum(requests), 'critical_bytes': max(loads)})
+
+    bytes_read = sum(w['bytes'] for w in windows)
+    critical_bytes = sum(w['critical_bytes'] for w in windows)
+    return {
+        'update_mode': update_mode,
+        'partitions': p,
+        'batch': batch,
+        'threads': threads,
+        'compact': width is not None,
+        'direct_io': memory_bytes < file_size,
+        'edge_bytes': file_size,
+        'windows': len(windows),
+        'requests': sum(w['requests'] for w in windows),
+        'bytes_read': bytes_read,
+        'cached_bytes': cached_bytes,
+        'amplification': bytes_read / file_size if file_size > 0 else 0.0,
+        'critical_bytes': critical_bytes,
+        'imbalance': critical_bytes * threads / bytes_read if bytes_read > 0 else 0.0,
+        'window_details': windows,
+    }
+
+
+def pass_features(sim: dict) -> dict:
+    """Model features of one simulated stream_edges pass."""
+    return {
+        'direct_bytes': sim['bytes_read'] if sim['direct_io'] else 0,
+        'buffered_bytes': 0 if sim['direct_io'] else sim['bytes_read'],
+        'requests': sim['requests'],
+        'windows': sim['windows'],
+        'critical_bytes': sim['critical_bytes'],
+        'vertex_bytes': 0,
+    }
+
+
+def simulate_pagerank(directory: str, memory_gb: int, iterations: int = 20, threads: int = None,
+                      edge_cache: bool = True, io_depth: int = 0) -> dict:
+    """
+    Simulates examples/pagerank(_dv): a source-oriented degree pass unless the
+    grid ships preprocessed degrees, then `iterations` target-oriented passes
+    with partition_batch derived from hint(pagerank). Under O_DIRECT the edge
+    cache is planned with the apps' vertex data (|V| x 12 bytes) and loaded by
+    the first pass (`cache_load`); `io_depth` is GRIDGRAPH_IO_DEPTH, whose
+    buffers come out of the cache budget.
+    """
+    meta = read_meta(directory)
+    memory_bytes = memory_gb * 1024 ** 3
+    threads = threads or os.cpu_count()
+    batch = partition_batch(meta['partitions'], meta['vertices'] * 4, memory_bytes)
+    row_offsets = np.asarray(load_offsets(directory, 'row'))
+    pinned = None
+    load = []
+    if edge_cache and memory_bytes < int(row_offsets[-1]):
+        budget = edge_cache_budget(memory_bytes, meta['vertices'] * (VERTEX_ID_SIZE + 8), threads, io_depth)
+        pinned = plan_edge_cache(row_offsets, page_size(meta['edge_type']), budget)
+        load = replay_cache_load(row_offsets, pinned, page_size(meta['edge_type']))
+    iteration = simulate_stream_edges(directory, TARGET_ORIENTED, batch, memory_bytes, threads, pinned)
+    setup = None
+    if load_degrees(directory)[0] is None:
+        setup = simulate_stream_edges(directory, SOURCE_ORIENTED, None, memory_bytes, threads, pinned)
+    cache_load = {'blocks': int(pinned.sum()) if pinned is not None else 0, 'requests': len(load),
+                  'bytes': sum(load), 'critical_bytes': max(schedule(load, threads))}
+
+    features = {name: value * iterations for name, value in pass_features(iteration).items()}
+    if setup is not None:
+        for name, value in pass_features(setup).items():
+            features[name] += value
+    # the pinned blocks are read once, with O_DIRECT, before the first pass streams the rest
+    features['direct_bytes'] += cache_load['bytes']
+    features['requests'] += cache_load['requests']
+    features['critical_bytes'] += cache_load['critical_bytes']
+    # each iteration streams pagerank, sum and degree (3 x 4 bytes per vertex) through stream_vertices
+    features['vertex_bytes'] = meta['vertices'] * (VERTEX_ID_SIZE + 8) * iterations
+    return {'directory': directory, 'memory_gb': memory_gb, 'iterations': iterations,
+            'iteration': iteration, 'setup': setup, 'cache_load': cache_load, 'features': features}
+
+
+def fit_model(rows: list, times: list) -> dict:
+    """
+    Non-negative least squares fit of seconds = sum(coef * feature) by
+    repeatedly dropping features whose coefficient comes out negative.
+    """
+    x = np.array([[row[name] for name in FEATURES] for row in rows], dtype=np.float64)
+    y = np.array(times, dtype=np.float64)
+    scale = x.max(axis=0)
+    scale[scale == 0] = 1.0
+    active = [k for k in range(len(FEATURES)) if x[:, k].any()]
+    coef = np.zeros(len(FEATURES))
+    while active:
+        solution = np.linalg.lstsq(x[:, active] / scale[active], y, rcond=None)[0]
+        if (solution >= 0).all():
+            coef[active] = solution / scale[active]
+            break
+        active = [k for k, c in zip(active, solution) if c >= 0]
+    return {name: float(c) for name, c in zip(FEATURES, coef)}
+
+
+def predict(model: dict, features: dict) -> float:
+    """Predicted seconds for a feature dictionary."""
+    return sum(model.get(name, 0.0) * features[name] for name in FEATURES)
+
+
+def calibrate(logs_directory: str, grid_root: str = None, threads: int = None, edge_cache: bool = True, io_depth: int = 0):
+    """
+    Fits the model to `<dataset>_pagerank_<version>_p<P>_m<M>GB.log` files whose
+    grid `<dataset>_grid_<version>_p<P>` is found under `grid_root`.
+    Repeated runs of one configuration are averaged. Returns (model, samples).
+    """
+    grid_root = grid_root or logs_directory
+    runs = {}
+    for filename in sorted(os.listdir(logs_directory)):
+        parsed = parse_log_name(filename)
+        if parsed is None or parsed['run_type'] != 'pagerank' or not filename.endswith('.log'):
+            continue
+        dataset, version, p_val, m_val = parsed['dataset'], parsed['version'], parsed['p'], parsed['memory']
+        times = parse_log_file(os.path.join(logs_directory, filename))
+        if 'PR_Iter' not in times:
+            continue
+        grid = os.path.join(grid_root, f"{dataset}_grid_{version}_p{p_val}")
+        if not os.path.exists(os.path.join(grid, 'meta')):
+            print(f"[INFO] Grid not found for {filename}: {grid}. Skipping.")
+            continue
+        runs.setdefault((grid, m_val, times.get('Iterations', 20)), []).append(times['PR_Iter'])
+
+    samples = []
+    for (grid, m_val, iterations), measured in sorted(runs.items()):
+        sim = simulate_pagerank(grid, m_val, iterations, threads, edge_cache, io_depth)
+        samples.append({'directory': grid, 'memory_gb': m_val, 'iterations': iterations,
+                        'features': sim['features'], 'measured': float(np.mean(measured))})
+    if not samples:
+        return None, samples
+    model = fit_model([s['features'] for s in samples], [s['measured'] for s in samples])
+    for s in samples:
+        s['predicted'] = predict(model, s['features'])
+    return model, samples
+
+
+def print_pass(label: str, sim: dict):
+    """Prints one simulated stream_edges pass."""
+    print(f"  {label}: {sim['windows']} window(s) of {sim['batch']} partition(s), "
+          f"{sim['requests']:,} requests, {sim['bytes_read'] / 1024 ** 2:,.1f} MB read "
+          f"(x{sim['amplification']:.3f}), {'O_DIRECT' if sim['direct_io'] else 'buffered'}, "
+          f"thread imbalance {sim['imbalance']:.2f}")
+    if sim['cached_bytes'] > 0:
+        print(f"    {sim['cached_bytes'] / 1024 ** 2:,.1f} MB served from the edge cache")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay GridGraph stream_edges I/O from offset files and rank grids by predicted PageRank time.")
+    parser.add_argument('grid_dirs', nargs='*', help="Candidate grid directories (e.g. one per P).")
+    parser.add_argument('-m', '--memory', type=int, default=8, help="Memory budget in GB, as passed to pagerank.")
+    parser.add_argument('-n', '--iterations', type=int, default=20, help="PageRank iterations.")
+    parser.add_argument('-t', '--threads', type=int, default=None, help="Worker threads (default: CPUs of this machine).")
+    parser.add_argument('--calibrate', type=str, default=None, help="Directory of pagerank logs to fit the cost model to.")
+    parser.add_argument('--grid-root', type=str, default=None, help="Directory holding the grids named in the logs (default: the log directory).")
+    parser.add_argument('--model', type=str, default=None, help="Load a fitted model from this JSON file.")
+    parser.add_argument('--save-model', type=str, default=None, help="Write the fitted model to this JSON file.")
+    parser.add_argument('--top', type=int, default=2, help="Number of grids to recommend for real runs.")
+    parser.add_argument('--no-edge-cache', action='store_true', help="Replay runs with GRIDGRAPH_EDGE_CACHE=0.")
+    parser.add_argument('--io-depth', type=int, default=int(os.environ.get('GRIDGRAPH_IO_DEPTH', 0)),
+                        help="GRIDGRAPH_IO_DEPTH of the runs; its buffers shrink the edge cache (default: $GRIDGRAPH_IO_DEPTH or 0).")
+    args = parser.parse_args()
+
+    model = None
+    if args.model:
+        with open(args.model) as f:
+            model = json.load(f)
+    if args.calibrate:
+        model, samples = calibrate(args.calibrate, args.grid_root, args.threads, not args.no_edge_cache, args.io_depth)
+        if model is None:
+            print(f"[Error] No usable pagerank logs in {args.calibrate}")
+            return
+        print("Calibration:")
+        for s in samples:
+            error = (s['predicted'] - s['measured']) / s['measured'] * 100 if s['measured'] > 0 else 0.0
+            print(f"  {s['directory']} @ {s['memory_gb']}GB: measured {s['measured']:.2f}s, predicted {s['predicted']:.2f}s ({error:+.1f}%)")
+        print(f"  Coefficients: {model}")
+        if args.save_model:
+            with open(args.save_model, 'w') as f:
+                json.dump(model, f, indent=2)
+
+    results = []
+    for directory in args.grid_dirs:
+        sim = simulate_pagerank(directory, args.memory, args.iterations, args.threads, not args.no_edge_cache, args.io_depth)
+        print(f"--- {directory} (P = {sim['iteration']['partitions']}, {args.memory}GB) ---")
+        if sim['cache_load']['blocks'] > 0:
+            print(f"  edge cache: {sim['cache_load']['blocks']} block(s) pinned, "
+                  f"{sim['cache_load']['bytes'] / 1024 ** 2:,.1f} MB read once")
+        print_pass("per iteration", sim['iteration'])
+        if sim['setup'] is not None:
+            print_pass("degree pass", sim['setup'])
+        if model is not None:
+            sim['predicted'] = predict(model, sim['features'])
+            print(f"  predicted {args.iterations}-iteration time: {sim['predicted']:.2f}s")
+        results.append(sim)
+
+    if len(results) > 1:
+        if model is not None:
+            key, unit = (lambda s: s['predicted']), "s predicted"
+        else:
+            # uncalibrated: rank by bytes on the per-window critical path
+            key, unit = (lambda s: s['features']['critical_bytes'] / 1024 ** 2), "MB on the critical path"
+        ranked = sorted(results, key=key)
+        print("Ranking:")
+        for rank, sim in enumerate(ranked):
+            marker = " <- run" if rank < args.top else ""
+            print(f"  {rank + 1}. P = {sim['iteration']['partitions']:<5} {key(sim):,.2f} {unit}  {sim['directory']}{marker}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,55 @@
+"""
+Parsing of the preprocess/pagerank logs written by the experiment scripts.
+
+Log files are named `<dataset>_preprocess_<version>_p<P>[_run<i>].log` and
+`<dataset>_pagerank_<version>_p<P>_m<M>GB[_run<i>].log`; their timings are the
+"... seconds" lines printed by the tools. When the binaries run with
+GRIDGRAPH_METRICS set, the structured records are read by gridgraph.results.
+"""
+import os
+import re
+
+TIME_REGEX = re.compile(r'(\d+\.?\d*)\s+seconds')
+ITERATIONS_REGEX = re.compile(r'(\d+)\s+iterations of pagerank took')
+LOG_NAME_REGEX = re.compile(r'^(?P<dataset>.+)_(?P<run_type>preprocess|pagerank)_(?P<version>[^_]+)_p(?P<p>\d+)'
+                            r'(?:_m(?P<memory>\d+)GB)?(?:_run(?P<run>\d+))?\.(?:log|metrics\.jsonl)$')
+
+
+def parse_log_file(filepath: str) -> dict:
+    """Parses a single log file to extract all relevant timing data."""
+    times = {}
+    with open(filepath, 'r', encoding='utf-8', errors='ignore') as f:
+        for line in f:
+            match = TIME_REGEX.search(line)
+            if not match: continue
+
+            time_val = float(match.group(1))
+
+            if "Phase 1 (Degree Calculation) took" in line: times['Pre_DegCalc'] = time_val
+            elif "it takes" in line and "generate edge grid" in line: times['Pre_GridGen'] = time_val
+            elif "degree calculation used" in line: times['PR_DegSetup'] = time_val
+            elif "degree read used" in line: times['PR_DegSetup'] = time_val
+            elif "iterations of pagerank took" in line:
+                times['PR_Iter'] = time_val
+                times['Iterations'] = int(ITERATIONS_REGEX.search(line).group(1))
+    return times
+
+
+def parse_log_name(filename: str):
+    """
+    Parses a log (or `.metrics.jsonl`) file name into a dict with run_type,
+    dataset, version, p, memory (0 for preprocessing) and run (None without a
+    `_run<i>` suffix). The pattern is anchored on the fixed fields, so dataset
+    names may contain underscores. Returns None for other files.
+    """
+    match = LOG_NAME_REGEX.match(os.path.basename(filename))
+    if match is None:
+        return None
+    return {
+        'run_type': match.group('run_type'),
+        'dataset': match.group('dataset'),
+        'version': match.group('version'),
+        'p': int(match.group('p')),
+        'memory': int(match.group('memory')) if match.group('memory') else 0,
+        'run': int(match.group('run')) if match.group('run') else None,
+    }
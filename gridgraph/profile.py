@@ -0,0 +1,175 @@
+"""
+Per-block content profile of a grid.
+
+Block sizes alone do not explain how a block streams: the number of distinct
+sources and targets, the ID span they cover and how much hub degree they carry
+decide how many vertex cache lines a block touches and how often `write_add`s
+collide. `profile_grid` sweeps the `row` file block by block (memmap slices cut
+by `row_offset`, see gridgraph.grid) in a process pool and returns one column
+per feature, in block order (i-major):
+
+  edges                        edges in the block
+  unique_sources/targets       distinct source / target vertices
+  source_span/target_span      max - min + 1 of the source / target IDs
+  source_degree_mass           out-degree sum of the distinct sources
+  target_degree_mass           in-degree sum of the distinct targets
+  hub_share                    fraction of edges with a hub endpoint
+  duplicate_ratio              fraction of edges repeating a (source, target) pair
+
+Hubs are the vertices whose total degree is above the `hub_quantile` of all
+degrees; the quantile and the threshold are stored with the profile, and so are
+the size and mtime of `row` and `row_offset` (`grid_signature`), so that a saved
+profile can be checked against a grid rebuilt in place. Profiles are saved as a
+columnar .npz (`save_profile`/`load_profile`).
+
+    python -m gridgraph.profile ./data/lj_grid_dv -o lj_dv_profile.npz -j 8
+"""
+import os
+import argparse
+import numpy as np
+from multiprocessing import Pool
+
+from gridgraph.grid import Grid
+
+FEATURES = ('edges', 'unique_sources', 'unique_targets', 'source_span', 'target_span',
+            'source_degree_mass', 'target_degree_mass', 'hub_share', 'duplicate_ratio')
+
+SIGNATURE_FILES = ('row', 'row_offset')
+
+_worker = {}
+
+
+def grid_degrees(grid: Grid):
+    """(out_degree, in_degree) of a grid, counted from `row` when it has no degree file."""
+    out_degree, in_degree = grid.degrees()
+    if out_degree is None:
+        edges = grid.edge_list()
+        out_degree = np.bincount(edges['source'], minlength=grid.vertices)
+        in_degree = np.bincount(edges['target'], minlength=grid.vertices)
+    return out_degree, in_degree
+
+
+def grid_signature(directory: str) -> np.ndarray:
+    """(size, mtime in ns) of each of SIGNATURE_FILES, like the input_size/input_mtime of a .degree file."""
+    signature = []
+    for name in SIGNATURE_FILES:
+        st = os.stat(os.path.join(directory, name))
+        signature += [st.st_size, st.st_mtime_ns]
+    return np.array(signature, dtype=np.int64)
+
+
+def hub_threshold(out_degree: np.ndarray, in_degree: np.ndarray, hub_quantile: float) -> int:
+    """Total degree above which a vertex counts as a hub."""
+    total = np.asarray(out_degree, dtype=np.int64) + in_degree
+    return int(np.quantile(total, hub_quantile)) if len(total) else 0
+
+
+def _init_worker(directory: str, threshold: int):
+    grid = Grid(directory)
+    out_degree, in_degree = grid_degrees(grid)
+    _worker['grid'] = grid
+    _worker['out_degree'] = out_degree
+    _worker['in_degree'] = in_degree
+    _worker['hub'] = (np.asarray(out_degree, dtype=np.int64) + in_degree) > threshold
+
+
+def profile_block(edges: np.ndarray, out_degree: np.ndarray, in_degree: np.ndarray, hub: np.ndarray) -> tuple:
+    """The FEATURES of one block's edges."""
+    if len(edges) == 0:
+        return (0,) * len(FEATURES)
+    source = edges['source']
+    target = edges['target']
+    sources = np.unique(source)
+    targets = np.unique(target)
+    pairs = np.unique(source.astype(np.uint64) << np.uint64(32) | target)
+    return (len(edges), len(sources), len(targets),
+            int(sources[-1]) - int(sources[0]) + 1, int(targets[-1]) - int(targets[0]) + 1,
+            int(np.asarray(out_degree)[sources].sum(dtype=np.int64)), int(np.asarray(in_degree)[targets].sum(dtype=np.int64)),
+            float(np.count_nonzero(hub[source] | hub[target])) / len(edges), 1.0 - len(pairs) / len(edges))
+
+
+def _profile(k: int) -> tuple:
+    grid = _worker['grid']
+    i, j = divmod(k, grid.partitions)
+    return k, profile_block(grid.block(i, j), _worker['out_degree'], _worker['in_degree'], _worker['hub'])
+
+
+def profile_grid(directory: str, workers: int = None, hub_quantile: float = 0.99) -> dict:
+    """Profiles every block of a grid; returns {feature: array of P*P values} plus i, j, the hub quantile and threshold and the grid signature."""
+    signature = grid_signature(directory)
+    grid = Grid(directory)
+    threshold = hub_threshold(*grid_degrees(grid), hub_quantile)
+    p = grid.partitions
+    # largest blocks first, so that the pool does not end on one big block
+    sizes = np.diff(np.asarray(grid.offsets['row']))
+    order = np.argsort(-sizes, kind='stable')
+    columns = {feature: np.zeros(p * p, dtype=np.float64 if feature in ('hub_share', 'duplicate_ratio') else np.int64)
+               for feature in FEATURES}
+    with Pool(workers or os.cpu_count(), initializer=_init_worker, initargs=(directory, threshold)) as pool:
+        for k, values in pool.imap_unordered(_profile, order.tolist(), chunksize=max(1, p * p // (64 * (workers or os.cpu_count())))):
+            for feature, value in zip(FEATURES, values):
+                columns[feature][k] = value
+    blocks = np.arange(p * p)
+    columns['i'] = blocks // p
+    columns['j'] = blocks % p
+    columns['partitions'] = np.int64(p)
+    columns['hub_quantile'] = np.float64(hub_quantile)
+    columns['hub_threshold'] = np.int64(threshold)
+    columns['grid_signature'] = signature
+    return columns
+
+
+def save_profile(path: str, profile: dict):
+    np.savez_compressed(path, **profile)
+
+
+def load_profile(path: str) -> dict:
+    with np.load(path) as data:
+        return {key: data[key] for key in data.files}
+
+
+def profile_matches(profile: dict, directory: str, hub_quantile: float) -> bool:
+    """Whether a saved profile was made with `hub_quantile` from the grid as it is now."""
+    return ('hub_quantile' in profile and float(profile['hub_quantile']) == hub_quantile
+            and 'grid_signature' in profile and np.array_equal(profile['grid_signature'], grid_signature(directory)))
+
+
+def summarize(profile: dict) -> dict:
+    """Grid-wide figures of a profile: maxima, edge-weighted means and the share of edges in duplicates/hub edges."""
+    edges = profile['edges'].astype(np.float64)
+    total = edges.sum()
+    weighted = lambda x: float((x * edges).sum() / total) if total else 0.0
+    nonempty = edges > 0
+    return {
+        'blocks': int(len(edges)),
+        'empty_blocks': int((~nonempty).sum()),
+        'max_edges': int(edges.max()) if len(edges) else 0,
+        'max_unique_sources': int(profile['unique_sources'].max()) if len(edges) else 0,
+        'max_unique_targets': int(profile['unique_targets'].max()) if len(edges) else 0,
+        'mean_edges_per_source': float(total / profile['unique_sources'].sum()) if total else 0.0,
+        'mean_edges_per_target': float(total / profile['unique_targets'].sum()) if total else 0.0,
+        'mean_source_span': float(profile['source_span'][nonempty].mean()) if nonempty.any() else 0.0,
+        'mean_target_span': float(profile['target_span'][nonempty].mean()) if nonempty.any() else 0.0,
+        'hub_share': weighted(profile['hub_share']),
+        'duplicate_ratio': weighted(profile['duplicate_ratio']),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Profile the content of every block of a grid.")
+    parser.add_argument('grid', type=str, help="Grid directory produced by preprocess/preprocess_dv.")
+    parser.add_argument('-o', '--output', type=str, default=None, help="Where to save the profile (default: <grid>/block_profile.npz).")
+    parser.add_argument('-j', '--workers', type=int, default=None, help="Worker processes (default: all cores).")
+    parser.add_argument('--hub-quantile', type=float, default=0.99, help="Degree quantile above which vertices are hubs (default: 0.99).")
+    args = parser.parse_args()
+
+    profile = profile_grid(args.grid, args.workers, args.hub_quantile)
+    output = args.output or os.path.join(args.grid, 'block_profile.npz')
+    save_profile(output, profile)
+    for key, value in summarize(profile).items():
+        print(f"  {key}: {value:,.4g}" if isinstance(value, float) else f"  {key}: {value:,}")
+    print(f"Profile of {int(profile['partitions']) ** 2:,} blocks saved to {output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,195 @@
+"""
+Vectorised in-memory reference implementations of the example applications.
+
+Each algorithm takes the edge endpoints as integer arrays (see `edge_arrays`)
+and follows the semantics of its C++ counterpart in examples/, so its result
+can be compared entry by entry with the BigVector file the binary wrote:
+
+  pagerank  examples/pagerank.cpp, pagerank_dv.cpp   `pagerank` (float32)
+  bfs       examples/bfs.cpp                         `parent` (int32, -1 = unreached)
+  wcc       examples/wcc.cpp                         `label` (int32)
+
+Every step is a gather plus a `np.bincount` / `np.minimum.at` scatter over the
+edge arrays (BFS and WCC only touch the out-edges of the active vertices, through
+a CSR built once), with no Python loop over vertices or edges. The functions also
+work directly on small graphs, e.g. on a `.bin` edge list read with
+`read_edge_file`.
+
+    python -m gridgraph.reference ./data/lj_grid_dv --pagerank 20 --against ./data/lj_grid
+"""
+import sys
+import argparse
+import numpy as np
+
+from gridgraph.grid import Grid
+from gridgraph.stats import edge_dtype
+from gridgraph.relabel import to_original_ids
+
+
+def read_edge_file(path: str, edge_type: int = 0) -> np.ndarray:
+    """Memory-maps a binary edge list (the input format of the preprocessors)."""
+    return np.memmap(path, dtype=edge_dtype(edge_type), mode='r')
+
+
+def edge_arrays(edges: np.ndarray):
+    """(source, target) of a structured edge array as contiguous index arrays."""
+    return edges['source'].astype(np.intp), edges['target'].astype(np.intp)
+
+
+def out_edges(source: np.ndarray, target: np.ndarray, vertices: int):
+    """CSR of the out-edges: (indptr, targets ordered by source)."""
+    order = np.argsort(source, kind='stable')
+    indptr = np.zeros(vertices + 1, dtype=np.intp)
+    np.cumsum(np.bincount(source, minlength=vertices), out=indptr[1:])
+    return indptr, target[order]
+
+
+def gather(indptr: np.ndarray, targets: np.ndarray, frontier: np.ndarray):
+    """(sources, targets) of every out-edge of the vertices in `frontier`."""
+    begin = indptr[frontier]
+    counts = indptr[frontier + 1] - begin
+    firsts = np.cumsum(counts) - counts
+    index = np.repeat(begin - firsts, counts) + np.arange(counts.sum())
+    return np.repeat(frontier, counts), targets[index]
+
+
+def pagerank(source: np.ndarray, target: np.ndarray, vertices: int, iterations: int,
+             out_degree: np.ndarray = None) -> np.ndarray:
+    """
+    PageRank as the examples compute it: ranks start at 1 / out-degree, are
+    pushed along every edge and, except after the last iteration, divided by
+    the out-degree again.
+    """
+    if out_degree is None:
+        out_degree = np.bincount(source, minlength=vertices)
+    degree = np.asarray(out_degree, dtype=np.float32)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rank = np.float32(1) / degree
+        for iteration in range(iterations):
+            total = np.bincount(target, weights=rank[source], minlength=vertices).astype(np.float32)
+            rank = np.float32(0.15) + np.float32(0.85) * total
+            if iteration < iterations - 1:
+                rank /= degree
+    return rank
+
+
+def bfs(source: np.ndarray, target: np.ndarray, vertices: int, start: int):
+    """
+    Level-synchronous BFS from `start`. Returns (parent, level): parent[v] is
+    one of the previous level's vertices with an edge to v, like the C++
+    version where whichever edge wins the race is kept; -1 for unreached vertices.
+    """
+    indptr, targets = out_edges(source, target, vertices)
+    parent = np.full(vertices, -1, dtype=np.int32)
+    level = np.full(vertices, -1, dtype=np.int32)
+    parent[start] = start
+    level[start] = 0
+    frontier = np.array([start], dtype=np.intp)
+    depth = 0
+    while len(frontier) > 0:
+        depth += 1
+        s, t = gather(indptr, targets, frontier)
+        new = parent[t] == -1
+        parent[t[new]] = s[new]
+        level[t[new]] = depth
+        frontier = np.flatnonzero(level == depth)
+    return parent, level
+
+
+def wcc(source: np.ndarray, target: np.ndarray, vertices: int) -> np.ndarray:
+    """
+    Label propagation as in examples/wcc.cpp: labels start as vertex IDs and
+    flow along the edge direction only, so label[v] is the smallest ID that
+    reaches v. On a symmetric edge list these are the weakly connected components.
+    """
+    indptr, targets = out_edges(source, target, vertices)
+    label = np.arange(vertices, dtype=np.int32)
+    active = np.arange(vertices, dtype=np.intp)
+    while len(active) > 0:
+        s, t = gather(indptr, targets, active)
+        candidate = label[s]
+        lower = candidate < label[t]
+        t = t[lower]
+        before = label[t]
+        np.minimum.at(label, t, candidate[lower])
+        changed = np.zeros(vertices, dtype=bool)
+        changed[t[label[t] < before]] = True
+        active = np.flatnonzero(changed)
+    return label
+
+
+def check_parents(source: np.ndarray, target: np.ndarray, parent: np.ndarray, level: np.ndarray, start: int) -> list:
+    """Problems of a BFS parent array against reference levels; empty if it is a valid BFS tree."""
+    problems = []
+    reached = parent != -1
+    if not np.array_equal(reached, level != -1):
+        problems.append(f"{int((reached != (level != -1)).sum())} vertices differ in reachability")
+        return problems
+    child = np.flatnonzero(reached)
+    child = child[child != start]
+    p = parent[child].astype(np.int64)
+    if p.size and ((p < 0) | (p >= len(parent))).any():
+        problems.append("parent IDs out of range")
+        return problems
+    wrong_level = level[p] != level[child] - 1
+    if wrong_level.any():
+        problems.append(f"{int(wrong_level.sum())} parents are not one level above their child")
+    keys = np.sort(source.astype(np.int64) << 32 | target)
+    pairs = p << 32 | child
+    found = np.minimum(np.searchsorted(keys, pairs), len(keys) - 1)
+    missing = keys[found] != pairs
+    if missing.any():
+        problems.append(f"{int(missing.sum())} (parent, child) pairs are not edges")
+    return problems
+
+
+def relative_error(expected: np.ndarray, actual: np.ndarray) -> float:
+    """Largest |actual - expected| / |expected| over the entries where expected is finite and non-zero."""
+    expected = np.asarray(expected, dtype=np.float64)
+    actual = np.asarray(actual, dtype=np.float64)
+    valid = np.isfinite(expected) & (expected != 0)
+    if not valid.any():
+        return 0.0
+    return float(np.max(np.abs(actual[valid] - expected[valid]) / np.abs(expected[valid])))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check the outputs of the example binaries against vectorised references.")
+    parser.add_argument('grid', type=str, help="Grid directory the binaries ran on.")
+    parser.add_argument('--pagerank', type=int, metavar='ITERATIONS', help="Check `pagerank` after this many iterations.")
+    parser.add_argument('--bfs', type=int, metavar='START', help="Check `parent` of a BFS from this vertex.")
+    parser.add_argument('--wcc', action='store_true', help="Check `label` of wcc.")
+    parser.add_argument('--against', type=str, nargs='*', default=[],
+                        help="Other grids of the same graph (e.g. baseline vs DV) whose `pagerank` must match, in original vertex IDs.")
+    parser.add_argument('--rtol', type=float, default=1e-3, help="Largest accepted relative error of ranks (default: 1e-3).")
+    args = parser.parse_args()
+
+    grid = Grid(args.grid)
+    source, target = edge_arrays(grid.edge_list())
+    failed = False
+    if args.pagerank is not None:
+        out_degree, _ = grid.degrees()
+        error = relative_error(pagerank(source, target, grid.vertices, args.pagerank, out_degree), grid.vector('pagerank'))
+        failed |= error > args.rtol
+        print(f"pagerank: max relative error {error:.3e} {'FAIL' if error > args.rtol else 'ok'}")
+    if args.bfs is not None:
+        parent, level = bfs(source, target, grid.vertices, args.bfs)
+        problems = check_parents(source, target, grid.vector('parent', np.int32), level, args.bfs)
+        failed |= bool(problems)
+        print(f"bfs: {int((parent != -1).sum()):,} vertices reached {'FAIL: ' + '; '.join(problems) if problems else 'ok'}")
+    if args.wcc:
+        label = wcc(source, target, grid.vertices)
+        mismatches = int((label != grid.vector('label', np.int32)).sum())
+        failed |= mismatches > 0
+        print(f"wcc: {len(np.unique(label)):,} components, {mismatches:,} labels differ {'FAIL' if mismatches else 'ok'}")
+    if args.against:
+        ranks = to_original_ids(args.grid, grid.vector('pagerank'))
+        for other in args.against:
+            error = relative_error(ranks, to_original_ids(other, Grid(other).vector('pagerank')))
+            failed |= error > args.rtol
+            print(f"pagerank vs {other}: max relative error {error:.3e} {'FAIL' if error > args.rtol else 'ok'}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,56 @@
+"""
+Vertex relabeling of grids built with `preprocess_dv -r <order>`.
+
+Such grids store `relabel_map` (new ID of every original vertex) and
+`relabel_inverse` (original ID of every new vertex) as raw int32 arrays. Every
+per-vertex file the applications write (e.g. `pagerank`) is indexed by the new
+IDs; `to_original_ids` translates it back.
+"""
+import os
+import argparse
+import numpy as np
+
+from gridgraph.stats import read_meta
+
+
+def is_relabeled(directory: str) -> bool:
+    return os.path.exists(os.path.join(directory, 'relabel_map'))
+
+
+def load_relabel(directory: str):
+    """Returns (relabel, inverse) memory maps, or (None, None) for a grid in original IDs."""
+    if not is_relabeled(directory):
+        return None, None
+    vertices = read_meta(directory)['vertices']
+    relabel = np.memmap(os.path.join(directory, 'relabel_map'), dtype=np.int32, mode='r')
+    inverse = np.memmap(os.path.join(directory, 'relabel_inverse'), dtype=np.int32, mode='r')
+    assert len(relabel) == vertices and len(inverse) == vertices, f"relabel files of {directory} do not match |V|={vertices}"
+    return relabel, inverse
+
+
+def to_original_ids(directory: str, values: np.ndarray) -> np.ndarray:
+    """Reorders per-vertex values indexed by new IDs so that entry v belongs to original vertex v."""
+    relabel, _ = load_relabel(directory)
+    if relabel is None:
+        return values
+    return np.asarray(values)[relabel]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Translate a per-vertex result of a relabeled grid back to the original vertex IDs.")
+    parser.add_argument('grid', type=str, help="Grid directory built with preprocess_dv -r.")
+    parser.add_argument('--vector', type=str, default='pagerank', help="Per-vertex file in the grid directory (default: pagerank).")
+    parser.add_argument('--dtype', type=str, default='float32', help="Element type of the file (default: float32).")
+    parser.add_argument('--output', type=str, required=True, help="Where to write the values in original ID order.")
+    args = parser.parse_args()
+
+    vertices = read_meta(args.grid)['vertices']
+    values = np.memmap(os.path.join(args.grid, args.vector), dtype=np.dtype(args.dtype), mode='r')[:vertices]
+    if not is_relabeled(args.grid):
+        print(f"[Warning] {args.grid} is not relabeled; copying {args.vector} unchanged")
+    to_original_ids(args.grid, values).tofile(args.output)
+    print(f"{vertices:,} values written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,168 @@
+"""
+Incremental SQLite store of experiment results.
+
+Each ingested file is recorded with its size and mtime, so re-running the report
+only parses logs and metrics files that are new or changed. Timings come from
+the JSON records the binaries append to GRIDGRAPH_METRICS (preferred) or, for
+older runs, from the "... seconds" lines of the text logs. Both are reduced to
+the same metrics (Pre_DegCalc, Pre_GridGen, PR_DegSetup, PR_Iter, ...) per run,
+keyed by (dataset, method, P, memory GB, run).
+"""
+import os
+import json
+import sqlite3
+import numpy as np
+
+from gridgraph.logs import parse_log_file, parse_log_name
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER);
+CREATE TABLE IF NOT EXISTS measurements (
+    path TEXT, source TEXT, dataset TEXT, method TEXT, partitions INTEGER,
+    memory_gb INTEGER, run INTEGER, metric TEXT, value REAL);
+CREATE INDEX IF NOT EXISTS measurements_path ON measurements (path);
+"""
+PROGRAM_METHODS = {'pagerank': 'baseline', 'pagerank_dv': 'dv', 'preprocess': 'baseline', 'preprocess_dv': 'dv'}
+PHASE_METRICS = {
+    ('preprocess', 'degree'): 'Pre_DegCalc',
+    ('preprocess', 'relabel'): 'Pre_Relabel',
+    ('preprocess', 'partition_map'): 'Pre_PartitionMap',
+    ('preprocess', 'grid'): 'Pre_GridGen',
+    ('pagerank', 'degree'): 'PR_DegSetup',
+    ('pagerank', 'iterations'): 'PR_Loop',
+}
+# two-sided 95% Student t quantiles by degrees of freedom (1.96 beyond the table)
+T_QUANTILES = {1: 12.706, 2: 4.303, 3: 3.182, 4: 2.776, 5: 2.571, 6: 2.447, 7: 2.365, 8: 2.306, 9: 2.262,
+               10: 2.228, 12: 2.179, 15: 2.131, 20: 2.086, 30: 2.042}
+
+
+def open_store(db_path: str) -> sqlite3.Connection:
+    """Opens (and creates if needed) the results database."""
+    conn = sqlite3.connect(db_path)
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def records_from_log(path: str) -> list:
+    """(source, dataset, method, P, memory, run, metric, value) rows of a text log."""
+    name = parse_log_name(path)
+    if name is None:
+        return []
+    run = name['run'] if name['run'] is not None else 1
+    return [('log', name['dataset'], name['version'], name['p'], name['memory'], run, metric, value)
+            for metric, value in parse_log_file(path).items() if metric != 'Iterations']
+
+
+def records_from_metrics(path: str) -> list:
+    """Rows of a GRIDGRAPH_METRICS file; one process (pid, start_time) is one run."""
+    name = parse_log_name(path)
+    processes = {}
+    with open(path, encoding='utf-8', errors='ignore') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue  # a line cut short by a crash
+            processes.setdefault((record['pid'], record['start_time']), []).append(record)
+
+    rows = []
+    sequence = {}
+    for _, records in sorted(processes.items(), key=lambda item: item[0][1]):
+        first = records[0]
+        program, config = first['program'], first['config']
+        kind = 'pagerank' if program.startswith('pagerank') else 'preprocess'
+        dataset = config.get('dataset') or (name['dataset'] if name else
+                                            os.path.basename(os.path.normpath(config.get('input', config.get('path', '')))))
+        method = config.get('method') or (name['version'] if name else PROGRAM_METHODS.get(program, program))
+        memory = int(config['memory_bytes']) // 1024 ** 3 if kind == 'pagerank' else 0
+        # a multi-P preprocess run shares its scans between the listed grids
+        partition_list = [int(p) for p in str(config.get('partitions', name['p'] if name else 0)).split(',')]
+        key = (dataset, method, tuple(partition_list), memory)
+        sequence[key] = sequence.get(key, 0) + 1
+        run = int(config['run']) if 'run' in config else (name['run'] if name and name['run'] else sequence[key])
+
+        metrics = {}
+        for record in records:
+            metric = PHASE_METRICS.get((kind, record['phase']))
+            if metric is not None:
+                metrics[metric] = metrics.get(metric, 0.0) + record['seconds']
+            prefix = 'PR' if kind == 'pagerank' else 'Pre'
+            metrics[f'{prefix}_BytesRead'] = metrics.get(f'{prefix}_BytesRead', 0) + record['bytes_read']
+            metrics[f'{prefix}_BytesWritten'] = metrics.get(f'{prefix}_BytesWritten', 0) + record['bytes_written']
+            if record.get('iteration_seconds'):
+                metrics['PR_IterationMedian'] = float(np.median(record['iteration_seconds']))
+        if kind == 'pagerank':
+            # the text log's "iterations of pagerank took" also covers the degree phase
+            metrics['PR_Iter'] = metrics.get('PR_DegSetup', 0.0) + metrics.pop('PR_Loop', 0.0)
+        for p in partition_list:
+            rows += [('metrics', dataset, method, p, memory, run, metric, value) for metric, value in metrics.items()]
+    return rows
+
+
+def ingest_directory(conn: sqlite3.Connection, directory: str):
+    """
+    Parses the `.log` and `.metrics.jsonl` files of a directory that are not in
+    the store yet or changed since; forgets files that were deleted.
+    Returns (ingested, unchanged) file counts.
+    """
+    directory = os.path.abspath(directory)
+    present = set()
+    ingested = unchanged = 0
+    for filename in sorted(os.listdir(directory)):
+        if not (filename.endswith('.log') or filename.endswith('.metrics.jsonl')):
+            continue
+        path = os.path.join(directory, filename)
+        present.add(path)
+        st = os.stat(path)
+        if conn.execute("SELECT 1 FROM files WHERE path=? AND size=? AND mtime_ns=?",
+                        (path, st.st_size, st.st_mtime_ns)).fetchone():
+            unchanged += 1
+            continue
+        rows = records_from_metrics(path) if filename.endswith('.metrics.jsonl') else records_from_log(path)
+        conn.execute("DELETE FROM measurements WHERE path=?", (path,))
+        conn.executemany("INSERT INTO measurements VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", [(path,) + row for row in rows])
+        conn.execute("INSERT OR REPLACE INTO files VALUES (?, ?, ?)", (path, st.st_size, st.st_mtime_ns))
+        ingested += 1
+    for (path,) in conn.execute("SELECT path FROM files").fetchall():
+        if os.path.dirname(path) == directory and path not in present:
+            conn.execute("DELETE FROM measurements WHERE path=?", (path,))
+            conn.execute("DELETE FROM files WHERE path=?", (path,))
+    conn.commit()
+    return ingested, unchanged
+
+
+def load_runs(conn: sqlite3.Connection) -> dict:
+    """
+    Returns {(dataset, method, P, memory GB): {run: {metric: value}}}. When a
+    run has both a metrics record and a text log, the metrics record wins.
+    """
+    runs = {}
+    rows = conn.execute("SELECT source, dataset, method, partitions, memory_gb, run, metric, value FROM measurements "
+                        "ORDER BY source = 'metrics'").fetchall()
+    for source, dataset, method, p, memory, run, metric, value in rows:
+        runs.setdefault((dataset, method, p, memory), {}).setdefault(run, {})[metric] = value
+    return runs
+
+
+def summarize(values: dict) -> dict:
+    """
+    Median, mean, 95% t-interval of the mean and MAD-based outliers
+    (|x - median| > 3 * 1.4826 * MAD) of {run: value}.
+    """
+    runs = sorted(values)
+    x = np.array([values[r] for r in runs], dtype=np.float64)
+    n = len(x)
+    if n == 0:
+        return {'n': 0, 'median': float('nan'), 'mean': float('nan'), 'ci_low': float('nan'),
+                'ci_high': float('nan'), 'outliers': []}
+    median, mean = float(np.median(x)), float(x.mean())
+    if n > 1:
+        t = T_QUANTILES[max(df for df in T_QUANTILES if df <= n - 1)] if n - 1 <= 30 else 1.96
+        half = t * x.std(ddof=1) / np.sqrt(n)
+    else:
+        half = 0.0
+    outliers = []
+    if n >= 3:
+        mad = float(np.median(np.abs(x - median))) * 1.4826
+        outliers = [r for r, v in zip(runs, x) if mad > 0 and abs(v - median) > 3 * mad]
+    return {'n': n, 'median': median, 'mean': mean, 'ci_low': float(mean - half), 'ci_high': float(mean + half), 'outliers': outliers}
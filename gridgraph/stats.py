@@ -0,0 +1,224 @@
+"""
+Block-size statistics for a preprocessed grid.
+
+Block sizes come from `row_offset` (P*P+1 int64 byte offsets, i-major), so the
+whole P x P matrix is one vectorised `np.diff` over a memory-mapped file instead
+of P^2 stat calls on block files.
+"""
+import os
+import argparse
+import numpy as np
+
+VERTEX_ID_SIZE = 4
+WEIGHT_SIZE = 4
+
+
+def read_meta(directory: str) -> dict:
+    """Reads the `meta` file: edge type, vertex count, edge count and P."""
+    with open(os.path.join(directory, 'meta')) as f:
+        edge_type, vertices, edges, partitions = (int(x) for x in f.read().split())
+    return {'edge_type': edge_type, 'vertices': vertices, 'edges': edges, 'partitions': partitions}
+
+
+def edge_unit(edge_type: int) -> int:
+    """Bytes per edge on disk (matches `edge_unit` in core/graph.hpp)."""
+    return VERTEX_ID_SIZE * 2 + (WEIGHT_SIZE if edge_type == 1 else 0)
+
+
+def load_offsets(directory: str, layout: str = 'row') -> np.ndarray:
+    """Memory-maps `row_offset` or `column_offset`."""
+    return np.memmap(os.path.join(directory, f'{layout}_offset'), dtype=np.int64, mode='r')
+
+
+def block_bytes(directory: str) -> np.ndarray:
+    """Returns the P x P matrix of block sizes in bytes; entry (i, j) is block i-j."""
+    p = read_meta(directory)['partitions']
+    offsets = load_offsets(directory, 'row')
+    assert len(offsets) == p * p + 1, f"row_offset of {directory} does not match P={p}"
+    return np.diff(offsets).reshape(p, p)
+
+
+def load_block_width(directory: str):
+    """
+    P x P bytes per endpoint of a grid written with `-z` (core/compact.hpp), or
+    None for the plain 8/12-byte layout.
+    """
+    path = os.path.join(directory, 'block_width')
+    if not os.path.exists(path):
+        return None
+    p = read_meta(directory)['partitions']
+    return np.fromfile(path, dtype=np.uint8).reshape(p, p)
+
+
+def load_boundary(directory: str, kind: str = 'source') -> np.ndarray:
+    """First vertex of every partition (P+1 entries); ID ranges for grids without boundary files."""
+    meta = read_meta(directory)
+    path = os.path.join(directory, f'{kind}_boundary')
+    if os.path.exists(path):
+        return np.fromfile(path, dtype=np.int32).astype(np.int64)
+    # get_partition_range in core/partition.hpp: the first V % P partitions get one extra vertex
+    vertices, p = meta['vertices'], meta['partitions']
+    k = np.arange(p + 1, dtype=np.int64)
+    return k * (vertices // p) + np.minimum(k, vertices % p)
+
+
+def block_edges(directory: str) -> np.ndarray:
+    """Returns the P x P matrix of edge counts."""
+    edge_type = read_meta(directory)['edge_type']
+    width = load_block_width(directory)
+    if width is None:
+        return block_bytes(directory) // edge_unit(edge_type)
+    return block_bytes(directory) // (width.astype(np.int64) * 2 + (WEIGHT_SIZE if edge_type == 1 else 0))
+
+
+def read_block(directory: str, i: int, j: int, limit: int = None) -> np.ndarray:
+    """
+    Returns the edges of block i-j as a structured array (source, target[, weight]),
+    read through a memory map of `row` sliced by `row_offset`. Compact blocks are
+    decoded into a new array.
+    """
+    meta = read_meta(directory)
+    p = meta['partitions']
+    assert 0 <= i < p and 0 <= j < p, f"block ({i}, {j}) is outside a {p} x {p} grid"
+    fields = edge_dtype(meta['edge_type'])
+    width = load_block_width(directory)
+    unit = edge_unit(meta['edge_type']) if width is None else int(width[i, j]) * 2 + (WEIGHT_SIZE if meta['edge_type'] == 1 else 0)
+    offsets = load_offsets(directory, 'row')
+    begin, end = int(offsets[i * p + j]), int(offsets[i * p + j + 1])
+    count = (end - begin) // unit
+    if limit is not None:
+        count = min(count, limit)
+    if count == 0:
+        return np.empty(0, dtype=fields)
+    if width is None:
+        return np.memmap(os.path.join(directory, 'row'), dtype=fields, mode='r', offset=begin, shape=(count,))
+    raw = np.memmap(os.path.join(directory, 'row'), dtype=np.uint8, mode='r', offset=begin, shape=(count, unit))
+    return decode_compact(raw, int(width[i, j]), meta['edge_type'],
+                          load_boundary(directory, 'source')[i], load_boundary(directory, 'target')[j])
+
+
+def edge_dtype(edge_type: int) -> np.dtype:
+    """Structured dtype of a plain edge: source, target[, weight]."""
+    fields = [('source', '<u4'), ('target', '<u4')]
+    if edge_type == 1:
+        fields.append(('weight', '<f4'))
+    return np.dtype(fields)
+
+
+def decode_compact(raw: np.ndarray, width: int, edge_type: int, source_begin: int, target_begin: int) -> np.ndarray:
+    """Decodes an (edges x unit) uint8 array of compact edges (core/compact.hpp) into a new structured array."""
+    little_endian = np.array([1 << (8 * b) for b in range(width)], dtype=np.uint32)
+    edges = np.empty(len(raw), dtype=edge_dtype(edge_type))
+    edges['source'] = raw[:, :width].astype(np.uint32) @ little_endian + np.uint32(source_begin)
+    edges['target'] = raw[:, width:2 * width].astype(np.uint32) @ little_endian + np.uint32(target_begin)
+    if edge_type == 1:
+        edges['weight'] = np.ascontiguousarray(raw[:, 2 * width:]).view('<f4')[:, 0]
+    return edges
+
+
+DEGREE_HEADER_DTYPE = np.dtype([('magic', 'S8'), ('version', '<i4'), ('header_bytes', '<i4'),
+                                ('vertices', '<i8'), ('edges', '<i8')])
+
+
+def load_degrees(directory: str):
+    """
+    Returns (out_degree, in_degree) uint32 memory maps from the grid's `degrees`
+    file (core/degreecache.hpp), falling back to the `out_degree_preprocess.data` /
+    `in_degree_preprocess.data` pair of older preprocess_dv grids; (None, None) if
+    the grid has neither.
+    """
+    vertices = read_meta(directory)['vertices']
+    path = os.path.join(directory, 'degrees')
+    if os.path.exists(path):
+        header = np.fromfile(path, dtype=DEGREE_HEADER_DTYPE, count=1)[0]
+        assert header['magic'].rstrip(b'\0') == b'GGDEGS' and header['version'] == 1, f"{path} is not a degree file"
+        assert header['vertices'] == vertices, f"{path} does not match |V|={vertices}"
+        degrees = np.memmap(path, dtype=np.uint32, mode='r', offset=int(header['header_bytes']), shape=(2, vertices))
+        return degrees[0], degrees[1]
+    legacy = [os.path.join(directory, f'{kind}_degree_preprocess.data') for kind in ('out', 'in')]
+    if all(os.path.exists(p) for p in legacy):
+        return tuple(np.memmap(p, dtype=np.uint32, mode='r', shape=(vertices,)) for p in legacy)
+    return None, None
+
+
+def gini(values: np.ndarray) -> float:
+    """Gini coefficient of a non-negative sample (0 = perfectly even)."""
+    x = np.sort(np.asarray(values, dtype=np.float64).ravel())
+    total = x.sum()
+    if len(x) == 0 or total == 0:
+        return 0.0
+    ranks = np.arange(1, len(x) + 1)
+    return float((2 * ranks - len(x) - 1).dot(x) / (len(x) * total))
+
+
+def partition_batch(partitions: int, vertex_bytes: int, memory_bytes: int) -> int:
+    """Mirrors Graph::set_partition_batch: source partitions streamed per window."""
+    x = int(np.ceil(vertex_bytes / (0.8 * memory_bytes)))
+    return max(partitions // max(x, 1), 1)
+
+
+def imbalance_report(sizes: np.ndarray, batch: int = None) -> dict:
+    """
+    Imbalance metrics over a P x P block-size matrix. `batch` is the number of
+    source partitions per stream_edges window (defaults to P, i.e. one window).
+    """
+    sizes = np.asarray(sizes, dtype=np.int64)
+    p = sizes.shape[0]
+    flat = sizes.ravel()
+    mean = flat.mean() if flat.size else 0.0
+    batch = p if batch is None else max(1, min(batch, p))
+    row_totals = sizes.sum(axis=1)
+    col_totals = sizes.sum(axis=0)
+    window_starts = np.arange(0, p, batch)
+    window_totals = np.add.reduceat(row_totals, window_starts)
+    busiest = int(np.argmax(window_totals))
+    return {
+        'partitions': p,
+        'total': int(flat.sum()),
+        'max': int(flat.max()),
+        'mean': float(mean),
+        'max_mean': float(flat.max() / mean) if mean > 0 else 0.0,
+        'std': float(flat.std()),
+        'cov': float(flat.std() / mean) if mean > 0 else 0.0,
+        'gini': gini(flat),
+        'empty_blocks': int((flat == 0).sum()),
+        'total_abs_deviation': float(np.abs(flat - mean).sum()),
+        'row_totals': row_totals,
+        'col_totals': col_totals,
+        'row_max_mean': float(row_totals.max() / row_totals.mean()) if row_totals.mean() > 0 else 0.0,
+        'col_max_mean': float(col_totals.max() / col_totals.mean()) if col_totals.mean() > 0 else 0.0,
+        'batch': batch,
+        'busiest_window': (int(window_starts[busiest]), int(min(window_starts[busiest] + batch, p))),
+        'busiest_window_total': int(window_totals[busiest]),
+    }
+
+
+def grid_report(directory: str, batch: int = None) -> dict:
+    """imbalance_report() over a grid directory, with its meta fields merged in."""
+    report = imbalance_report(block_bytes(directory), batch)
+    report.update(read_meta(directory))
+    return report
+
+
+def print_report(directory: str, report: dict):
+    """Prints the scalar metrics of a report."""
+    print(f"--- {directory} ---")
+    print(f"  P = {report['partitions']}, edges = {report['edges']:,}, bytes = {report['total']:,}")
+    print(f"  Block max/mean: {report['max_mean']:.3f}  CoV: {report['cov']:.3f}  Gini: {report['gini']:.3f}")
+    print(f"  Empty blocks: {report['empty_blocks']:,} / {report['partitions'] ** 2:,}")
+    print(f"  Row max/mean: {report['row_max_mean']:.3f}  Column max/mean: {report['col_max_mean']:.3f}")
+    begin, end = report['busiest_window']
+    print(f"  Busiest window (batch={report['batch']}): partitions [{begin}, {end}) with {report['busiest_window_total']:,} bytes")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Report block-size imbalance of GridGraph grids from their offset files.")
+    parser.add_argument('grid_dirs', nargs='+', help="Grid directories produced by preprocess/preprocess_dv.")
+    parser.add_argument('--batch', type=int, default=None, help="Source partitions per stream_edges window (default: P).")
+    args = parser.parse_args()
+    for directory in args.grid_dirs:
+        print_report(directory, grid_report(directory, args.batch))
+
+
+if __name__ == '__main__':
+    main()
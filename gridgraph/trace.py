@@ -0,0 +1,147 @@
+"""
+Viewer for the stream_edges traces written when GRIDGRAPH_TRACE is set (core/trace.hpp).
+
+Each call of `Graph::stream_edges` (one PageRank iteration, a degree pass, ...)
+contributes one call record, one record per partition_batch window and one
+record per pread task with the times at which the worker started waiting in
+`Queue::pop`, got the task, finished the pread and finished processing it.
+Tasks carry the block (i, j) that issued them, so their time can be folded
+back onto the P x P grid.
+"""
+import argparse
+import numpy as np
+
+TRACE_CALL, TRACE_WINDOW, TRACE_TASK = 0, 1, 2
+HEADER_DTYPE = np.dtype([('magic', 'S8'), ('version', '<i4'), ('partitions', '<i4'), ('threads', '<i4'),
+                         ('edge_type', '<i4'), ('vertices', '<i8'), ('edges', '<i8'), ('start_time', '<f8')])
+RECORD_DTYPE = np.dtype([('type', '<i4'), ('call', '<i4'), ('window', '<i4'), ('thread', '<i4'), ('block', '<i4'),
+                         ('batch', '<i4'), ('bytes', '<i8'), ('edges', '<i8'), ('begin', '<f8'), ('popped', '<f8'),
+                         ('read', '<f8'), ('end', '<f8')])
+
+
+def read_trace(path: str):
+    """Returns (header, records); record times are seconds since the Graph was opened."""
+    with open(path, 'rb') as f:
+        header = np.frombuffer(f.read(HEADER_DTYPE.itemsize), dtype=HEADER_DTYPE)[0]
+        assert header['magic'].rstrip(b'\0') == b'GGTRACE', f"{path} is not a GridGraph trace"
+        assert header['version'] == 1, f"unsupported trace version {header['version']}"
+        data = f.read()
+    count = len(data) // RECORD_DTYPE.itemsize  # ignore a record cut short by a crash
+    records = np.frombuffer(data[:count * RECORD_DTYPE.itemsize], dtype=RECORD_DTYPE).copy()
+    for field in ('begin', 'popped', 'read', 'end'):
+        records[field] -= header['start_time']
+    return header, records
+
+
+def call_records(records: np.ndarray, call: int, kind: int) -> np.ndarray:
+    return records[(records['call'] == call) & (records['type'] == kind)]
+
+
+def block_time(header, records: np.ndarray, call: int = None, phase: str = 'total') -> np.ndarray:
+    """
+    P x P matrix of task seconds per block: 'read' (pread), 'process'
+    (edge loop) or 'total' (both). `call=None` sums over all calls.
+    """
+    p = int(header['partitions'])
+    tasks = records[(records['type'] == TRACE_TASK) & (records['block'] >= 0)]
+    if call is not None:
+        tasks = tasks[tasks['call'] == call]
+    seconds = {'read': tasks['read'] - tasks['popped'], 'process': tasks['end'] - tasks['read'],
+               'total': tasks['end'] - tasks['popped']}[phase]
+    return np.bincount(tasks['block'], weights=seconds, minlength=p * p).reshape(p, p)
+
+
+def thread_summary(header, records: np.ndarray, call: int) -> dict:
+    """Per-thread seconds spent reading, processing and blocked in pop(), and task counts."""
+    tasks = call_records(records, call, TRACE_TASK)
+    threads = int(header['threads'])
+    work = tasks[tasks['block'] >= 0]
+    return {
+        'read': np.bincount(work['thread'], weights=work['read'] - work['popped'], minlength=threads),
+        'process': np.bincount(work['thread'], weights=work['end'] - work['read'], minlength=threads),
+        'blocked': np.bincount(tasks['thread'], weights=tasks['popped'] - tasks['begin'], minlength=threads),
+        'tasks': np.bincount(work['thread'], minlength=threads),
+        'edges': np.bincount(work['thread'], weights=work['edges'], minlength=threads),
+    }
+
+
+def print_summary(header, records: np.ndarray, top: int = 5):
+    """One line per call, then per-window and per-thread detail for each call."""
+    p = int(header['partitions'])
+    calls = records[records['type'] == TRACE_CALL]
+    print(f"P = {p}, threads = {header['threads']}, vertices = {header['vertices']:,}, edges = {header['edges']:,}, calls = {len(calls)}")
+    for c in calls:
+        wall = c['end'] - c['begin']
+        print(f"--- call {c['call']} (update mode {c['block']}, batch {c['batch']}): {wall:.3f}s, "
+              f"{c['bytes'] / 1024 ** 2:,.1f} MB, {c['bytes'] / 1024 ** 2 / wall if wall > 0 else 0:,.1f} MB/s")
+        for w in call_records(records, c['call'], TRACE_WINDOW):
+            print(f"  window {w['window']} (partitions {w['block']}..{w['block'] + w['batch'] - 1}): {w['end'] - w['begin']:.3f}s, {w['bytes'] / 1024 ** 2:,.1f} MB")
+        summary = thread_summary(header, records, c['call'])
+        busy = summary['read'] + summary['process']
+        print(f"  threads: read {summary['read'].sum():.3f}s, process {summary['process'].sum():.3f}s, "
+              f"blocked in pop {summary['blocked'].sum():.3f}s, busiest/mean busy {busy.max() / busy.mean() if busy.mean() > 0 else 0:.2f}")
+        tasks = call_records(records, c['call'], TRACE_TASK)
+        tasks = tasks[tasks['block'] >= 0]
+        for t in tasks[np.argsort(tasks['popped'] - tasks['end'])[:top]]:
+            i, j = divmod(int(t['block']), p)
+            print(f"    slow task: block ({i}, {j}) thread {t['thread']}: read {t['read'] - t['popped']:.4f}s, "
+                  f"process {t['end'] - t['read']:.4f}s, {t['edges']:,} edges")
+
+
+def plot_heatmap(header, records: np.ndarray, call: int, output: str):
+    """Saves the P x P task-time heatmap of one call (or all calls)."""
+    import matplotlib.pyplot as plt
+    from matplotlib.colors import LogNorm
+    matrix = block_time(header, records, call)
+    fig, ax = plt.subplots(figsize=(8, 7))
+    image = ax.imshow(np.where(matrix > 0, matrix, np.nan), cmap='viridis',
+                      norm=LogNorm() if (matrix > 0).any() else None, interpolation='nearest')
+    fig.colorbar(image, ax=ax, label='task seconds (pread + processing)')
+    ax.set_xlabel('target partition j')
+    ax.set_ylabel('source partition i')
+    ax.set_title(f"stream_edges time per block ({'all calls' if call is None else f'call {call}'})")
+    plt.tight_layout()
+    plt.savefig(output)
+    plt.close(fig)
+
+
+def plot_gantt(header, records: np.ndarray, call: int, output: str):
+    """Saves a per-thread Gantt chart of one call: pread (red) and processing (blue) spans."""
+    import matplotlib.pyplot as plt
+    tasks = call_records(records, call, TRACE_TASK)
+    tasks = tasks[tasks['block'] >= 0]
+    fig, ax = plt.subplots(figsize=(14, 0.35 * int(header['threads']) + 2))
+    for thread in range(int(header['threads'])):
+        mine = tasks[tasks['thread'] == thread]
+        ax.broken_barh(list(zip(mine['popped'], mine['read'] - mine['popped'])), (thread - 0.4, 0.8), color='tab:red')
+        ax.broken_barh(list(zip(mine['read'], mine['end'] - mine['read'])), (thread - 0.4, 0.8), color='tab:blue')
+    for w in call_records(records, call, TRACE_WINDOW):
+        ax.axvline(w['end'], color='gray', linestyle='--', linewidth=0.8)
+    ax.set_xlabel('seconds')
+    ax.set_ylabel('thread')
+    ax.set_title(f"call {call}: pread (red) and processing (blue); dashed lines end windows")
+    plt.tight_layout()
+    plt.savefig(output)
+    plt.close(fig)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Summarize a GRIDGRAPH_TRACE file and plot block heatmaps and per-thread Gantt charts.")
+    parser.add_argument('trace', type=str, help="Trace file written by a GridGraph application.")
+    parser.add_argument('--call', type=int, default=None, help="stream_edges call to plot (default: the last one).")
+    parser.add_argument('--plot', type=str, default=None, help="Write <prefix>_heatmap.png and <prefix>_gantt.png.")
+    parser.add_argument('--top', type=int, default=5, help="Slowest tasks listed per call.")
+    args = parser.parse_args()
+
+    header, records = read_trace(args.trace)
+    print_summary(header, records, args.top)
+    if args.plot:
+        calls = records[records['type'] == TRACE_CALL]['call']
+        call = args.call if args.call is not None else int(calls.max())
+        plot_heatmap(header, records, call, f"{args.plot}_heatmap.png")
+        plot_gantt(header, records, call, f"{args.plot}_gantt.png")
+        print(f"Plots saved as {args.plot}_heatmap.png and {args.plot}_gantt.png")
+
+
+if __name__ == '__main__':
+    main()
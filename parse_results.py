@@ -1,28 +1,10 @@
 import os
-import re
 import argparse
 import pandas as pd
 import matplotlib.pyplot as plt
-from collections import defaultdict
+import numpy as np
 
-def parse_log_file(filepath):
-    """Parses a single log file to extract all relevant timing data."""
-    times = {}
-    time_regex = re.compile(r'(\d+\.?\d*)\s+seconds')
-    
-    with open(filepath, 'r', encoding='utf-8', errors='ignore') as f:
-        for line in f:
-            match = time_regex.search(line)
-            if not match: continue
-            
-            time_val = float(match.group(1))
-            
-            if "Phase 1 (Degree Calculation) took" in line: times['Pre_DegCalc'] = time_val
-            elif "it takes" in line and "generate edge grid" in line: times['Pre_GridGen'] = time_val
-            elif "degree calculation used" in line: times['PR_DegSetup'] = time_val
-            elif "degree read used" in line: times['PR_DegSetup'] = time_val
-            elif "iterations of pagerank took" in line: times['PR_Iter'] = time_val
-    return times
+from gridgraph.results import open_store, ingest_directory, load_runs, summarize
 
 def create_grouped_bar_chart(df, dataset_name):
     """Creates a grouped bar chart based on End-to-End time."""
@@ -106,47 +88,41 @@ def main():
     parser = argparse.ArgumentParser(description="Parse FINAL GridGraph experiment logs and generate a detailed report.")
     parser.add_argument('logs_directory', type=str, help="The directory containing final experiment log files.")
     parser.add_argument('-o', '--output', type=str, default='experiment_report.xlsx', help="Path to the output Excel file.")
+    parser.add_argument('--db', type=str, default=None, help="SQLite results store (default: <logs_directory>/results.sqlite).")
     args = parser.parse_args()
 
     if not os.path.isdir(args.logs_directory):
         print(f"[ERROR] Directory not found -> {args.logs_directory}"); return
 
-    all_runs = defaultdict(list)
-    for filename in os.listdir(args.logs_directory):
-        if not filename.endswith(".log"): continue
-        parts = filename.replace(".log", "").split('_')
-        try:
-            run_type = parts[1]
-            if run_type not in ["preprocess", "pagerank"]: continue
-            dataset, version, p_val = parts[0], parts[2], int(parts[3][1:])
-            m_val = int(parts[4][1:-2]) if run_type == "pagerank" else 0
-            key = (dataset, version, p_val, m_val)
-            all_runs[key].append(parse_log_file(os.path.join(args.logs_directory, filename)))
-        except (IndexError, ValueError):
-            print(f"[INFO] Could not parse filename: {filename}. Skipping.")
-    
+    db_path = args.db or os.path.join(args.logs_directory, 'results.sqlite')
+    conn = open_store(db_path)
+    ingested, unchanged = ingest_directory(conn, args.logs_directory)
+    print(f"[INFO] Ingested {ingested} new or changed file(s) into {db_path} ({unchanged} unchanged).")
+    all_runs = load_runs(conn)
+    conn.close()
+
     if not all_runs: print("[ERROR] No log files found or parsed. Exiting."); return
 
-    report_rows = []
-    avg_preproc_times = {}
-    for key, runs in all_runs.items():
-        dataset, version, p_val, m_val = key
-        if m_val == 0:
-            avg_preproc_times[(dataset, version, p_val)] = pd.DataFrame(runs).mean().to_dict()
+    def per_run(runs, *metrics):
+        return {run: sum(values.get(m, 0) for m in metrics) for run, values in runs.items()
+                if any(m in values for m in metrics)}
 
-    for key, runs in all_runs.items():
+    report_rows = []
+    for key, runs in sorted(all_runs.items()):
         dataset, version, p_val, m_val = key
         if m_val == 0: continue
-        pagerank_avg = pd.DataFrame(runs).mean().to_dict()
-        preproc_avg = avg_preproc_times.get((dataset, version, p_val), {})
-        
-        T_Pre_DegCalc = preproc_avg.get('Pre_DegCalc', 0) if version == 'dv' else 0
-        T_Pre_GridGen = preproc_avg.get('Pre_GridGen', 0)
-        T_PR_DegSetup = pagerank_avg.get('PR_DegSetup', 0)
-        T_PR_Iter = pagerank_avg.get('PR_Iter', 0)
+        preproc_runs = all_runs.get((dataset, version, p_val, 0), {})
+
+        T_Pre_DegCalc = summarize(per_run(preproc_runs, 'Pre_DegCalc'))['median'] if version == 'dv' else 0
+        T_Pre_GridGen = summarize(per_run(preproc_runs, 'Pre_GridGen'))['median']
+        T_PR_DegSetup = summarize(per_run(runs, 'PR_DegSetup'))['median']
+        T_PR_Iter = summarize(per_run(runs, 'PR_Iter'))['median']
+        T_Pre_DegCalc, T_Pre_GridGen, T_PR_DegSetup, T_PR_Iter = (
+            0 if np.isnan(t) else t for t in (T_Pre_DegCalc, T_Pre_GridGen, T_PR_DegSetup, T_PR_Iter))
+        pagerank_total = summarize(per_run(runs, 'PR_DegSetup', 'PR_Iter'))
 
         total_preproc = T_Pre_GridGen + T_Pre_DegCalc
-        total_pagerank = T_PR_DegSetup + T_PR_Iter
+        total_pagerank = pagerank_total['median']
         total_end_to_end = total_preproc + total_pagerank
         
         report_row = {
@@ -156,6 +132,9 @@ def main():
             'T_End_to_End(s)': total_end_to_end, 'T_Pre_Total(s)': total_preproc, 'T_PR_Total(s)': total_pagerank,
             'T_Pre_DegCalc(s)': T_Pre_DegCalc, 'T_Pre_GridGen(s)': T_Pre_GridGen,
             'T_PR_DegSetup(s)': T_PR_DegSetup, 'T_PR_Iter(s)': T_PR_Iter,
+            'Runs': pagerank_total['n'],
+            'PR_Total_CI95': f"{pagerank_total['ci_low']:.2f}-{pagerank_total['ci_high']:.2f}",
+            'Outlier_Runs': ",".join(str(r) for r in pagerank_total['outliers']),
         }
         report_rows.append(report_row)
         
@@ -3,50 +3,42 @@ import argparse
 import numpy as np
 import matplotlib.pyplot as plt
 
-# Edge is composed of two 4-byte VertexIDs
-EDGE_SIZE = 8
+from gridgraph.stats import read_meta, block_bytes
 
-def get_block_sizes(directory: str, p: int):
+def get_block_sizes(directory: str, p: int = None):
     """
-    Scans a grid directory, collects the file size of all PxP blocks.
-    Returns a sorted list of block sizes in bytes.
+    Reads the P x P block sizes of a grid directory from its row_offset file.
+    Returns a sorted array of block sizes in bytes.
     """
     if not os.path.isdir(directory):
         print(f"[Error] Directory not found: {directory}")
         return []
+    if p is not None and p != read_meta(directory)['partitions']:
+        print(f"[Error] {directory} was built with P={read_meta(directory)['partitions']}, not P={p}")
+        return []
 
-    block_sizes = []
     print(f"Analyzing directory: {directory}...")
-    for i in range(p):
-        for j in range(p):
-            block_path = os.path.join(directory, f'block-{i}-{j}')
-            
-            if os.path.exists(block_path):
-                size_in_bytes = os.path.getsize(block_path)
-                block_sizes.append(size_in_bytes)
-            else:
-                block_sizes.append(0)
-    
-    block_sizes.sort()
-    return block_sizes
+    return np.sort(block_bytes(directory).ravel())
 
 def main():
     parser = argparse.ArgumentParser(
         description="Plot and compare the edge block size distribution of two GridGraph partitioning results."
     )
     parser.add_argument('--baseline_dir', type=str, required=True, help="Path to the baseline grid directory.")
-    parser.add_argument('--p_baseline', type=int, required=True, help="P value used for the baseline grid.")
+    parser.add_argument('--p_baseline', type=int, default=None, help="P value used for the baseline grid (read from meta if omitted).")
     parser.add_argument('--dv_dir', type=str, required=True, help="Path to the degree-based grid directory.")
-    parser.add_argument('--p_dv', type=int, required=True, help="P value used for the degree-based grid.")
+    parser.add_argument('--p_dv', type=int, default=None, help="P value used for the degree-based grid (read from meta if omitted).")
     parser.add_argument('--dataset_name', type=str, required=True, help="Name of the dataset for the plot title (e.g., LiveJournal, Twitter).")
     args = parser.parse_args()
 
     baseline_sizes = get_block_sizes(args.baseline_dir, args.p_baseline)
     dv_sizes = get_block_sizes(args.dv_dir, args.p_dv)
 
-    if not baseline_sizes or not dv_sizes:
+    if len(baseline_sizes) == 0 or len(dv_sizes) == 0:
         print("Could not analyze one or both directories. Exiting.")
         return
+    p_baseline = read_meta(args.baseline_dir)['partitions']
+    p_dv = read_meta(args.dv_dir)['partitions']
 
     baseline_kb = np.array(baseline_sizes) / 1024
     dv_kb = np.array(dv_sizes) / 1024
@@ -60,8 +52,8 @@ def main():
     plt.style.use('seaborn-v0_8-whitegrid')
     fig, ax = plt.subplots(figsize=(12, 8))
 
-    ax.scatter(x_baseline, baseline_kb, label=f'Baseline (P={args.p_baseline})', s=10, alpha=0.8)
-    ax.scatter(x_dv, dv_kb, label=f'Degree-based (P={args.p_dv})', s=10, alpha=0.8)
+    ax.scatter(x_baseline, baseline_kb, label=f'Baseline (P={p_baseline})', s=10, alpha=0.8)
+    ax.scatter(x_dv, dv_kb, label=f'Degree-based (P={p_dv})', s=10, alpha=0.8)
 
     ax.set_xscale('log'); ax.set_yscale('log')
     ax.set_xlabel('Sorted Order (small -> large)', fontsize=14)
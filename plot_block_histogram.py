@@ -3,41 +3,30 @@ import argparse
 import numpy as np
 import matplotlib.pyplot as plt
 
-# Edge is composed of two 4-byte VertexIDs
-EDGE_SIZE = 8
+from gridgraph.stats import read_meta, block_bytes
 
-def get_block_sizes_kb(directory: str, p: int):
+def get_block_sizes_kb(directory: str, p: int = None):
     """
-    Scans a grid directory and returns a list of all block sizes in kilobytes.
+    Reads the block sizes of a grid directory from its row_offset file, in kilobytes.
     """
     if not os.path.isdir(directory):
         print(f"[Error] Directory not found: {directory}")
         return []
+    if p is not None and p != read_meta(directory)['partitions']:
+        print(f"[Error] {directory} was built with P={read_meta(directory)['partitions']}, not P={p}")
+        return []
 
-    block_sizes = []
     print(f"Analyzing directory: {directory}...")
-    for i in range(p):
-        for j in range(p):
-            block_path = os.path.join(directory, f'block-{i}-{j}')
-            
-            if os.path.exists(block_path):
-                size_in_bytes = os.path.getsize(block_path)
-                # Convert bytes to KB for the analysis
-                block_sizes.append(size_in_bytes / 1024.0)
-            else:
-                # Add 0 for non-existent (empty) blocks
-                block_sizes.append(0)
-    
-    return block_sizes
+    return block_bytes(directory).ravel() / 1024.0
 
 def main():
     parser = argparse.ArgumentParser(
         description="Plot and compare the edge block size distribution of two GridGraph results using a histogram."
     )
     parser.add_argument('--baseline_dir', type=str, required=True, help="Path to the baseline grid directory.")
-    parser.add_argument('--p_baseline', type=int, required=True, help="P value used for the baseline grid.")
+    parser.add_argument('--p_baseline', type=int, default=None, help="P value used for the baseline grid (read from meta if omitted).")
     parser.add_argument('--dv_dir', type=str, required=True, help="Path to the degree-based grid directory.")
-    parser.add_argument('--p_dv', type=int, required=True, help="P value used for the degree-based grid.")
+    parser.add_argument('--p_dv', type=int, default=None, help="P value used for the degree-based grid (read from meta if omitted).")
     parser.add_argument('--dataset_name', type=str, required=True, help="Name of the dataset for the plot title (e.g., LiveJournal, Twitter).")
     args = parser.parse_args()
 
@@ -45,13 +34,15 @@ def main():
     baseline_sizes_kb = get_block_sizes_kb(args.baseline_dir, args.p_baseline)
     dv_sizes_kb = get_block_sizes_kb(args.dv_dir, args.p_dv)
 
-    if not baseline_sizes_kb or not dv_sizes_kb:
+    if len(baseline_sizes_kb) == 0 or len(dv_sizes_kb) == 0:
         print("Could not analyze one or both directories. Exiting.")
         return
+    p_baseline = read_meta(args.baseline_dir)['partitions']
+    p_dv = read_meta(args.dv_dir)['partitions']
         
     # For log scale, we should ignore zero-sized blocks as log(0) is undefined
-    baseline_plot_data = [s for s in baseline_sizes_kb if s > 0]
-    dv_plot_data = [s for s in dv_sizes_kb if s > 0]
+    baseline_plot_data = baseline_sizes_kb[baseline_sizes_kb > 0]
+    dv_plot_data = dv_sizes_kb[dv_sizes_kb > 0]
 
     # --- Plotting the Histogram ---
     plt.style.use('seaborn-v0_8-whitegrid')
@@ -63,8 +54,8 @@ def main():
     log_bins = np.logspace(np.log10(min_val), np.log10(max_val), num=50)
 
     # Plot both histograms
-    ax.hist(baseline_plot_data, bins=log_bins, alpha=0.7, label=f'Baseline (P={args.p_baseline})')
-    ax.hist(dv_plot_data, bins=log_bins, alpha=0.7, label=f'Degree-based (P={args.p_dv})')
+    ax.hist(baseline_plot_data, bins=log_bins, alpha=0.7, label=f'Baseline (P={p_baseline})')
+    ax.hist(dv_plot_data, bins=log_bins, alpha=0.7, label=f'Degree-based (P={p_dv})')
 
     # Set the x-axis to a log scale to handle the wide range of sizes
     ax.set_xscale('log')
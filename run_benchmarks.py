@@ -0,0 +1,249 @@
+"""
+Throughput benchmarks on synthetic graphs, configured by a JSON matrix (see
+benchmarks.example.json), so that no dataset has to be downloaded.
+
+* Every (scale, skew) graph is generated once with gridgraph.generate under
+  `<output_dir>/graphs` and reused while its parameters are unchanged; its
+  `.degree` sidecar supplies |V|, so nothing is hard-coded per dataset.
+* For every method and P, the grid is preprocessed once per repetition, and every
+  app runs on it once per memory budget. Logs and GRIDGRAPH_METRICS records go to
+  `<output_dir>/logs`.
+* Throughput is reported in edges per second: |E| / preprocessing seconds (all
+  phases), |E| / median PageRank iteration, and |E| / the "run" phase of the
+  traversal apps. A run without a positive time is an error, not a sample. The median over the repetitions is written to `<output_dir>/results.json`.
+* With a stored baseline (`--save-baseline` writes one), every result that falls
+  more than `tolerance` below its baseline value is flagged as a regression and
+  the exit status is 1.
+"""
+import os
+import sys
+import json
+import shlex
+import argparse
+import subprocess
+import numpy as np
+
+from gridgraph.generate import GraphSpec, generate
+
+DEFAULTS = {
+    'output_dir': 'benchmark_outputs',
+    'model': 'rmat',
+    'scales': [16, 18],
+    'skews': [0.57],
+    'edge_factor': 16,
+    'seed': 1,
+    'weighted': False,
+    'P': [4, 16],
+    'memory_gb': [1],
+    'apps': ['pagerank', 'bfs', 'wcc'],
+    'iterations': 10,
+    'bfs_start': 0,
+    'repetitions': 3,
+    'run_prefix': [],
+    'clear_cache': None,
+    'baseline': 'benchmark_baseline.json',
+    'tolerance': 0.1,
+}
+# command-line arguments after the binary, and the GRIDGRAPH_METRICS phase that times the run
+APPS = {
+    'pagerank': (['{grid}', '{iterations}', '{memory}'], 'iterations'),
+    'bfs': (['{grid}', '{bfs_start}', '{memory}'], 'run'),
+    'wcc': (['{grid}', '{memory}'], 'run'),
+    'mis': (['{grid}', '{memory}'], 'run'),
+    'radii': (['{grid}', '{memory}'], 'run'),
+    'spmv': (['{grid}', '1', '{memory}'], 'run'),
+}
+
+
+def load_matrix(path: str) -> dict:
+    """Reads the benchmark matrix and resolves its paths against `project_root`."""
+    with open(path) as f:
+        matrix = dict(DEFAULTS, **json.load(f))
+    root = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(path)), matrix.get('project_root', '.')))
+    resolve = lambda p: os.path.join(root, p)
+    matrix['output_dir'] = resolve(matrix['output_dir'])
+    matrix['baseline'] = resolve(matrix['baseline'])
+    for method in matrix['methods'].values():
+        method['preprocess'] = resolve(method['preprocess'])
+        method.setdefault('preprocess_args', [])
+        method['apps'] = {app: resolve(method.get('apps', {}).get(app, f'bin/{app}')) for app in matrix['apps']}
+    for app in matrix['apps']:
+        assert app in APPS, f"unknown app {app} ({', '.join(APPS)})"
+    assert 'spmv' not in matrix['apps'] or matrix['weighted'], "spmv needs \"weighted\": true"
+    return matrix
+
+
+def read_phase_seconds(metrics_path: str) -> float:
+    """Total seconds of the phase records in a GRIDGRAPH_METRICS file, or None without records."""
+    if not os.path.exists(metrics_path):
+        return None
+    seconds = []
+    with open(metrics_path, encoding='utf-8', errors='ignore') as f:
+        for line in f:
+            try:
+                seconds.append(json.loads(line)['seconds'])
+            except (ValueError, KeyError):
+                continue
+    return sum(seconds) if seconds else None
+
+
+def read_phase(metrics_path: str, phase: str) -> dict:
+    """The record of one phase in a GRIDGRAPH_METRICS file, or None without it."""
+    if not os.path.exists(metrics_path):
+        return None
+    with open(metrics_path, encoding='utf-8', errors='ignore') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if record.get('phase') == phase:
+                return record
+    return None
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+    """Keys whose throughput fell more than `tolerance` below the baseline, with both values."""
+    regressions = []
+    for key, value in sorted(results.items()):
+        if key in baseline and value < baseline[key] * (1 - tolerance):
+            regressions.append((key, baseline[key], value))
+    return regressions
+
+
+class Benchmark:
+    """Executes (or, with dry_run, prints) the commands of one benchmark matrix."""
+
+    def __init__(self, matrix: dict, dry_run: bool = False):
+        self.matrix = matrix
+        self.dry_run = dry_run
+        self.samples = {}
+        if not dry_run:
+            for sub in ('graphs', 'grids', 'logs'):
+                os.makedirs(os.path.join(matrix['output_dir'], sub), exist_ok=True)
+
+    def execute(self, command: list, log_path: str) -> str:
+        """Runs a command with GRIDGRAPH_METRICS next to its log; returns its output, or None if it failed."""
+        metrics_path = log_path[:-len('.log')] + '.metrics.jsonl'
+        command = self.matrix['run_prefix'] + ['env', f'GRIDGRAPH_METRICS={metrics_path}'] + command
+        if self.dry_run:
+            print(f"[dry-run] {' '.join(shlex.quote(c) for c in command)} > {log_path}")
+            return None
+        if os.path.exists(metrics_path):
+            os.remove(metrics_path)
+        if self.matrix['clear_cache']:
+            subprocess.run(['sync'])
+            subprocess.run(self.matrix['clear_cache'])
+        with open(log_path, 'w') as log:
+            result = subprocess.run(command, stdout=log, stderr=subprocess.STDOUT)
+        if result.returncode != 0:
+            print(f"[Error] {' '.join(command)} exited with {result.returncode}; see {log_path}")
+            return None
+        with open(log_path, encoding='utf-8', errors='ignore') as f:
+            return f.read()
+
+    def record(self, key: str, edges_per_second: float):
+        self.samples.setdefault(key, []).append(edges_per_second)
+
+    def prepare_graph(self, scale: int, skew: float) -> tuple:
+        """Generates the graph unless a complete one with the same parameters exists; returns (spec, path)."""
+        m = self.matrix
+        spec = GraphSpec(m['model'], scale, skew, m['edge_factor'], m['seed'], m.get('initiator'), m['weighted'])
+        path = os.path.join(m['output_dir'], 'graphs', spec.name() + '.bin')
+        if not os.path.exists(path + '.degree'):
+            print(f"[graph] generating {spec.name()}: |V|={spec.vertices:,}, |E|={spec.edges:,}")
+            if not self.dry_run:
+                generate(spec, path, progress=False)
+        return spec, path
+
+    def run_grid(self, spec: GraphSpec, input_path: str, method: str, p: int, rep: int):
+        m = self.matrix
+        config = m['methods'][method]
+        name = f"{spec.name()}_{method}_p{p}"
+        grid = os.path.join(m['output_dir'], 'grids', name)
+        log_path = os.path.join(m['output_dir'], 'logs', f"{name}_preprocess_run{rep}.log")
+        print(f"[preprocess] {name} run {rep}")
+        command = [config['preprocess'], '-i', input_path, '-o', grid, '-p', str(p),
+                   '-t', '1' if m['weighted'] else '0'] + config['preprocess_args']
+        if self.execute(command, log_path) is not None:
+            seconds = read_phase_seconds(log_path[:-len('.log')] + '.metrics.jsonl')
+            if seconds:
+                self.record(f"{name}/preprocess", spec.edges / seconds)
+        for memory in m['memory_gb']:
+            for app in m['apps']:
+                self.run_app(spec, grid, name, app, config['apps'][app], memory, rep)
+
+    def run_app(self, spec: GraphSpec, grid: str, name: str, app: str, binary: str, memory: int, rep: int):
+        m = self.matrix
+        arguments, phase = APPS[app]
+        values = {'grid': grid, 'iterations': m['iterations'], 'bfs_start': m['bfs_start'], 'memory': memory}
+        log_path = os.path.join(m['output_dir'], 'logs', f"{name}_m{memory}GB_{app}_run{rep}.log")
+        if self.execute([binary] + [a.format(**values) for a in arguments], log_path) is None:
+            return
+        metrics_path = log_path[:-len('.log')] + '.metrics.jsonl'
+        record = read_phase(metrics_path, phase)
+        if record is None:
+            print(f"[Error] no '{phase}' phase in {metrics_path}")
+            return
+        seconds = record['seconds']
+        if app == 'pagerank':
+            iterations = record.get('iteration_seconds')
+            seconds = float(np.median(iterations)) if iterations else seconds / m['iterations']
+            app = 'pagerank_iteration'
+        if seconds <= 0:
+            print(f"[Error] {app} reported a zero run time in {metrics_path}")
+            return
+        self.record(f"{name}/m{memory}/{app}", spec.edges / seconds)
+
+    def run_matrix(self) -> dict:
+        m = self.matrix
+        for scale in m['scales']:
+            for skew in m['skews']:
+                spec, path = self.prepare_graph(scale, skew)
+                for method in m['methods']:
+                    for p in m['P']:
+                        for rep in range(1, m['repetitions'] + 1):
+                            self.run_grid(spec, path, method, p, rep)
+        return {key: float(np.median(values)) for key, values in self.samples.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark preprocessing and app throughput on synthetic graphs and flag regressions.")
+    parser.add_argument('matrix', type=str, help="Benchmark matrix (JSON), e.g. benchmarks.example.json.")
+    parser.add_argument('--dry-run', action='store_true', help="Print the commands that would run instead of running them.")
+    parser.add_argument('--save-baseline', action='store_true', help="Store these results as the baseline (merged into an existing one).")
+    args = parser.parse_args()
+
+    matrix = load_matrix(args.matrix)
+    results = Benchmark(matrix, args.dry_run).run_matrix()
+    if args.dry_run:
+        return
+    baseline = {}
+    if os.path.exists(matrix['baseline']):
+        with open(matrix['baseline']) as f:
+            baseline = json.load(f)
+
+    print(f"{'benchmark':<60} {'edges/s':>14} {'baseline':>14} {'change':>8}")
+    for key, value in sorted(results.items()):
+        if key in baseline:
+            print(f"{key:<60} {value:>14,.0f} {baseline[key]:>14,.0f} {value / baseline[key] - 1:>+8.1%}")
+        else:
+            print(f"{key:<60} {value:>14,.0f} {'-':>14} {'':>8}")
+    with open(os.path.join(matrix['output_dir'], 'results.json'), 'w') as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+
+    if args.save_baseline:
+        baseline.update(results)
+        with open(matrix['baseline'], 'w') as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+        print(f"Baseline saved to {matrix['baseline']}")
+        return
+    regressions = compare(results, baseline, matrix['tolerance'])
+    for key, before, after in regressions:
+        print(f"[Regression] {key}: {after:,.0f} edges/s, {1 - after / before:.1%} below the baseline {before:,.0f}")
+    if regressions:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,347 @@
+"""
+Resumable driver for the GridGraph experiments, configured by a JSON matrix
+(see experiments.example.json) instead of the paths and loops hard-coded in
+find_optimal_p.sh, run_final_experiments.sh and run_memory_scaling_tests.sh.
+
+* Grids are cached under `<output_dir>/grids/<dataset>_grid_<method>_p<P>` together
+  with a `.gridkey` describing the input file, preprocess binary and arguments; a
+  grid is rebuilt only when that key changes.
+* Every timed run writes `<dataset>_pagerank_<method>_p<P>_m<M>GB_run<i>.log`
+  (the names parse_results.py expects) through a temporary file, so a run whose
+  log exists and contains its timing lines is never repeated after a crash.
+* Untimed preprocessing runs in a worker pool. By default it never overlaps a
+  timed run (timed runs take priority and wait for running builds to finish);
+  with `"overlap_preprocess": true` and disjoint `cpu_sets` it runs alongside them
+  (without such cpu_sets the overlap is turned off, with a message).
+* P is chosen per (dataset, method) by successive halving: every candidate gets
+  `min_repetitions` runs, the best 1/eta are kept and their repetitions multiplied
+  by eta, until one P remains. The memory-scaling runs then use that P.
+"""
+import os
+import json
+import shlex
+import shutil
+import argparse
+import threading
+import subprocess
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+from gridgraph.logs import parse_log_file
+
+DEFAULTS = {
+    'output_dir': 'experiment_outputs',
+    'iterations': 20,
+    'repetitions': 3,
+    'memory_gb': [8, 32, 128],
+    'run_prefix': ['sudo'],
+    'clear_cache': ['sudo', '/usr/local/bin/clear_caches.sh'],
+    'preprocess_workers': 1,
+    'overlap_preprocess': False,
+    'cpu_sets': {},
+    'search': None,
+}
+
+
+def load_matrix(path: str) -> dict:
+    """Reads the experiment matrix and resolves its paths against `project_root`."""
+    with open(path) as f:
+        matrix = dict(DEFAULTS, **json.load(f))
+    root = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(path)), matrix.get('project_root', '.')))
+    resolve = lambda p: os.path.join(root, p)
+    matrix['output_dir'] = resolve(matrix['output_dir'])
+    for dataset in matrix['datasets'].values():
+        dataset['input'] = resolve(dataset['input'])
+        dataset.setdefault('objective', 'pagerank')
+        assert dataset['objective'] in ('pagerank', 'end_to_end'), f"unknown objective {dataset['objective']}"
+    for method in matrix['methods'].values():
+        method['preprocess'] = resolve(method['preprocess'])
+        method['pagerank'] = resolve(method['pagerank'])
+        method.setdefault('preprocess_args', [])
+        method.setdefault('timing_args', [])
+    if matrix['overlap_preprocess']:
+        cpu_sets = matrix['cpu_sets']
+        preprocess, timed = cpu_list(cpu_sets.get('preprocess')), cpu_list(cpu_sets.get('timed'))
+        if not preprocess or not timed or preprocess & timed:
+            # builds sharing the CPUs of a timed run would skew the times it records
+            print("[Info] overlap_preprocess ignored: it needs disjoint \"preprocess\" and \"timed\" cpu_sets; "
+                  "builds will wait for timed runs")
+            matrix['overlap_preprocess'] = False
+    return matrix
+
+
+def cpu_list(cpus: str) -> set:
+    """CPUs of a taskset list such as "0-3,8"; empty for None."""
+    result = set()
+    for part in (cpus or '').split(','):
+        if '-' in part:
+            first, last = part.split('-')
+            result.update(range(int(first), int(last) + 1))
+        elif part.strip():
+            result.add(int(part))
+    return result
+
+
+class Scheduler:
+    """
+    Keeps untimed preprocessing and timed runs apart. Timed runs are exclusive
+    and take priority: once one is waiting, no new build starts.
+    """
+
+    def __init__(self, overlap: bool):
+        self.overlap = overlap
+        self.cond = threading.Condition()
+        self.building = 0
+        self.timing = False
+        self.waiting = 0
+
+    @contextmanager
+    def background(self):
+        with self.cond:
+            while not self.overlap and (self.timing or self.waiting > 0):
+                self.cond.wait()
+            self.building += 1
+        try:
+            yield
+        finally:
+            with self.cond:
+                self.building -= 1
+                self.cond.notify_all()
+
+    @contextmanager
+    def exclusive(self):
+        with self.cond:
+            self.waiting += 1
+            while self.timing or (not self.overlap and self.building > 0):
+                self.cond.wait()
+            self.waiting -= 1
+            self.timing = True
+        try:
+            yield
+        finally:
+            with self.cond:
+                self.timing = False
+                self.cond.notify_all()
+
+
+class Runner:
+    """Executes (or, with dry_run, prints) the commands of one experiment matrix."""
+
+    def __init__(self, matrix: dict, dry_run: bool = False):
+        self.matrix = matrix
+        self.dry_run = dry_run
+        self.scheduler = Scheduler(matrix['overlap_preprocess'])
+        self.pool = ThreadPoolExecutor(max_workers=matrix['preprocess_workers'])
+        self.grid_futures = {}
+        self.lock = threading.Lock()
+        if not dry_run:
+            os.makedirs(os.path.join(matrix['output_dir'], 'grids'), exist_ok=True)
+
+    # --- commands ---
+
+    def execute(self, command: list, log_path: str, cpu_set: str = None) -> bool:
+        """Runs a command with its output in log_path (written via a .tmp file)."""
+        if cpu_set:
+            command = ['taskset', '-c', cpu_set] + command
+        if self.dry_run:
+            print(f"[dry-run] {' '.join(shlex.quote(c) for c in command)} > {log_path}")
+            return False
+        with open(log_path + '.tmp', 'w') as log:
+            result = subprocess.run(command, stdout=log, stderr=subprocess.STDOUT)
+        if result.returncode != 0:
+            print(f"[Error] {' '.join(command)} exited with {result.returncode}; see {log_path}.tmp")
+            return False
+        os.replace(log_path + '.tmp', log_path)
+        return True
+
+    def metrics_env(self, log_path: str, dataset: str, method: str, rep: int) -> list:
+        """`env` prefix that makes a binary write its JSON metrics next to its log."""
+        metrics_path = log_path[:-len('.log')] + '.metrics.jsonl'
+        if os.path.exists(metrics_path) and not self.dry_run:
+            os.remove(metrics_path)  # records of an interrupted attempt
+        return ['env', f'GRIDGRAPH_METRICS={metrics_path}',
+                f'GRIDGRAPH_METRICS_TAGS=dataset={dataset},method={method},run={rep}']
+
+    def clear_caches(self):
+        if self.matrix['clear_cache'] and not self.dry_run:
+            subprocess.run(['sync'])
+            subprocess.run(self.matrix['clear_cache'])
+
+    # --- grids ---
+
+    def grid_dir(self, dataset: str, method: str, p: int) -> str:
+        return os.path.join(self.matrix['output_dir'], 'grids', f"{dataset}_grid_{method}_p{p}")
+
+    def grid_key(self, dataset: str, method: str, p: int) -> dict:
+        info, config = self.matrix['datasets'][dataset], self.matrix['methods'][method]
+        stat = os.stat(info['input']) if os.path.exists(info['input']) else None
+        binary = os.stat(config['preprocess']) if os.path.exists(config['preprocess']) else None
+        return {
+            'input': info['input'], 'input_size': stat.st_size if stat else None,
+            'input_mtime_ns': stat.st_mtime_ns if stat else None, 'vertices': info['vertices'],
+            'preprocess': config['preprocess'], 'preprocess_mtime_ns': binary.st_mtime_ns if binary else None,
+            'preprocess_args': config['preprocess_args'], 'partitions': p,
+        }
+
+    def grid_is_valid(self, dataset: str, method: str, p: int) -> bool:
+        directory = self.grid_dir(dataset, method, p)
+        try:
+            with open(os.path.join(directory, '.gridkey')) as f:
+                return json.load(f) == self.grid_key(dataset, method, p) and os.path.exists(os.path.join(directory, 'meta'))
+        except (OSError, ValueError):
+            return False
+
+    def build_grid(self, dataset: str, method: str, p: int, log_path: str, timed: bool, rep: int = 1) -> bool:
+        """Preprocesses into a temporary directory and swaps it in on success."""
+        info, config = self.matrix['datasets'][dataset], self.matrix['methods'][method]
+        directory = self.grid_dir(dataset, method, p)
+        command = self.metrics_env(log_path, dataset, method, rep) + [config['preprocess'], '-i', info['input'], '-o', directory + '.tmp',
+                   '-v', str(info['vertices']), '-p', str(p), '-t', '0'] + config['preprocess_args']
+        if timed:
+            command += config['timing_args']
+        cpu_set = None if timed else self.matrix['cpu_sets'].get('preprocess')
+        if not self.execute(command, log_path, cpu_set):
+            return self.dry_run
+        if os.path.exists(directory):
+            shutil.rmtree(directory)
+        os.rename(directory + '.tmp', directory)
+        with open(os.path.join(directory, '.gridkey'), 'w') as f:
+            json.dump(self.grid_key(dataset, method, p), f, indent=2)
+        return True
+
+    def _prepare_grid(self, dataset: str, method: str, p: int) -> bool:
+        if self.grid_is_valid(dataset, method, p):
+            return True
+        log_path = os.path.join(self.matrix['output_dir'], f"{dataset}_preprocess_{method}_p{p}.log")
+        with self.scheduler.background():
+            print(f"[grid] building {dataset} / {method} / P={p}")
+            return self.build_grid(dataset, method, p, log_path, timed=False)
+
+    def prepare_grid(self, dataset: str, method: str, p: int):
+        """Returns a future for the cached grid, starting its build if needed."""
+        key = (dataset, method, p)
+        with self.lock:
+            if key not in self.grid_futures:
+                self.grid_futures[key] = self.pool.submit(self._prepare_grid, dataset, method, p)
+            return self.grid_futures[key]
+
+    # --- timed runs ---
+
+    def run_log(self, dataset: str, method: str, p: int, memory: int, rep: int) -> str:
+        return os.path.join(self.matrix['output_dir'], f"{dataset}_pagerank_{method}_p{p}_m{memory}GB_run{rep}.log")
+
+    def preprocess_log(self, dataset: str, method: str, p: int, rep: int) -> str:
+        return os.path.join(self.matrix['output_dir'], f"{dataset}_preprocess_{method}_p{p}_run{rep}.log")
+
+    def measurement(self, dataset: str, method: str, p: int, memory: int, rep: int):
+        """Objective of one finished repetition, or None if its logs are missing or incomplete."""
+        if not os.path.exists(self.run_log(dataset, method, p, memory, rep)):
+            return None
+        times = parse_log_file(self.run_log(dataset, method, p, memory, rep))
+        if 'PR_Iter' not in times:
+            return None
+        value = times['PR_Iter'] + times.get('PR_DegSetup', 0)
+        if self.matrix['datasets'][dataset]['objective'] == 'end_to_end':
+            if not os.path.exists(self.preprocess_log(dataset, method, p, rep)):
+                return None
+            pre = parse_log_file(self.preprocess_log(dataset, method, p, rep))
+            if 'Pre_GridGen' not in pre:
+                return None
+            value += pre['Pre_GridGen'] + pre.get('Pre_DegCalc', 0)
+        return value
+
+    def run(self, dataset: str, method: str, p: int, memory: int, rep: int):
+        """Runs one repetition unless a valid result exists; returns its objective."""
+        value = self.measurement(dataset, method, p, memory, rep)
+        if value is not None:
+            return value
+        end_to_end = self.matrix['datasets'][dataset]['objective'] == 'end_to_end'
+        if not end_to_end and not self.prepare_grid(dataset, method, p).result():
+            return None
+        config = self.matrix['methods'][method]
+        with self.scheduler.exclusive():
+            print(f"[run] {dataset} / {method} / P={p} / {memory}GB / run {rep}")
+            if end_to_end:
+                self.clear_caches()
+                if not self.build_grid(dataset, method, p, self.preprocess_log(dataset, method, p, rep), timed=True, rep=rep):
+                    return None
+            self.clear_caches()
+            log_path = self.run_log(dataset, method, p, memory, rep)
+            command = self.matrix['run_prefix'] + self.metrics_env(log_path, dataset, method, rep) + [
+                config['pagerank'], self.grid_dir(dataset, method, p), str(self.matrix['iterations']), str(memory)]
+            self.execute(command, log_path, self.matrix['cpu_sets'].get('timed'))
+        return self.measurement(dataset, method, p, memory, rep)
+
+    def mean_objective(self, dataset: str, method: str, p: int, memory: int, repetitions: int) -> float:
+        values = [self.run(dataset, method, p, memory, rep) for rep in range(1, repetitions + 1)]
+        values = [v for v in values if v is not None]
+        return float(np.mean(values)) if values else float('inf')
+
+    # --- P search ---
+
+    def successive_halving(self, dataset: str, method: str) -> int:
+        search = self.matrix['search']
+        candidates = list(self.matrix['P'])
+        memory = search.get('memory_gb', max(self.matrix['memory_gb']))
+        eta = search.get('eta', 2)
+        repetitions = search.get('min_repetitions', 1)
+        max_repetitions = search.get('max_repetitions', self.matrix['repetitions'])
+        if self.matrix['datasets'][dataset]['objective'] == 'pagerank':
+            for p in candidates:
+                self.prepare_grid(dataset, method, p)
+        while True:
+            scores = {p: self.mean_objective(dataset, method, p, memory, repetitions) for p in candidates}
+            ranked = sorted(candidates, key=lambda p: scores[p])
+            print(f"[search] {dataset} / {method}: " + ", ".join(f"P={p}: {scores[p]:.2f}s" for p in ranked)
+                  + f" ({repetitions} run(s) each)")
+            if len(ranked) == 1 or repetitions >= max_repetitions or self.dry_run:
+                return ranked[0]
+            candidates = ranked[:max(1, len(ranked) // eta)]
+            repetitions = min(repetitions * eta, max_repetitions)
+
+    def run_matrix(self) -> dict:
+        """Picks P for every (dataset, method), then runs the memory-scaling matrix with it."""
+        chosen = {}
+        for dataset in self.matrix['datasets']:
+            for method in self.matrix['methods']:
+                if self.matrix['search']:
+                    chosen[(dataset, method)] = [self.successive_halving(dataset, method)]
+                else:
+                    chosen[(dataset, method)] = list(self.matrix['P'])
+        summary = {}
+        for (dataset, method), p_values in chosen.items():
+            for p in p_values:
+                if self.matrix['datasets'][dataset]['objective'] == 'pagerank':
+                    self.prepare_grid(dataset, method, p)
+            for p in p_values:
+                for memory in self.matrix['memory_gb']:
+                    value = self.mean_objective(dataset, method, p, memory, self.matrix['repetitions'])
+                    summary[f"{dataset},{method},{p},{memory}"] = value
+        self.pool.shutdown()
+        return {'optimal_p': {f"{d},{m}": p[0] for (d, m), p in chosen.items() if self.matrix['search']},
+                'mean_seconds': summary}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the GridGraph experiment matrix with a grid cache, resumable runs and adaptive P search.")
+    parser.add_argument('matrix', type=str, help="Experiment matrix (JSON), e.g. experiments.example.json.")
+    parser.add_argument('--dry-run', action='store_true', help="Print the commands that would run instead of running them.")
+    args = parser.parse_args()
+
+    matrix = load_matrix(args.matrix)
+    runner = Runner(matrix, args.dry_run)
+    summary = runner.run_matrix()
+
+    for key, p in summary['optimal_p'].items():
+        print(f"Optimal P for [{key}]: {p}")
+    for key, value in summary['mean_seconds'].items():
+        print(f"{key}: {value:.2f}s")
+    if not args.dry_run:
+        with open(os.path.join(matrix['output_dir'], 'summary.json'), 'w') as f:
+            json.dump(summary, f, indent=2)
+        print(f"Summary saved to {os.path.join(matrix['output_dir'], 'summary.json')}")
+
+
+if __name__ == '__main__':
+    main()
@@ -64,6 +64,10 @@ for DATASET in "${DATASETS[@]}"; do
             PREPROCESS_BIN=$PREPROCESS_DV_BIN
             PAGERANK_BIN=$PAGERANK_DV_BIN
         fi
+        # -C: preprocessing logs feed the end-to-end report, so DV must not reuse the degree cache
+        PREPROCESS_FLAGS=""
+        if [ "$VERSION" == "dv" ]; then PREPROCESS_FLAGS="-C"; fi
+
 
         # Loop over P values
         for P in "${P_VALUES[@]}"; do
@@ -75,7 +79,8 @@ for DATASET in "${DATASETS[@]}"; do
             echo -e "\n--- [Preprocessing] $DATASET | $VERSION | P=$P ---" >&2
             echo "Log file: $PREPROCESS_LOG" >&2
 
-            $PREPROCESS_BIN -i "$INPUT_BIN" -o "$GRID_OUTPUT_DIR" -v $V -p $P -t 0 > "$PREPROCESS_LOG" 2>&1
+            $PREPROCESS_BIN -i "$INPUT_BIN" -o "$GRID_OUTPUT_DIR" -v $V -p $P -t 0 $PREPROCESS_FLAGS > "$PREPROCESS_LOG" 2>&1
+
             echo "Preprocessing finished." >&2
 
             # Loop over Memory sizes
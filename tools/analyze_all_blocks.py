@@ -1,67 +1,54 @@
 import os
+import sys
 import argparse
 import numpy as np # Used for pretty printing numbers
 
-# --- Configuration ---
-EDGE_SIZE = 8 # Assuming VertexId is 4 bytes, so an edge is 8 bytes.
-# --------------------
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from gridgraph.stats import read_meta, block_edges, imbalance_report
 
-def calculate_partition_stats(directory: str, p: int, total_edges: int):
+def calculate_partition_stats(directory: str, p: int = None, total_edges: int = None):
     """
     Analyzes all blocks in a directory to calculate partitioning quality metrics.
+    Block sizes come from row_offset, so no per-block files are needed.
     Returns a dictionary containing the calculated statistics.
     """
     if not os.path.isdir(directory):
         print(f"[Error] Directory not found: {directory}")
         return None
 
-    num_total_blocks = p * p
-    if num_total_blocks == 0:
+    meta = read_meta(directory)
+    if p is not None and p != meta['partitions']:
+        print(f"[Error] {directory} was built with P={meta['partitions']}, not P={p}")
         return None
-    
-    ideal_edges_per_block = total_edges / num_total_blocks
-    
-    total_absolute_deviation = 0.0
-    sum_of_block_edges = 0
-    non_empty_blocks = 0
+    if total_edges is None:
+        total_edges = meta['edges']
 
     print(f"Analyzing directory: {directory}...")
-    
-    # Loop through all possible blocks from (0,0) to (p-1, p-1)
-    for i in range(p):
-        # A simple progress indicator for large 'p'
-        print(f"  Processing partition row {i+1}/{p}...", end='\r')
-        for j in range(p):
-            block_path = os.path.join(directory, f'block-{i}-{j}')
-            
-            actual_edges = 0
-            if os.path.exists(block_path):
-                file_size = os.path.getsize(block_path)
-                actual_edges = file_size // EDGE_SIZE
-            
-            if actual_edges > 0:
-                non_empty_blocks += 1
+    edges = block_edges(directory)
+    num_total_blocks = edges.size
+    if num_total_blocks == 0:
+        return None
 
-            total_absolute_deviation += abs(actual_edges - ideal_edges_per_block)
-            sum_of_block_edges += actual_edges
-    
-    # Clear the progress indicator line
-    print("\nAnalysis complete.")
+    ideal_edges_per_block = total_edges / num_total_blocks
+    report = imbalance_report(edges)
 
     return {
         "ideal_edges": ideal_edges_per_block,
-        "total_deviation": total_absolute_deviation,
-        "verified_edges": sum_of_block_edges,
-        "non_empty_blocks": non_empty_blocks,
-        "total_blocks": num_total_blocks
+        "total_deviation": float(np.abs(edges - ideal_edges_per_block).sum()),
+        "verified_edges": int(edges.sum()),
+        "non_empty_blocks": int((edges > 0).sum()),
+        "total_blocks": num_total_blocks,
+        "max_mean": report['max_mean'],
+        "cov": report['cov'],
+        "gini": report['gini'],
     }
 
 def main():
     parser = argparse.ArgumentParser(
         description="Holistically analyze and compare GridGraph partitioning quality."
     )
-    parser.add_argument('-p', type=int, required=True, help="Number of partitions per dimension (p).")
-    parser.add_argument('--edges', type=int, required=True, help="Total number of edges in the graph.")
+    parser.add_argument('-p', type=int, default=None, help="Number of partitions per dimension (p); read from meta if omitted.")
+    parser.add_argument('--edges', type=int, default=None, help="Total number of edges in the graph; read from meta if omitted.")
     
     script_dir = os.path.dirname(os.path.abspath(__file__))
     default_base_dir = os.path.abspath(os.path.join(script_dir, '..', 'data', 'LiveJournal_Grid'))
@@ -74,7 +61,8 @@ def main():
 
     print("=" * 60)
     print("Starting Partitioning Quality Analysis")
-    print(f"Total Edges: {args.edges:,}, Partitions: {args.p}x{args.p} = {args.p*args.p:,}")
+    if args.edges is not None and args.p is not None:
+        print(f"Total Edges: {args.edges:,}, Partitions: {args.p}x{args.p} = {args.p*args.p:,}")
     print("=" * 60)
 
     # --- Analyze each version ---
@@ -93,6 +81,7 @@ def main():
         print(f"  Total Absolute Deviation: {baseline_stats['total_deviation']:,.0f}")
         print(f"  Verified Total Edges: {baseline_stats['verified_edges']:,}")
         print(f"  Non-Empty Blocks: {baseline_stats['non_empty_blocks']:,} / {baseline_stats['total_blocks']:,}")
+        print(f"  Max/Mean: {baseline_stats['max_mean']:.3f}, CoV: {baseline_stats['cov']:.3f}, Gini: {baseline_stats['gini']:.3f}")
 
     if dv_stats:
         print("\n--- Degree-Based Version ---")
@@ -100,6 +89,7 @@ def main():
         print(f"  Total Absolute Deviation: {dv_stats['total_deviation']:,.0f}")
         print(f"  Verified Total Edges: {dv_stats['verified_edges']:,}")
         print(f"  Non-Empty Blocks: {dv_stats['non_empty_blocks']:,} / {dv_stats['total_blocks']:,}")
+        print(f"  Max/Mean: {dv_stats['max_mean']:.3f}, CoV: {dv_stats['cov']:.3f}, Gini: {dv_stats['gini']:.3f}")
 
     # --- Final Conclusion ---
     print("\n" + "=" * 60)
@@ -107,7 +97,7 @@ def main():
     print("-" * 60)
     if baseline_stats and dv_stats:
         # Verification check
-        if dv_stats['verified_edges'] != args.edges or baseline_stats['verified_edges'] != args.edges:
+        if args.edges is not None and (dv_stats['verified_edges'] != args.edges or baseline_stats['verified_edges'] != args.edges):
             print("! Verification Warning: Sum of edges in blocks does not match the provided total edges.")
         
         # Comparison
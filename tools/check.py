@@ -1,26 +1,49 @@
+import os
+import sys
+import argparse
 import numpy as np
 import pandas as pd
-import os
-
-out_degree_path = "../data/LiveJournal_Grid_dv/out_degree_preprocess.data"
-in_degree_path = "../data/LiveJournal_Grid_dv/in_degree_preprocess.data"
 
-print("out_degree exists:", os.path.exists(out_degree_path))
-print("in_degree exists: ", os.path.exists(in_degree_path))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from gridgraph.grid import Grid
+from gridgraph.reference import edge_arrays, pagerank, relative_error
+from gridgraph.relabel import to_original_ids
 
-out_degrees = np.fromfile(out_degree_path, dtype=np.uint32)
-in_degrees  = np.fromfile(in_degree_path, dtype=np.uint32)
+parser = argparse.ArgumentParser(description="Print the degrees of grids and cross-check their PageRank outputs.")
+parser.add_argument('grids', nargs='+', help="Grid directories, e.g. ./data/LiveJournal_Grid ./data/LiveJournal_Grid_dv")
+parser.add_argument('--iterations', type=int, default=None,
+                    help="Iterations pagerank/pagerank_dv ran for; checks each grid's `pagerank` against the NumPy reference.")
+parser.add_argument('--rtol', type=float, default=1e-3, help="Largest accepted relative error of ranks (default: 1e-3).")
+args = parser.parse_args()
 
-df = pd.DataFrame({
-    "vertex_id": np.arange(len(out_degrees)),
-    "out_degree": out_degrees,
-    "in_degree": in_degrees
-})
+ranks = []
+for grid_path in args.grids:
+    grid = Grid(grid_path)
+    out_degrees, in_degrees = grid.degrees()
+    print(f"--- {grid_path} ---")
+    print("degrees exist:", out_degrees is not None)
+    if out_degrees is not None:
+        df = pd.DataFrame({
+            "vertex_id": np.arange(len(out_degrees)),
+            "out_degree": out_degrees,
+            "in_degree": in_degrees
+        })
+        print(f"Total vertices (out_degree): {len(out_degrees)}")
+        print(f"Total vertices (in_degree):  {len(in_degrees)}")
+        print(f"Sum of out_degrees: {out_degrees.sum()}")
+        print(f"Sum of in_degrees:  {in_degrees.sum()}")
+        print("\nFirst 10 vertices and their degrees:")
+        print(df.head(10))
 
-print(f"Total vertices (out_degree): {len(out_degrees)}")
-print(f"Total vertices (in_degree):  {len(in_degrees)}")
-print(f"Sum of out_degrees: {out_degrees.sum()}")
-print(f"Sum of in_degrees:  {in_degrees.sum()}")
+    if not grid.has_vector('pagerank'):
+        continue
+    ranks.append((grid_path, to_original_ids(grid_path, grid.vector('pagerank'))))
+    if args.iterations is not None:
+        source, target = edge_arrays(grid.edge_list())
+        error = relative_error(pagerank(source, target, grid.vertices, args.iterations, out_degrees), grid.vector('pagerank'))
+        print(f"\npagerank vs NumPy reference: max relative error {error:.3e} {'FAIL' if error > args.rtol else 'ok'}")
 
-print("\nFirst 10 vertices and their degrees:")
-print(df.head(10))
+# baseline vs DV: the same graph must give the same ranks, whatever the partitioning or relabeling
+for grid_path, values in ranks[1:]:
+    error = relative_error(ranks[0][1], values)
+    print(f"pagerank of {grid_path} vs {ranks[0][0]}: max relative error {error:.3e} {'FAIL' if error > args.rtol else 'ok'}")
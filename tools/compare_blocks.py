@@ -1,53 +1,72 @@
 import os
-import struct
+import sys
 import argparse
 
-# --- Configuration ---
-# This part is still needed to read sample edges correctly.
-VERTEX_ID_TYPE = 'I'
-VERTEX_ID_SIZE = 4
-EDGE_STRUCT_FORMAT = f'<{VERTEX_ID_TYPE}{VERTEX_ID_TYPE}' # Little-endian
-EDGE_SIZE = VERTEX_ID_SIZE * 2
-# --------------------
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from gridgraph.stats import block_edges, read_block
+from gridgraph.grid import Grid
+from gridgraph.profile import (FEATURES, grid_degrees, hub_threshold, profile_block, profile_grid,
+                               load_profile, save_profile, profile_matches, summarize)
 
-def analyze_block_edges(filepath: str, sample_count: int = 5):
+
+def analyze_block_edges(directory: str, i: int, j: int, sample_count: int = 5):
     """
-    Analyzes a block file to get the total number of edges and a few samples.
-    This version does not calculate degree sums.
+    Returns the number of edges in block i-j and a few sample edges.
+    The count comes from `row_offset`; samples are read from `row` at the block's offset.
     """
-    if not os.path.exists(filepath):
+    if not os.path.exists(os.path.join(directory, 'row_offset')):
         return None, None
 
     try:
-        # Get edge count directly from file size, which is very fast.
-        file_size = os.path.getsize(filepath)
-        num_edges = file_size // EDGE_SIZE
-        
-        sample_edges = []
-        # It's still useful to see a few sample edges.
-        with open(filepath, 'rb') as f:
-            for _ in range(min(num_edges, sample_count)):
-                edge_data = f.read(EDGE_SIZE)
-                if not edge_data or len(edge_data) < EDGE_SIZE:
-                    break
-                edge = struct.unpack(EDGE_STRUCT_FORMAT, edge_data)
-                sample_edges.append(edge)
-                
+        num_edges = int(block_edges(directory)[i, j])
+        sample_edges = [tuple(int(v) if k < 2 else float(v) for k, v in enumerate(edge))
+                        for edge in read_block(directory, i, j, sample_count)]
         return num_edges, sample_edges
     except Exception as e:
-        print(f"[Error] Failed to analyze file {filepath}: {e}")
+        print(f"[Error] Failed to analyze block ({i}, {j}) in {directory}: {e}")
         return 0, []
 
-def print_analysis_results(title: str, filepath: str, num_edges: int, samples: list):
+def block_features(directory: str, i: int, j: int, hub_quantile: float):
+    """The gridgraph.profile features of block i-j, as {feature: value}; None without a grid."""
+    if not os.path.exists(os.path.join(directory, 'row_offset')):
+        return None
+    grid = Grid(directory)
+    out_degree, in_degree = grid_degrees(grid)
+    hub = (out_degree.astype('int64') + in_degree) > hub_threshold(out_degree, in_degree, hub_quantile)
+    return dict(zip(FEATURES, profile_block(grid.block(i, j), out_degree, in_degree, hub)))
+
+def grid_profile(directory: str, workers: int, hub_quantile: float):
+    """Profile of every block: `<grid>/block_profile.npz` if it matches the grid and `hub_quantile`, else computed and saved there."""
+    path = os.path.join(directory, 'block_profile.npz')
+    if os.path.exists(path):
+        profile = load_profile(path)
+        if profile_matches(profile, directory, hub_quantile):
+            return profile
+    profile = profile_grid(directory, workers, hub_quantile)
+    save_profile(path, profile)
+    return profile
+
+def print_analysis_results(title: str, directory: str, num_edges: int, samples: list, features: dict = None):
     """Prints the formatted analysis results for a block."""
     print(f"--- {title} ---")
     if num_edges is None:
-        print(f"File not found: {filepath}")
+        print(f"Grid not found: {directory}")
         return
 
-    print(f"File: {filepath}")
+    print(f"Grid: {directory}")
     print(f"Total Edges in Block: {num_edges:,}")
     print(f"Sample Edges: {samples}")
+    for feature, value in (features or {}).items():
+        print(f"  {feature}: {value:.4f}" if isinstance(value, float) else f"  {feature}: {value:,}")
+
+def print_feature_table(rows: dict, base: dict, dv: dict):
+    """Prints baseline vs DV values side by side, with the relative change."""
+    print(f"  {'feature':<24} {'baseline':>16} {'degree-based':>16} {'change':>9}")
+    for feature in rows:
+        b, d = base[feature], dv[feature]
+        change = f"{d / b - 1:+9.1%}" if b else f"{'-':>9}"
+        fmt = (lambda x: f"{x:>16.4f}") if isinstance(b, float) else (lambda x: f"{x:>16,}")
+        print(f"  {feature:<24} {fmt(b)} {fmt(d)} {change}")
 
 def main():
     parser = argparse.ArgumentParser(description="Compare the number of edges in GridGraph block partitions.")
@@ -61,6 +80,10 @@ def main():
 
     parser.add_argument('--base_dir', type=str, default=default_base_dir)
     parser.add_argument('--dv_dir', type=str, default=default_dv_dir)
+    parser.add_argument('--hub-quantile', type=float, default=0.99, help="Degree quantile above which vertices are hubs (default: 0.99).")
+    parser.add_argument('--all', action='store_true',
+                        help="Also compare grid-wide block profiles (read from, or saved to, <grid>/block_profile.npz).")
+    parser.add_argument('-j', '--workers', type=int, default=None, help="Worker processes for --all (default: all cores).")
     args = parser.parse_args()
 
     print("=" * 50)
@@ -68,16 +91,15 @@ def main():
     print("=" * 50)
 
     # --- Analyze each version ---
-    base_block_path = os.path.join(args.base_dir, f'block-{args.i}-{args.j}')
-    dv_block_path = os.path.join(args.dv_dir, f'block-{args.i}-{args.j}')
-
-    base_num_edges, base_samples = analyze_block_edges(base_block_path)
-    dv_num_edges, dv_samples = analyze_block_edges(dv_block_path)
+    base_num_edges, base_samples = analyze_block_edges(args.base_dir, args.i, args.j)
+    dv_num_edges, dv_samples = analyze_block_edges(args.dv_dir, args.i, args.j)
+    base_features = block_features(args.base_dir, args.i, args.j, args.hub_quantile)
+    dv_features = block_features(args.dv_dir, args.i, args.j, args.hub_quantile)
 
     # --- Print Results ---
-    print_analysis_results("Baseline Version", base_block_path, base_num_edges, base_samples)
+    print_analysis_results("Baseline Version", args.base_dir, base_num_edges, base_samples, base_features)
     print("\n" + "-"*25 + "\n")
-    print_analysis_results("Degree-Based Version", dv_block_path, dv_num_edges, dv_samples)
+    print_analysis_results("Degree-Based Version", args.dv_dir, dv_num_edges, dv_samples, dv_features)
     print("\n" + "=" * 50)
 
     # --- Summary ---
@@ -92,7 +114,14 @@ def main():
             print(f"  The Degree-Based block is SMALLER by {abs(diff):,} edges ({percentage_change:+.2f}%).")
         else:
             print("  Both blocks have the same number of edges.")
+        print_feature_table(FEATURES[1:], base_features, dv_features)
+
+        if args.all:
+            print("\nAll blocks:")
+            base_summary = summarize(grid_profile(args.base_dir, args.workers, args.hub_quantile))
+            dv_summary = summarize(grid_profile(args.dv_dir, args.workers, args.hub_quantile))
+            print_feature_table(base_summary, base_summary, dv_summary)
     print("=" * 50)
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
@@ -24,255 +24,32 @@ Copyright (c) 2014-2015 Xiaowei Zhu, Tsinghua University
 #include <string.h>
 
 #include <string>
+#include <sstream>
 #include <vector>
 #include <thread>
 
 #include "core/constants.hpp"
 #include "core/type.hpp"
 #include "core/filesystem.hpp"
-#include "core/queue.hpp"
 #include "core/partition.hpp"
 #include "core/time.hpp"
-#include "core/atomic.hpp"
-
-long PAGESIZE = 4096;
-
-void generate_edge_grid(std::string input, std::string output, VertexId vertices, int partitions, int edge_type) {
-	int parallelism = std::thread::hardware_concurrency();
-	int edge_unit;
-	EdgeId edges;
-	switch (edge_type) {
-	case 0:
-		edge_unit = sizeof(VertexId) * 2;
-		edges = file_size(input) / edge_unit;
-		break;
-	case 1:
-		edge_unit = sizeof(VertexId) * 2 + sizeof(Weight);
-		edges = file_size(input) / edge_unit;
-		break;
-	default:
-		fprintf(stderr, "edge type (%d) is not supported.\n", edge_type);
-		exit(-1);
-	}
-	printf("vertices = %d, edges = %ld\n", vertices, edges);
-
-	char ** buffers = new char * [parallelism*2];
-	bool * occupied = new bool [parallelism*2];
-	for (int i=0;i<parallelism*2;i++) {
-		buffers[i] = (char *)memalign(PAGESIZE, IOSIZE);
-		occupied[i] = false;
-	}
-	Queue<std::tuple<int, long> > tasks(parallelism);
-	int ** fout;
-	std::mutex ** mutexes;
-	fout = new int * [partitions];
-	mutexes = new std::mutex * [partitions];
-	if (file_exists(output)) {
-		remove_directory(output);
-	}
-	create_directory(output);
-
-	const int grid_buffer_size = 768; // 12 * 8 * 8
-	char * global_grid_buffer = (char *) memalign(PAGESIZE, grid_buffer_size * partitions * partitions);
-	char *** grid_buffer = new char ** [partitions];
-	int ** grid_buffer_offset = new int * [partitions];
-	for (int i=0;i<partitions;i++) {
-		mutexes[i] = new std::mutex [partitions];
-		fout[i] = new int [partitions];
-		grid_buffer[i] = new char * [partitions];
-		grid_buffer_offset[i] = new int [partitions];
-		for (int j=0;j<partitions;j++) {
-			char filename[4096];
-			sprintf(filename, "%s/block-%d-%d", output.c_str(), i, j);
-			fout[i][j] = open(filename, O_WRONLY|O_APPEND|O_CREAT, 0644);
-			grid_buffer[i][j] = global_grid_buffer + (i * partitions + j) * grid_buffer_size;
-			grid_buffer_offset[i][j] = 0;
-		}
-	}
-
-	std::vector<std::thread> threads;
-	for (int ti=0;ti<parallelism;ti++) {
-		threads.emplace_back([&]() {
-			char * local_buffer = (char *) memalign(PAGESIZE, IOSIZE);
-			int * local_grid_offset = new int [partitions * partitions];
-			int * local_grid_cursor = new int [partitions * partitions];
-			VertexId source, target;
-			Weight weight;
-			while (true) {
-				int cursor;
-				long bytes;
-				std::tie(cursor, bytes) = tasks.pop();
-				if (cursor==-1) break;
-				memset(local_grid_offset, 0, sizeof(int) * partitions * partitions);
-				memset(local_grid_cursor, 0, sizeof(int) * partitions * partitions);
-				char * buffer = buffers[cursor];
-				for (long pos=0;pos<bytes;pos+=edge_unit) {
-					source = *(VertexId*)(buffer+pos);
-					target = *(VertexId*)(buffer+pos+sizeof(VertexId));
-					int i = get_partition_id(vertices, partitions, source);
-					int j = get_partition_id(vertices, partitions, target);
-					local_grid_offset[i*partitions+j] += edge_unit;
-				}
-				local_grid_cursor[0] = 0;
-				for (int ij=1;ij<partitions*partitions;ij++) {
-					local_grid_cursor[ij] = local_grid_offset[ij - 1];
-					local_grid_offset[ij] += local_grid_cursor[ij];
-				}
-				assert(local_grid_offset[partitions*partitions-1]==bytes);
-				for (long pos=0;pos<bytes;pos+=edge_unit) {
-					source = *(VertexId*)(buffer+pos);
-					target = *(VertexId*)(buffer+pos+sizeof(VertexId));
-					int i = get_partition_id(vertices, partitions, source);
-					int j = get_partition_id(vertices, partitions, target);
-					*(VertexId*)(local_buffer+local_grid_cursor[i*partitions+j]) = source;
-					*(VertexId*)(local_buffer+local_grid_cursor[i*partitions+j]+sizeof(VertexId)) = target;
-					if (edge_type==1) {
-						weight = *(Weight*)(buffer+pos+sizeof(VertexId)*2);
-						*(Weight*)(local_buffer+local_grid_cursor[i*partitions+j]+sizeof(VertexId)*2) = weight;
-					}
-					local_grid_cursor[i*partitions+j] += edge_unit;
-				}
-				int start = 0;
-				for (int ij=0;ij<partitions*partitions;ij++) {
-					assert(local_grid_cursor[ij]==local_grid_offset[ij]);
-					int i = ij / partitions;
-					int j = ij % partitions;
-					std::unique_lock<std::mutex> lock(mutexes[i][j]);
-					if (local_grid_offset[ij] - start > edge_unit) {
-						write(fout[i][j], local_buffer+start, local_grid_offset[ij]-start);
-					} else if (local_grid_offset[ij] - start == edge_unit) {
-						memcpy(grid_buffer[i][j]+grid_buffer_offset[i][j], local_buffer+start, edge_unit);
-						grid_buffer_offset[i][j] += edge_unit;
-						if (grid_buffer_offset[i][j]==grid_buffer_size) {
-							write(fout[i][j], grid_buffer[i][j], grid_buffer_size);
-							grid_buffer_offset[i][j] = 0;
-						}
-					}
-					start = local_grid_offset[ij];
-				}
-				occupied[cursor] = false;
-			}
-		});
-	}
-
-	int fin = open(input.c_str(), O_RDONLY);
-	if (fin==-1) printf("%s\n", strerror(errno));
-	assert(fin!=-1);
-	int cursor = 0;
-	long total_bytes = file_size(input);
-	long read_bytes = 0;
-	double start_time = get_time();
-	while (true) {
-		long bytes = read(fin, buffers[cursor], IOSIZE);
-		assert(bytes!=-1);
-		if (bytes==0) break;
-		occupied[cursor] = true;
-		tasks.push(std::make_tuple(cursor, bytes));
-		read_bytes += bytes;
-		// printf("progress: %.2f%%\r", 100. * read_bytes / total_bytes);
-		// fflush(stdout);
-		while (occupied[cursor]) {
-			cursor = (cursor + 1) % (parallelism * 2);
-		}
-	}
-	close(fin);
-	assert(read_bytes==edges*edge_unit);
-
-	for (int ti=0;ti<parallelism;ti++) {
-		tasks.push(std::make_tuple(-1, 0));
-	}
-
-	for (int ti=0;ti<parallelism;ti++) {
-		threads[ti].join();
-	}
-
-	printf("%lf -> ", get_time() - start_time);
-	long ts = 0;
-	for (int i=0;i<partitions;i++) {
-		for (int j=0;j<partitions;j++) {
-			if (grid_buffer_offset[i][j]>0) {
-				ts += grid_buffer_offset[i][j];
-				write(fout[i][j], grid_buffer[i][j], grid_buffer_offset[i][j]);
-			}
-		}
-	}
-	printf("%lf (%ld)\n", get_time() - start_time, ts);
-
-	for (int i=0;i<partitions;i++) {
-		for (int j=0;j<partitions;j++) {
-			close(fout[i][j]);
-		}
-	}
-
-	printf("it takes %.2f seconds to generate edge blocks\n", get_time() - start_time);
-
-	long offset;
-	int fout_column = open((output+"/column").c_str(), O_WRONLY|O_APPEND|O_CREAT, 0644);
-	int fout_column_offset = open((output+"/column_offset").c_str(), O_WRONLY|O_APPEND|O_CREAT, 0644);
-	offset = 0;
-	for (int j=0;j<partitions;j++) {
-		for (int i=0;i<partitions;i++) {
-			// printf("progress: %.2f%%\r", 100. * offset / total_bytes);
-			// fflush(stdout);
-			write(fout_column_offset, &offset, sizeof(offset));
-			char filename[4096];
-			sprintf(filename, "%s/block-%d-%d", output.c_str(), i, j);
-			offset += file_size(filename);
-			fin = open(filename, O_RDONLY);
-			while (true) {
-				long bytes = read(fin, buffers[0], IOSIZE);
-				assert(bytes!=-1);
-				if (bytes==0) break;
-				write(fout_column, buffers[0], bytes);
-			}
-			close(fin);
-		}
-	}
-	write(fout_column_offset, &offset, sizeof(offset));
-	close(fout_column_offset);
-	close(fout_column);
-	printf("column oriented grid generated\n");
-	int fout_row = open((output+"/row").c_str(), O_WRONLY|O_APPEND|O_CREAT, 0644);
-	int fout_row_offset = open((output+"/row_offset").c_str(), O_WRONLY|O_APPEND|O_CREAT, 0644);
-	offset = 0;
-	for (int i=0;i<partitions;i++) {
-		for (int j=0;j<partitions;j++) {
-			// printf("progress: %.2f%%\r", 100. * offset / total_bytes);
-			// fflush(stdout);
-			write(fout_row_offset, &offset, sizeof(offset));
-			char filename[4096];
-			sprintf(filename, "%s/block-%d-%d", output.c_str(), i, j);
-			offset += file_size(filename);
-			fin = open(filename, O_RDONLY);
-			while (true) {
-				long bytes = read(fin, buffers[0], IOSIZE);
-				assert(bytes!=-1);
-				if (bytes==0) break;
-				write(fout_row, buffers[0], bytes);
-			}
-			close(fin);
-		}
-	}
-	write(fout_row_offset, &offset, sizeof(offset));
-	close(fout_row_offset);
-	close(fout_row);
-	printf("row oriented grid generated\n");
-
-	printf("it takes %.2f seconds to generate edge grid\n", get_time() - start_time);
-
-	FILE * fmeta = fopen((output+"/meta").c_str(), "w");
-	fprintf(fmeta, "%d %d %ld %d", edge_type, vertices, edges, partitions);
-	fclose(fmeta);
-}
+#include "core/gridwriter.hpp"
+#include "core/metrics.hpp"
+#include "core/degreecache.hpp"
 
 int main(int argc, char ** argv) {
 	int opt;
 	std::string input = "";
 	std::string output = "";
 	VertexId vertices = -1;
-	int partitions = -1;
+	std::vector<int> partition_list;
 	int edge_type = 0;
-	while ((opt = getopt(argc, argv, "i:o:v:p:t:")) != -1) {
+	long spill_budget = 1024l*1024l*1024l;
+	bool compact = false;
+	std::string sort_order = "";
+	bool dedup = false;
+	bool drop_self_loops = false;
+	while ((opt = getopt(argc, argv, "i:o:v:p:t:b:zO:UN")) != -1) {
 		switch (opt) {
 		case 'i':
 			input = optarg;
@@ -283,21 +60,117 @@ int main(int argc, char ** argv) {
 		case 'v':
 			vertices = atoi(optarg);
 			break;
-		case 'p':
-			partitions = atoi(optarg);
+		case 'p': {
+			std::stringstream ss(optarg);
+			std::string item;
+			while (std::getline(ss, item, ',')) {
+				partition_list.push_back(atoi(item.c_str()));
+			}
 			break;
+		}
 		case 't':
 			edge_type = atoi(optarg);
 			break;
+		case 'b':
+			spill_budget = atol(optarg)*1024l*1024l;
+			break;
+		case 'z':
+			compact = true;
+			break;
+		case 'O':
+			sort_order = optarg;
+			if (std::find(std::begin(BLOCK_ORDERS), std::end(BLOCK_ORDERS), sort_order)==std::end(BLOCK_ORDERS)) {
+				fprintf(stderr, "unknown block order %s (source, target, layout or hilbert)\n", optarg);
+				exit(-1);
+			}
+			break;
+		case 'U':
+			dedup = true;
+			break;
+		case 'N':
+			drop_self_loops = true;
+			break;
 		}
 	}
+	if (sort_order=="" && (dedup || drop_self_loops)) {
+		sort_order = "source";
+	}
+	DegreeCacheHeader sidecar;
+	bool has_sidecar = input!="" && read_degree_cache_header(input, edge_type, sidecar);
+	if (vertices==-1 && has_sidecar) {
+		vertices = sidecar.vertices;
+		printf("|V| = %d read from %s.degree\n", vertices, input.c_str());
+	}
 	if (input=="" || output=="" || vertices==-1) {
-		fprintf(stderr, "usage: %s -i [input path] -o [output path] -v [vertices] -p [partitions] -t [edge type: 0=unweighted, 1=weighted]\n", argv[0]);
+		fprintf(stderr, "usage: %s -i [input path] -o [output path] -v [vertices, default: from the input's .degree sidecar] -p [partitions, e.g. 16 or 4,8,16] -t [edge type: 0=unweighted, 1=weighted] [-b spill buffer budget in MB, default 1024] [-z: compact edge encoding] [-O block order: source, target, layout or hilbert] [-U: drop duplicate edges] [-N: drop self-loops]\n", argv[0]);
+		fprintf(stderr, "       with several partition counts, grid P is written to [output path]_p<P>\n");
 		exit(-1);
 	}
-	if (partitions==-1) {
-		partitions = vertices / CHUNKSIZE;
+	if (partition_list.empty()) {
+		partition_list.push_back(vertices / CHUNKSIZE);
+	}
+
+	MetricsLog metrics("preprocess");
+	metrics.set("input", input);
+	metrics.set("output", output);
+	metrics.set("vertices", (long)vertices);
+	if (partition_list.size()==1) {
+		metrics.set("partitions", partition_list[0]);
+	} else {
+		std::string partition_names;
+		for (int partitions : partition_list) {
+			partition_names += (partition_names.empty() ? "" : ",") + std::to_string(partitions);
+		}
+		metrics.set("partitions", partition_names);
+	}
+	metrics.set("edge_type", edge_type);
+	metrics.set("spill_budget", spill_budget);
+	metrics.set("compact", compact ? 1 : 0);
+	metrics.set("block_order", sort_order=="" ? "none" : sort_order);
+	metrics.set("dedup", dedup ? 1 : 0);
+	metrics.set("drop_self_loops", drop_self_loops ? 1 : 0);
+
+	std::vector<GridWriter*> grids;
+	for (int partitions : partition_list) {
+		std::string grid_output = (partition_list.size() == 1) ? output : output + "_p" + std::to_string(partitions);
+		if (file_exists(grid_output)) {
+			remove_directory(grid_output);
+		}
+		create_directory(grid_output);
+		grids.push_back(new GridWriter(grid_output, vertices, partitions, edge_type));
+		grids.back()->set_compact(compact);
+	}
+	// degrees come from the input's sidecar when it has them, otherwise from the first grid scan
+	uint32_t * out_degree = new uint32_t [vertices]();
+	uint32_t * in_degree = new uint32_t [vertices]();
+	long edges = 0;
+	bool cached = has_sidecar && load_degree_cache(input, vertices, edge_type, out_degree, in_degree, edges);
+	if (cached) {
+		printf("degrees read from %s.degree\n", input.c_str());
+	}
+	metrics.set("degree_source", cached ? "sidecar" : "scan");
+	metrics.begin_phase();
+	if (cached) {
+		generate_edge_grids(input, grids, spill_budget);
+	} else {
+		generate_edge_grids(input, grids, spill_budget, nullptr, out_degree, in_degree);
+		edges = file_size(input) / get_edge_unit(edge_type);
+	}
+	metrics.end_phase("grid");
+	for (auto grid : grids) {
+		save_grid_degrees(grid->output, vertices, edges, out_degree, in_degree);
+	}
+	if (sort_order!="") {
+		metrics.begin_phase();
+		for (auto grid : grids) {
+			grid->sort_blocks(sort_order, dedup, drop_self_loops, spill_budget);
+		}
+		metrics.end_phase("sort");
+	}
+	for (auto grid : grids) {
+		delete grid;
 	}
-	generate_edge_grid(input, output, vertices, partitions, edge_type);
+	delete [] out_degree;
+	delete [] in_degree;
 	return 0;
 }
@@ -29,7 +29,8 @@ Copyright (c) 2014-2015 Xiaowei Zhu, Tsinghua University
 #include <string>
 #include <vector>
 #include <thread>
-#include <atomic>
+#include <sys/mman.h>
+#include <sys/resource.h>
 #include "core/constants.hpp"
 #include "core/type.hpp"
 #include "core/filesystem.hpp"
@@ -37,18 +38,54 @@ Copyright (c) 2014-2015 Xiaowei Zhu, Tsinghua University
 #include "core/partition.hpp"
 #include "core/time.hpp"
 #include "core/atomic.hpp"
+#include "core/gridwriter.hpp"
+#include "core/metrics.hpp"
+#include "core/degreecache.hpp"
+#include "core/partitioner.hpp"
 
 long PAGESIZE = 4096;
 
 #include <numeric>
+#include <parallel/algorithm>
 
+// out/in-degree arrays of all vertices, allocated once and never copied. They live in `storage`, or
+// with -L in a shared mapping of a grid degree file (`mapped_file`) that the page cache can write
+// back and evict, and that is linked into every grid instead of being written again.
 struct DegreeInfo {
-    std::vector<uint32_t> out_degree;
-    std::vector<uint32_t> in_degree;
-    long long total_edges;
+    uint32_t * out_degree = NULL;
+    uint32_t * in_degree = NULL;
+    long long total_edges = 0;
+    std::vector<uint32_t> storage;
+    char * mapping = NULL;
+    long mapping_bytes = 0;
+    std::string mapped_file;
 };
 
-void calculate_and_save_degrees(std::string input, std::string output, VertexId vertices, int edge_type, DegreeInfo& out_info) {
+// zeroed degree arrays; mapped_file selects the file-backed (-L) layout
+void allocate_degrees(DegreeInfo& info, VertexId vertices, std::string mapped_file) {
+	if (mapped_file!="") {
+		info.mapping = map_new_grid_degrees(mapped_file, vertices, info.mapping_bytes);
+		info.mapped_file = mapped_file;
+		info.out_degree = (uint32_t *)(info.mapping + sizeof(GridDegreeHeader));
+	} else {
+		info.storage.assign(2l * vertices, 0);
+		info.out_degree = info.storage.data();
+	}
+	info.in_degree = info.out_degree + vertices;
+}
+
+void release_degrees(DegreeInfo& info) {
+	if (info.mapping!=NULL) {
+		munmap(info.mapping, info.mapping_bytes);
+		unlink(info.mapped_file.c_str());
+		info.mapping = NULL;
+	}
+	std::vector<uint32_t>().swap(info.storage);
+	info.out_degree = info.in_degree = NULL;
+}
+
+void calculate_degrees(std::string input, VertexId vertices, int edge_type, DegreeInfo& out_info) {
+
 	printf("Starting Phase 1: Calculating and saving degrees...\n");
 	double function_start_time = get_time();
 	int parallelism = std::thread::hardware_concurrency();
@@ -68,8 +105,9 @@ void calculate_and_save_degrees(std::string input, std::string output, VertexId
 			exit(-1);
 	}
 
-	std::vector<std::atomic<uint32_t>> out_degree(vertices);
-    std::vector<std::atomic<uint32_t>> in_degree(vertices);
+	// counted in place into the zeroed arrays of out_info
+	uint32_t * out_degree = out_info.out_degree;
+	uint32_t * in_degree = out_info.in_degree;
 
 	// Ƽ  ( Pass 1 )
 	char ** buffers = new char * [parallelism*2];
@@ -91,8 +129,8 @@ void calculate_and_save_degrees(std::string input, std::string output, VertexId
 					source = *(VertexId*)(buffer + pos);
 					target = *(VertexId*)(buffer + pos + sizeof(VertexId));
 					if (source < vertices && target < vertices) {
-						out_degree[source]++;
-						in_degree[target]++;
+						__sync_fetch_and_add(&out_degree[source], 1);
+						__sync_fetch_and_add(&in_degree[target], 1);
 					}
 				}
 				occupied[std::get<0>(task)] = false;
@@ -128,25 +166,6 @@ void calculate_and_save_degrees(std::string input, std::string output, VertexId
     }
     
 
-	// atomic Ϳ Ϲ ͷ ȯ
-    std::vector<uint32_t> final_out_degree(vertices);
-    std::vector<uint32_t> final_in_degree(vertices);
-    for(VertexId i = 0; i < vertices; ++i) {
-        final_out_degree[i] = out_degree[i].load();
-        final_in_degree[i] = in_degree[i].load();
-    }
-    
-	// PageRank  ϱ  Ϸ 
-	std::ofstream out_degree_file(output + "/out_degree_preprocess.data", std::ios::binary);
-	out_degree_file.write(reinterpret_cast<const char*>(final_out_degree.data()), vertices * sizeof(uint32_t));
-    out_degree_file.close();
-
-	std::ofstream in_degree_file(output + "/in_degree_preprocess.data", std::ios::binary);
-	in_degree_file.write(reinterpret_cast<const char*>(final_in_degree.data()), vertices * sizeof(uint32_t));
-	in_degree_file.close();
-
-    out_info.out_degree = final_out_degree; // ȯ Ϲ 
-    out_info.in_degree = final_in_degree;
     out_info.total_edges = edges; //    
 
     printf("Phase 1 (Degree Calculation) took: %.2f seconds.\n", get_time() - function_start_time);
@@ -161,16 +180,30 @@ void calculate_and_save_degrees(std::string input, std::string output, VertexId
 	//  ܰ迡   ֵ  ȯ
 }
 
-// degree ͸  Ƽ  ϴ Լ
-std::vector<int> create_degree_balanced_partition_map(
-	const std::vector<uint32_t>& degrees,
+void save_degrees(std::string output, VertexId vertices, const DegreeInfo& info) {
+	// PageRank  ϱ  Ϸ 
+	// versioned degree file (core/degreecache.hpp) that Graph maps for every application
+	if (info.mapping!=NULL) {
+		// the mapped file already is one: link it (copy it only if the file system has no hard links)
+		((GridDegreeHeader *)info.mapping)->edges = info.total_edges;
+		if (link(info.mapped_file.c_str(), (output + "/degrees").c_str())==0) return;
+	}
+	save_grid_degrees(output, vertices, info.total_edges, info.out_degree, info.in_degree);
+}
+
+// degree ͸  Ƽ 踦 ϴ Լ
+// greedy sweep: a partition is closed once adding the next vertex would overshoot its share of the
+// degree by more than stopping short of it; returns the P+1 boundaries directly (no per-vertex map)
+std::vector<VertexId> create_degree_balanced_boundary(
+	const uint32_t * degrees,
 	int partitions,
 	VertexId vertices,
 	long long total_degree
 ) {
-    std::vector<int> partition_map(vertices);
-    if (vertices == 0) return partition_map;
-    
+    std::vector<VertexId> boundary(partitions + 1, vertices);
+    boundary[0] = 0;
+    if (vertices == 0) return boundary;
+
     long long target_degree_per_partition = total_degree / partitions;
 
     int current_partition_id = 0;
@@ -187,242 +220,112 @@ std::vector<int> create_degree_balanced_partition_map(
             if (diff_before_add <= diff_after_add) {
                 current_partition_id++;
                 current_partition_degree_sum = 0;
+                boundary[current_partition_id] = v_id;
             }
         }
 
-        partition_map[v_id] = current_partition_id;
         current_partition_degree_sum += degrees[v_id];
     }
 
-    return partition_map;
+    return boundary;
 }
 
-void generate_edge_grid(std::string input, std::string output, VertexId vertices, int partitions, int edge_type,
-	const std::vector<int>& source_partition_map,
-	const std::vector<int>& target_partition_map) {
-	int parallelism = std::thread::hardware_concurrency();
-	int edge_unit;
-	EdgeId edges;
-	switch (edge_type) {
-	case 0:
-		edge_unit = sizeof(VertexId) * 2;
-		edges = file_size(input) / edge_unit;
-		break;
-	case 1:
-		edge_unit = sizeof(VertexId) * 2 + sizeof(Weight);
-		edges = file_size(input) / edge_unit;
-		break;
-	default:
-		fprintf(stderr, "edge type (%d) is not supported.\n", edge_type);
-		exit(-1);
-	}
-	printf("vertices = %d, edges = %ld\n", vertices, edges);
+void save_partition_boundary(std::string filename, const std::vector<VertexId>& boundary) {
+	int fout = open(filename.c_str(), O_WRONLY|O_CREAT|O_TRUNC, 0644);
+	assert(fout != -1);
+	long bytes = write(fout, boundary.data(), sizeof(VertexId) * boundary.size());
+	assert(bytes == (long)(sizeof(VertexId) * boundary.size()));
+	close(fout);
+}
 
-	char ** buffers = new char * [parallelism*2];
-	bool * occupied = new bool [parallelism*2];
-	for (int i=0;i<parallelism*2;i++) {
-		buffers[i] = (char *)memalign(PAGESIZE, IOSIZE);
-		occupied[i] = false;
+// Partitioning strategies (-s): "greedy" sweeps out-degree (sources) and in-degree (targets)
+// as before; "linear" solves each 1-D split optimally (smallest largest partition); "combined"
+// uses one optimal split of out+in degree for both axes; "refine" and "refine-var" start from
+// "linear" and move boundaries to minimise the largest predicted block or the variance of
+// block sizes, estimated from a sample of the edges (core/partitioner.hpp).
+const char * PARTITION_STRATEGIES[] = {"greedy", "linear", "combined", "refine", "refine-var"};
+
+void create_partition_boundaries(const DegreeInfo& info, VertexId vertices, int partitions, std::string strategy,
+	const EdgeSample& sample, std::vector<VertexId>& source_boundary, std::vector<VertexId>& target_boundary) {
+	auto out_degree = [&](VertexId v) { return (long)info.out_degree[v]; };
+	auto in_degree = [&](VertexId v) { return (long)info.in_degree[v]; };
+	if (strategy=="refine" || strategy=="refine-var") {
+		source_boundary = linear_partition(out_degree, vertices, partitions);
+		target_boundary = linear_partition(in_degree, vertices, partitions);
+		int fine = GridRefiner::fine_ranges(partitions, vertices);
+		GridRefiner refiner(sample,
+			GridRefiner::merge_boundaries(source_boundary, linear_partition(out_degree, vertices, fine)),
+			GridRefiner::merge_boundaries(target_boundary, linear_partition(in_degree, vertices, fine)));
+		refiner.refine(partitions, strategy=="refine-var", source_boundary, target_boundary);
+		return;
 	}
-	Queue<std::tuple<int, long> > tasks(parallelism);
-	int ** fout;
-	std::mutex ** mutexes;
-	fout = new int * [partitions];
-	mutexes = new std::mutex * [partitions];
-
-	const int grid_buffer_size = 768; // 12 * 8 * 8
-	char * global_grid_buffer = (char *) memalign(PAGESIZE, grid_buffer_size * partitions * partitions);
-	char *** grid_buffer = new char ** [partitions];
-	int ** grid_buffer_offset = new int * [partitions];
-	for (int i=0;i<partitions;i++) {
-		mutexes[i] = new std::mutex [partitions];
-		fout[i] = new int [partitions];
-		grid_buffer[i] = new char * [partitions];
-		grid_buffer_offset[i] = new int [partitions];
-		for (int j=0;j<partitions;j++) {
-			char filename[4096];
-			sprintf(filename, "%s/block-%d-%d", output.c_str(), i, j);
-			fout[i][j] = open(filename, O_WRONLY|O_APPEND|O_CREAT, 0644);
-			grid_buffer[i][j] = global_grid_buffer + (i * partitions + j) * grid_buffer_size;
-			grid_buffer_offset[i][j] = 0;
-		}
+	if (strategy=="linear") {
+		source_boundary = linear_partition(out_degree, vertices, partitions);
+		target_boundary = linear_partition(in_degree, vertices, partitions);
+	} else if (strategy=="combined") {
+		source_boundary = linear_partition([&](VertexId v) { return (long)info.out_degree[v] + info.in_degree[v]; }, vertices, partitions);
+		target_boundary = source_boundary;
+	} else {
+		source_boundary = create_degree_balanced_boundary(info.out_degree, partitions, vertices, info.total_edges);
+		target_boundary = create_degree_balanced_boundary(info.in_degree, partitions, vertices, info.total_edges);
 	}
+}
 
-	std::vector<std::thread> threads;
-	for (int ti=0;ti<parallelism;ti++) {
-		threads.emplace_back([&]() {
-			char * local_buffer = (char *) memalign(PAGESIZE, IOSIZE);
-			int * local_grid_offset = new int [partitions * partitions];
-			int * local_grid_cursor = new int [partitions * partitions];
-			VertexId source, target;
-			Weight weight;
-			while (true) {
-				int cursor;
-				long bytes;
-				std::tie(cursor, bytes) = tasks.pop();
-				if (cursor==-1) break;
-				memset(local_grid_offset, 0, sizeof(int) * partitions * partitions);
-				memset(local_grid_cursor, 0, sizeof(int) * partitions * partitions);
-				char * buffer = buffers[cursor];
-				for (long pos=0;pos<bytes;pos+=edge_unit) {
-					source = *(VertexId*)(buffer+pos);
-					target = *(VertexId*)(buffer+pos+sizeof(VertexId));
-					int i = source_partition_map[source];
-					int j = target_partition_map[target];
-					local_grid_offset[i*partitions+j] += edge_unit;
-				}
-				local_grid_cursor[0] = 0;
-				for (int ij=1;ij<partitions*partitions;ij++) {
-					local_grid_cursor[ij] = local_grid_offset[ij - 1];
-					local_grid_offset[ij] += local_grid_cursor[ij];
-				}
-				assert(local_grid_offset[partitions*partitions-1]==bytes);
-				for (long pos=0;pos<bytes;pos+=edge_unit) {
-					source = *(VertexId*)(buffer+pos);
-					target = *(VertexId*)(buffer+pos+sizeof(VertexId));
-					int i = source_partition_map[source];
-					int j = target_partition_map[target];
-					*(VertexId*)(local_buffer+local_grid_cursor[i*partitions+j]) = source;
-					*(VertexId*)(local_buffer+local_grid_cursor[i*partitions+j]+sizeof(VertexId)) = target;
-					if (edge_type==1) {
-						weight = *(Weight*)(buffer+pos+sizeof(VertexId)*2);
-						*(Weight*)(local_buffer+local_grid_cursor[i*partitions+j]+sizeof(VertexId)*2) = weight;
-					}
-					local_grid_cursor[i*partitions+j] += edge_unit;
-				}
-				int start = 0;
-				for (int ij=0;ij<partitions*partitions;ij++) {
-					assert(local_grid_cursor[ij]==local_grid_offset[ij]);
-					int i = ij / partitions;
-					int j = ij % partitions;
-					std::unique_lock<std::mutex> lock(mutexes[i][j]);
-					if (local_grid_offset[ij] - start > edge_unit) {
-						write(fout[i][j], local_buffer+start, local_grid_offset[ij]-start);
-					} else if (local_grid_offset[ij] - start == edge_unit) {
-						memcpy(grid_buffer[i][j]+grid_buffer_offset[i][j], local_buffer+start, edge_unit);
-						grid_buffer_offset[i][j] += edge_unit;
-						if (grid_buffer_offset[i][j]==grid_buffer_size) {
-							write(fout[i][j], grid_buffer[i][j], grid_buffer_size);
-							grid_buffer_offset[i][j] = 0;
-						}
-					}
-					start = local_grid_offset[ij];
-				}
-				occupied[cursor] = false;
-			}
-		});
-	}
+// Optional relabeling (-r) so that high-degree vertices get small, adjacent IDs: "degree" orders all
+// vertices by decreasing total degree, "hubsort" puts the hubs (total degree above the average) first
+// by decreasing degree and keeps the other vertices in ID order, "hubcluster" puts the hubs first in
+// ID order. Ties keep ID order. Fills relabel[old ID] = new ID and inverse[new ID] = old ID.
+const char * RELABEL_ORDERS[] = {"degree", "hubsort", "hubcluster"};
 
-	int fin = open(input.c_str(), O_RDONLY);
-	if (fin==-1) printf("%s\n", strerror(errno));
-	assert(fin!=-1);
-	int cursor = 0;
-	long total_bytes = file_size(input);
-	long read_bytes = 0;
+void create_relabel_map(const DegreeInfo& info, VertexId vertices, std::string order,
+	std::vector<VertexId>& relabel, std::vector<VertexId>& inverse) {
 	double start_time = get_time();
-	while (true) {
-		long bytes = read(fin, buffers[cursor], IOSIZE);
-		assert(bytes!=-1);
-		if (bytes==0) break;
-		occupied[cursor] = true;
-		tasks.push(std::make_tuple(cursor, bytes));
-		read_bytes += bytes;
-		// printf("progress: %.2f%%\r", 100. * read_bytes / total_bytes);
-		// fflush(stdout);
-		while (occupied[cursor]) {
-			cursor = (cursor + 1) % (parallelism * 2);
-		}
-	}
-	close(fin);
-	assert(read_bytes==edges*edge_unit);
-
-	for (int ti=0;ti<parallelism;ti++) {
-		tasks.push(std::make_tuple(-1, 0));
-	}
-
-	for (int ti=0;ti<parallelism;ti++) {
-		threads[ti].join();
-	}
-
-	printf("%lf -> ", get_time() - start_time);
-	long ts = 0;
-	for (int i=0;i<partitions;i++) {
-		for (int j=0;j<partitions;j++) {
-			if (grid_buffer_offset[i][j]>0) {
-				ts += grid_buffer_offset[i][j];
-				write(fout[i][j], grid_buffer[i][j], grid_buffer_offset[i][j]);
-			}
+	auto degree = [&](VertexId v) { return (long)info.out_degree[v] + info.in_degree[v]; };
+	auto by_degree = [&](VertexId a, VertexId b) { return degree(a) > degree(b); };
+	double average = vertices > 0 ? 2.0 * info.total_edges / vertices : 0;
+	inverse.resize(vertices);
+	std::iota(inverse.begin(), inverse.end(), 0);
+	if (order=="degree") {
+		__gnu_parallel::stable_sort(inverse.begin(), inverse.end(), by_degree);
+	} else {
+		auto hubs_end = std::stable_partition(inverse.begin(), inverse.end(), [&](VertexId v) { return degree(v) > average; });
+		if (order=="hubsort") {
+			__gnu_parallel::stable_sort(inverse.begin(), hubs_end, by_degree);
 		}
+		printf("%ld hubs (total degree > %.2f)\n", (long)(hubs_end - inverse.begin()), average);
 	}
-	printf("%lf (%ld)\n", get_time() - start_time, ts);
-
-	for (int i=0;i<partitions;i++) {
-		for (int j=0;j<partitions;j++) {
-			close(fout[i][j]);
-		}
+	relabel.resize(vertices);
+	#pragma omp parallel for
+	for (VertexId v_id = 0; v_id < vertices; ++v_id) {
+		relabel[inverse[v_id]] = v_id;
 	}
+	printf("Relabeling (%s) took: %.2f seconds.\n", order.c_str(), get_time() - start_time);
+}
 
-	printf("it takes %.2f seconds to generate edge blocks\n", get_time() - start_time);
-
-	
-
-	long offset;
-	int fout_column = open((output+"/column").c_str(), O_WRONLY|O_APPEND|O_CREAT, 0644);
-	int fout_column_offset = open((output+"/column_offset").c_str(), O_WRONLY|O_APPEND|O_CREAT, 0644);
-	offset = 0;
-	for (int j=0;j<partitions;j++) {
-		for (int i=0;i<partitions;i++) {
-			// printf("progress: %.2f%%\r", 100. * offset / total_bytes);
-			// fflush(stdout);
-			write(fout_column_offset, &offset, sizeof(offset));
-			char filename[4096];
-			sprintf(filename, "%s/block-%d-%d", output.c_str(), i, j);
-			offset += file_size(filename);
-			fin = open(filename, O_RDONLY);
-			while (true) {
-				long bytes = read(fin, buffers[0], IOSIZE);
-				assert(bytes!=-1);
-				if (bytes==0) break;
-				write(fout_column, buffers[0], bytes);
-			}
-			close(fin);
-		}
+// degree arrays indexed by the new IDs; with -L they move to a new mapped file and the old one is removed
+void relabel_degrees(DegreeInfo& info, const std::vector<VertexId>& inverse) {
+	VertexId vertices = inverse.size();
+	DegreeInfo relabeled;
+	allocate_degrees(relabeled, vertices, info.mapping!=NULL ? info.mapped_file + ".relabel" : "");
+	relabeled.total_edges = info.total_edges;
+	#pragma omp parallel for
+	for (VertexId v_id = 0; v_id < vertices; ++v_id) {
+		relabeled.out_degree[v_id] = info.out_degree[inverse[v_id]];
+		relabeled.in_degree[v_id] = info.in_degree[inverse[v_id]];
 	}
-	write(fout_column_offset, &offset, sizeof(offset));
-	close(fout_column_offset);
-	close(fout_column);
-	printf("column oriented grid generated\n");
-	int fout_row = open((output+"/row").c_str(), O_WRONLY|O_APPEND|O_CREAT, 0644);
-	int fout_row_offset = open((output+"/row_offset").c_str(), O_WRONLY|O_APPEND|O_CREAT, 0644);
-	offset = 0;
-	for (int i=0;i<partitions;i++) {
-		for (int j=0;j<partitions;j++) {
-			// printf("progress: %.2f%%\r", 100. * offset / total_bytes);
-			// fflush(stdout);
-			write(fout_row_offset, &offset, sizeof(offset));
-			char filename[4096];
-			sprintf(filename, "%s/block-%d-%d", output.c_str(), i, j);
-			offset += file_size(filename);
-			fin = open(filename, O_RDONLY);
-			while (true) {
-				long bytes = read(fin, buffers[0], IOSIZE);
-				assert(bytes!=-1);
-				if (bytes==0) break;
-				write(fout_row, buffers[0], bytes);
-			}
-			close(fin);
-		}
-	}
-	write(fout_row_offset, &offset, sizeof(offset));
-	close(fout_row_offset);
-	close(fout_row);
-	printf("row oriented grid generated\n");
+	std::swap(info, relabeled);
+	release_degrees(relabeled);
+}
 
-	printf("it takes %.2f seconds to generate edge grid\n", get_time() - start_time);
+// relabel_map (new ID of every original vertex) and relabel_inverse (original ID of every new vertex), raw VertexIds
+void save_relabel_map(std::string output, const std::vector<VertexId>& relabel, const std::vector<VertexId>& inverse) {
+	std::ofstream relabel_file(output + "/relabel_map", std::ios::binary);
+	relabel_file.write(reinterpret_cast<const char*>(relabel.data()), relabel.size() * sizeof(VertexId));
+	relabel_file.close();
 
-	FILE * fmeta = fopen((output+"/meta").c_str(), "w");
-	fprintf(fmeta, "%d %d %ld %d", edge_type, vertices, edges, partitions);
-	fclose(fmeta);
+	std::ofstream inverse_file(output + "/relabel_inverse", std::ios::binary);
+	inverse_file.write(reinterpret_cast<const char*>(inverse.data()), inverse.size() * sizeof(VertexId));
+	inverse_file.close();
 }
 
 int main(int argc, char ** argv) {
@@ -430,9 +333,19 @@ int main(int argc, char ** argv) {
 	std::string input = "";
 	std::string output = "";
 	VertexId vertices = -1;
-	int partitions = -1;
+	std::vector<int> partition_list;
 	int edge_type = 0;
-	while ((opt = getopt(argc, argv, "i:o:v:p:t:")) != -1) {
+	bool use_degree_cache = true;
+	long spill_budget = 1024l*1024l*1024l;
+	std::string relabel_order = "";
+	std::string strategy = "greedy";
+	long samples = 1l << 22;
+	bool compact = false;
+	bool low_memory = false;
+	std::string sort_order = "";
+	bool dedup = false;
+	bool drop_self_loops = false;
+	while ((opt = getopt(argc, argv, "i:o:v:p:t:b:Cr:s:S:zLO:UN")) != -1) {
 		switch (opt) {
 		case 'i':
 			input = optarg;
@@ -443,37 +356,183 @@ int main(int argc, char ** argv) {
 		case 'v':
 			vertices = atoi(optarg);
 			break;
-		case 'p':
-			partitions = atoi(optarg);
+		case 'p': {
+			std::stringstream ss(optarg);
+			std::string item;
+			while (std::getline(ss, item, ',')) {
+				partition_list.push_back(atoi(item.c_str()));
+			}
 			break;
+		}
 		case 't':
 			edge_type = atoi(optarg);
 			break;
+		case 'b':
+			spill_budget = atol(optarg)*1024l*1024l;
+			break;
+		case 'C':
+			use_degree_cache = false;
+			break;
+		case 'r':
+			relabel_order = optarg;
+			if (std::find(std::begin(RELABEL_ORDERS), std::end(RELABEL_ORDERS), relabel_order)==std::end(RELABEL_ORDERS)) {
+				fprintf(stderr, "unknown relabel order %s (degree, hubsort or hubcluster)\n", optarg);
+				exit(-1);
+			}
+			break;
+		case 's':
+			strategy = optarg;
+			if (std::find(std::begin(PARTITION_STRATEGIES), std::end(PARTITION_STRATEGIES), strategy)==std::end(PARTITION_STRATEGIES)) {
+				fprintf(stderr, "unknown partitioning strategy %s (greedy, linear, combined, refine or refine-var)\n", optarg);
+				exit(-1);
+			}
+			break;
+		case 'S':
+			samples = atol(optarg);
+			break;
+		case 'z':
+			compact = true;
+			break;
+		case 'L':
+			low_memory = true;
+			break;
+		case 'O':
+			sort_order = optarg;
+			if (std::find(std::begin(BLOCK_ORDERS), std::end(BLOCK_ORDERS), sort_order)==std::end(BLOCK_ORDERS)) {
+				fprintf(stderr, "unknown block order %s (source, target, layout or hilbert)\n", optarg);
+				exit(-1);
+			}
+			break;
+		case 'U':
+			dedup = true;
+			break;
+		case 'N':
+			drop_self_loops = true;
+			break;
 		}
 	}
+	if (sort_order=="" && (dedup || drop_self_loops)) {
+		sort_order = "source";
+	}
+	DegreeCacheHeader sidecar;
+	bool has_sidecar = input!="" && read_degree_cache_header(input, edge_type, sidecar);
+	if (vertices==-1 && has_sidecar) {
+		vertices = sidecar.vertices;
+		printf("|V| = %d read from %s.degree\n", vertices, input.c_str());
+	}
 	if (input=="" || output=="" || vertices==-1) {
-		fprintf(stderr, "usage: %s -i [input path] -o [output path] -v [vertices] -p [partitions] -t [edge type: 0=unweighted, 1=weighted]\n", argv[0]);
+		fprintf(stderr, "usage: %s -i [input path] -o [output path] -v [vertices, default: from the input's .degree sidecar] -p [partitions, e.g. 16 or 4,8,16] -t [edge type: 0=unweighted, 1=weighted] [-b spill buffer budget in MB, default 1024] [-C: do not use the degree cache] [-r relabel order: degree, hubsort or hubcluster] [-s partitioning strategy: greedy (default), linear, combined, refine or refine-var] [-S sampled edges for block prediction, default 4194304] [-z: compact edge encoding] [-L: low memory, degrees in a mapped file] [-O block order: source, target, layout or hilbert] [-U: drop duplicate edges] [-N: drop self-loops]\n", argv[0]);
+		fprintf(stderr, "       with several partition counts, grid P is written to [output path]_p<P>\n");
 		exit(-1);
 	}
-	if (partitions==-1) {
-		partitions = vertices / CHUNKSIZE;
+	if (partition_list.empty()) {
+		partition_list.push_back(vertices / CHUNKSIZE);
 	}
 
-	if (file_exists(output)) {
-		remove_directory(output);
+	MetricsLog metrics("preprocess_dv");
+	metrics.set("input", input);
+	metrics.set("output", output);
+	metrics.set("vertices", (long)vertices);
+	if (partition_list.size()==1) {
+		metrics.set("partitions", partition_list[0]);
+	} else {
+		std::string partition_names;
+		for (int partitions : partition_list) {
+			partition_names += (partition_names.empty() ? "" : ",") + std::to_string(partitions);
+		}
+		metrics.set("partitions", partition_names);
 	}
-	create_directory(output);
+	metrics.set("edge_type", edge_type);
+	metrics.set("spill_budget", spill_budget);
+	metrics.set("compact", compact ? 1 : 0);
+	metrics.set("relabel", relabel_order=="" ? "none" : relabel_order);
+	metrics.set("strategy", strategy);
+	metrics.set("low_memory", low_memory ? 1 : 0);
+	metrics.set("block_order", sort_order=="" ? "none" : sort_order);
+	metrics.set("dedup", dedup ? 1 : 0);
+	metrics.set("drop_self_loops", drop_self_loops ? 1 : 0);
 
 	DegreeInfo degree_info;
-	calculate_and_save_degrees(input, output, vertices, edge_type, degree_info);
-	std::vector<uint32_t> out_degree = degree_info.out_degree;
-	std::vector<uint32_t> in_degree = degree_info.in_degree;
-	auto total_edges = degree_info.total_edges;
-	printf("Creating degree-balanced partition maps...\n");
-	double map_creation_start_time = get_time();
-	auto source_partition_map = create_degree_balanced_partition_map(out_degree, partitions, vertices, total_edges);
-	auto target_partition_map = create_degree_balanced_partition_map(in_degree, partitions, vertices, total_edges);
-	printf("Partition Map Creation took: %.2f seconds.\n", get_time() - map_creation_start_time);
-	generate_edge_grid(input, output, vertices, partitions, edge_type, source_partition_map, target_partition_map);
+	double degree_start_time = get_time();
+	metrics.begin_phase();
+	std::string degree_file = "";
+	if (low_memory) {
+		// next to the output, so that it can be hard-linked into every grid
+		degree_file = output;
+		while (degree_file.size() > 1 && degree_file.back()=='/') degree_file.pop_back();
+		degree_file += ".degrees.tmp";
+	}
+	allocate_degrees(degree_info, vertices, degree_file);
+	long cached_edges = 0;
+	if (use_degree_cache && has_sidecar && load_degree_cache(input, vertices, edge_type, degree_info.out_degree, degree_info.in_degree, cached_edges)) {
+		degree_info.total_edges = cached_edges;
+		printf("Phase 1 (Degree Calculation) skipped, loaded %s.degree\n", input.c_str());
+		printf("Phase 1 (Degree Calculation) took: %.2f seconds.\n", get_time() - degree_start_time);
+		metrics.set("degree_cache", "hit");
+	} else {
+		calculate_degrees(input, vertices, edge_type, degree_info);
+		if (use_degree_cache) {
+			save_degree_cache(input, vertices, edge_type, degree_info.total_edges, degree_info.out_degree, degree_info.in_degree);
+		}
+		metrics.set("degree_cache", use_degree_cache ? "miss" : "off");
+	}
+	metrics.end_phase("degree");
+
+	std::vector<VertexId> relabel, relabel_inverse;
+	if (relabel_order!="") {
+		create_relabel_map(degree_info, vertices, relabel_order, relabel, relabel_inverse);
+		relabel_degrees(degree_info, relabel_inverse);
+		metrics.end_phase("relabel");
+	}
+
+	EdgeSample sample = sample_edges(input, edge_type, samples, relabel_order!="" ? relabel.data() : nullptr);
+	std::vector<std::vector<VertexId> > source_boundaries(partition_list.size());
+	std::vector<std::vector<VertexId> > target_boundaries(partition_list.size());
+	std::vector<GridWriter*> grids;
+	for (size_t g = 0; g < partition_list.size(); ++g) {
+		int partitions = partition_list[g];
+		std::string grid_output = (partition_list.size() == 1) ? output : output + "_p" + std::to_string(partitions);
+		if (file_exists(grid_output)) {
+			remove_directory(grid_output);
+		}
+		create_directory(grid_output);
+		save_degrees(grid_output, vertices, degree_info);
+		if (relabel_order!="") {
+			save_relabel_map(grid_output, relabel, relabel_inverse);
+		}
+
+		printf("Creating degree-balanced partition maps (P=%d, %s)...\n", partitions, strategy.c_str());
+		double map_creation_start_time = get_time();
+		std::vector<VertexId> & source_boundary = source_boundaries[g];
+		std::vector<VertexId> & target_boundary = target_boundaries[g];
+		create_partition_boundaries(degree_info, vertices, partitions, strategy, sample, source_boundary, target_boundary);
+		printf("Partition Map Creation took: %.2f seconds.\n", get_time() - map_creation_start_time);
+		report_blocks(predict_blocks(sample, source_boundary, target_boundary, partitions), partitions, sample.source.size());
+		save_partition_boundary(grid_output + "/source_boundary", source_boundary);
+		save_partition_boundary(grid_output + "/target_boundary", target_boundary);
+		grids.push_back(new GridWriter(grid_output, vertices, partitions, edge_type));
+		grids.back()->set_boundaries(source_boundary.data(), target_boundary.data());
+		grids.back()->set_compact(compact);
+	}
+	// every grid has its degree file and boundaries now; the edge pass needs neither the degrees nor the sample
+	release_degrees(degree_info);
+	sample = EdgeSample();
+	metrics.end_phase("partition_map");
+
+	generate_edge_grids(input, grids, spill_budget, relabel_order!="" ? relabel.data() : nullptr);
+	struct rusage usage;
+	getrusage(RUSAGE_SELF, &usage);
+	printf("peak RSS: %.1f MB\n", usage.ru_maxrss / 1024.0);
+	metrics.set("peak_rss", (long)usage.ru_maxrss * 1024);
+	metrics.end_phase("grid");
+	if (sort_order!="") {
+		for (auto grid : grids) {
+			grid->sort_blocks(sort_order, dedup, drop_self_loops, spill_budget);
+		}
+		metrics.end_phase("sort");
+	}
+	for (auto grid : grids) {
+		delete grid;
+	}
 	return 0;
 }
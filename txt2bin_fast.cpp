@@ -1,76 +1,206 @@
-#include <iostream>
-#include <fstream>
-#include <cstdint>
-#include <algorithm>
+#include <stdio.h>
+#include <stdlib.h>
+#include <stdint.h>
+#include <unistd.h>
+#include <fcntl.h>
+#include <errno.h>
+#include <string.h>
+#include <assert.h>
+#include <sys/mman.h>
+#include <omp.h>
+
 #include <string>
+#include <thread>
+#include <vector>
 
-int main(int argc, char ** argv) {
-    if (argc != 3) {
-        fprintf(stderr, "Usage: %s <input_text_file> <output_binary_file>\n", argv[0]);
-        return 1;
-    }
+#include "core/time.hpp"
+#include "core/degreecache.hpp"
+
+// Converts a SNAP-style text edge list ("src dst" per line, '#' or '%' comments) into the
+// unweighted binary format read by preprocess/preprocess_dv. The input is mmapped and cut into
+// line-aligned chunks that are parsed in parallel; each round of chunks is written in input order
+// by a writer thread while the next round is parsed. The exact |V| (max vertex ID + 1), the edge
+// count and, unless -D is given, the out/in-degree arrays are written to <output>.degree, which
+// lets preprocess/preprocess_dv run without -v and preprocess_dv skip its degree pass.
 
-    std::ios_base::sync_with_stdio(false);
-    std::cin.tie(NULL);
+const long CHUNKSIZE_TEXT = 64l * 1024 * 1024;
 
-    std::ifstream fin(argv[1]);
-    std::ofstream fout(argv[2], std::ios::binary);
+struct Chunk {
+	const char * begin;
+	const char * end;
+	std::vector<uint32_t> edges; // source, target pairs
+	uint32_t max_vid;
+	long malformed;
+};
 
-    if (!fin.is_open() || !fout.is_open()) {
-        fprintf(stderr, "Error opening files.\n");
-        return 1;
-    }
+inline bool is_blank(char c) {
+	return c==' ' || c=='\t' || c=='\r' || c==',';
+}
 
-    // --- Progress Indicator: 1. Get total file size ---
-    fin.seekg(0, std::ios::end);
-    long long total_size_bytes = fin.tellg();
-    fin.seekg(0, std::ios::beg);
-    // --------------------------------------------------
+// parses one unsigned vertex ID at p, stopping at the end of the line
+inline bool parse_vertex(const char *& p, const char * end, uint32_t & value) {
+	while (p < end && is_blank(*p)) p++;
+	if (p==end || *p < '0' || *p > '9') return false;
+	uint64_t v = 0;
+	while (p < end && *p >= '0' && *p <= '9') {
+		v = v * 10 + (*p - '0');
+		if (v > INT32_MAX) return false; // VertexId is a 32-bit int
+		p++;
+	}
+	value = v;
+	return true;
+}
 
-    uint32_t src, dst;
-    uint32_t max_vid = 0;
-    std::string line;
-    long long edge_count = 0;
-    const int UPDATE_INTERVAL = 1000000; // Update progress every 1 million edges
+void parse_chunk(Chunk & chunk) {
+	chunk.edges.clear();
+	chunk.edges.reserve((chunk.end - chunk.begin) / 6);
+	chunk.max_vid = 0;
+	chunk.malformed = 0;
+	const char * p = chunk.begin;
+	while (p < chunk.end) {
+		const char * eol = (const char *)memchr(p, '\n', chunk.end - p);
+		if (eol==NULL) eol = chunk.end;
+		const char * q = p;
+		while (q < eol && is_blank(*q)) q++;
+		if (q < eol && *q!='#' && *q!='%') {
+			uint32_t src, dst;
+			if (parse_vertex(q, eol, src) && parse_vertex(q, eol, dst)) {
+				chunk.edges.push_back(src);
+				chunk.edges.push_back(dst);
+				if (src > chunk.max_vid) chunk.max_vid = src;
+				if (dst > chunk.max_vid) chunk.max_vid = dst;
+			} else {
+				chunk.malformed++;
+			}
+		}
+		p = eol + 1;
+	}
+}
+
+int main(int argc, char ** argv) {
+	int opt;
+	int parallelism = std::thread::hardware_concurrency();
+	bool count_degrees = true;
+	while ((opt = getopt(argc, argv, "j:D")) != -1) {
+		switch (opt) {
+		case 'j':
+			parallelism = atoi(optarg);
+			break;
+		case 'D':
+			count_degrees = false;
+			break;
+		}
+	}
+	if (argc - optind != 2 || parallelism <= 0) {
+		fprintf(stderr, "usage: %s [-j threads] [-D: do not count degrees] <input_text_file> <output_binary_file>\n", argv[0]);
+		exit(-1);
+	}
+	std::string input = argv[optind];
+	std::string output = argv[optind + 1];
 
-    // Skip header comment lines
-    while (fin.peek() == '#') {
-        std::getline(fin, line);
-    }
+	double start_time = get_time();
+	int fin = open(input.c_str(), O_RDONLY);
+	if (fin==-1) {
+		fprintf(stderr, "cannot open %s: %s\n", input.c_str(), strerror(errno));
+		exit(-1);
+	}
+	long text_size = file_size(input);
+	const char * text = NULL;
+	if (text_size > 0) {
+		text = (const char *)mmap(NULL, text_size, PROT_READ, MAP_PRIVATE, fin, 0);
+		assert(text!=MAP_FAILED);
+		madvise((void *)text, text_size, MADV_SEQUENTIAL);
+	}
+	int fout = open(output.c_str(), O_WRONLY|O_CREAT|O_TRUNC, 0644);
+	if (fout==-1) {
+		fprintf(stderr, "cannot open %s: %s\n", output.c_str(), strerror(errno));
+		exit(-1);
+	}
 
-    // Main processing loop
-    while (fin >> src >> dst) {
-        fout.write(reinterpret_cast<const char*>(&src), sizeof(uint32_t));
-        fout.write(reinterpret_cast<const char*>(&dst), sizeof(uint32_t));
-        
-        if (src > max_vid) max_vid = src;
-        if (dst > max_vid) max_vid = dst;
-        
-        edge_count++;
+	// line-aligned chunk boundaries
+	std::vector<const char *> boundaries;
+	boundaries.push_back(text);
+	for (long offset = CHUNKSIZE_TEXT; offset < text_size; offset += CHUNKSIZE_TEXT) {
+		const char * p = text + offset;
+		if (p <= boundaries.back()) continue;
+		const char * eol = (const char *)memchr(p - 1, '\n', text + text_size - (p - 1));
+		if (eol==NULL) break;
+		if (eol + 1 > boundaries.back() && eol + 1 < text + text_size) boundaries.push_back(eol + 1);
+	}
+	boundaries.push_back(text + text_size);
+	int chunks = boundaries.size() - 1;
 
-        // --- Progress Indicator: 2. Print status periodically ---
-        if (edge_count % UPDATE_INTERVAL == 0) {
-            long long current_pos_bytes = fin.tellg();
-            if (current_pos_bytes != -1) {
-                double percentage = static_cast<double>(current_pos_bytes) / total_size_bytes * 100.0;
-                // Use \r to overwrite the same line in the terminal
-                printf("Progress: %.2f%% (%lld edges processed)\r", percentage, edge_count);
-                fflush(stdout); // Ensure the output is displayed immediately
-            }
-        }
-        // -------------------------------------------------------
-    }
-    
-    // --- Progress Indicator: 3. Print final 100% ---
-    // Ensure the line is cleared and shows 100% at the end.
-    printf("Progress: 100.00%% (%lld edges processed)\n", edge_count);
-    // -------------------------------------------------
-    
-    fin.close();
-    fout.close();
+	// two rounds of `parallelism` chunks: one parsed while the other is written
+	std::vector<Chunk> rounds[2];
+	rounds[0].resize(parallelism);
+	rounds[1].resize(parallelism);
+	std::thread writer;
+	uint32_t max_vid = 0;
+	long edges = 0;
+	long malformed = 0;
+	for (int first = 0, round = 0; first < chunks; first += parallelism, round ^= 1) {
+		int count = std::min(parallelism, chunks - first);
+		#pragma omp parallel for schedule(dynamic, 1) num_threads(parallelism)
+		for (int c = 0; c < count; c++) {
+			rounds[round][c].begin = boundaries[first + c];
+			rounds[round][c].end = boundaries[first + c + 1];
+			parse_chunk(rounds[round][c]);
+		}
+		if (writer.joinable()) writer.join();
+		for (int c = 0; c < count; c++) {
+			if (rounds[round][c].max_vid > max_vid) max_vid = rounds[round][c].max_vid;
+			edges += rounds[round][c].edges.size() / 2;
+			malformed += rounds[round][c].malformed;
+		}
+		writer = std::thread([&rounds, round, count, fout]() {
+			for (int c = 0; c < count; c++) {
+				if (!write_all(fout, rounds[round][c].edges.data(), sizeof(uint32_t) * rounds[round][c].edges.size())) {
+					fprintf(stderr, "write failed: %s\n", strerror(errno));
+					exit(-1);
+				}
+			}
+		});
+		printf("Progress: %.2f%% (%ld edges processed)\r", 100.0 * (boundaries[first + count] - text) / (text_size > 0 ? text_size : 1), edges);
+		fflush(stdout);
+	}
+	if (writer.joinable()) writer.join();
+	rounds[0].clear();
+	rounds[1].clear();
+	printf("Progress: 100.00%% (%ld edges processed)\n", edges);
+	if (text!=NULL) munmap((void *)text, text_size);
+	close(fin);
+	close(fout);
+	if (malformed > 0) {
+		printf("skipped %ld malformed lines\n", malformed);
+	}
+	long vertices = edges > 0 ? (long)max_vid + 1 : 0;
+	printf("parsed %s in %.2f seconds\n", input.c_str(), get_time() - start_time);
 
-    printf("|V| based on max_vid = %u\n", max_vid + 1);
-    printf("Official node count from documentation = 41,652,230\n");
+	uint32_t * out_degree = NULL;
+	uint32_t * in_degree = NULL;
+	if (count_degrees && edges > 0) {
+		double degree_start_time = get_time();
+		out_degree = new uint32_t [vertices]();
+		in_degree = new uint32_t [vertices]();
+		int fd = open(output.c_str(), O_RDONLY);
+		assert(fd!=-1);
+		const uint32_t * binary = (const uint32_t *)mmap(NULL, sizeof(uint32_t) * 2 * edges, PROT_READ, MAP_PRIVATE, fd, 0);
+		assert(binary!=MAP_FAILED);
+		#pragma omp parallel for schedule(static, 1 << 20) num_threads(parallelism)
+		for (long e = 0; e < edges; e++) {
+			__sync_fetch_and_add(&out_degree[binary[e * 2]], 1);
+			__sync_fetch_and_add(&in_degree[binary[e * 2 + 1]], 1);
+		}
+		munmap((void *)binary, sizeof(uint32_t) * 2 * edges);
+		close(fd);
+		printf("degrees counted in %.2f seconds\n", get_time() - degree_start_time);
+	}
+	save_degree_cache(output, vertices, 0, edges, out_degree, in_degree);
+	delete [] out_degree;
+	delete [] in_degree;
 
-    return 0;
-}
\ No newline at end of file
+	printf("|E|=%ld\n", edges);
+	printf("|V|=%ld\n", vertices);
+	printf("conversion took %.2f seconds, counts%s written to %s.degree\n", get_time() - start_time, count_degrees ? " and degrees" : "", output.c_str());
+	return 0;
+}